@@ -0,0 +1,205 @@
+import contextlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+class RateLimited(Exception):
+    """Raised when a request is turned away instead of queued
+
+    reason is 'client' or 'global' (token bucket empty), 'busy' (no
+    generation slot within the wait) or 'backoff' (upstream is throttling
+    us). retry_after is in whole seconds, for the Retry-After header.
+    """
+
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Rate limited ({reason}), retry after {self.retry_after}s")
+
+class TokenBucket:
+    """rate tokens per second up to burst; not thread-safe, callers hold a lock"""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now):
+        """Take one token, returning 0.0, or the seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+class AdmissionController:
+    """Token buckets per client and globally, plus an adaptive limit on concurrent generations
+
+    rate and client_rate are requests per second (0 disables that bucket).
+    slot() admits at most limit generations at once, waiting up to
+    max_wait seconds for a free one. When the upstream model reports
+    throttling, throttled() halves the limit and holds new generations
+    back until the upstream's retry window (or an exponential backoff)
+    has passed; after that, every limit successful generations raise it
+    by one again, up to max_concurrency.
+    """
+
+    def __init__(self, rate=0.0, burst=1, client_rate=0.0, client_burst=1, max_concurrency=8,
+                 max_wait=5.0, max_clients=10000, backoff_base=1.0, backoff_max=60.0):
+        self.rate = rate
+        self.burst = burst
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_clients = max_clients
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._slots_changed = threading.Condition(self._lock)
+        self._bucket = TokenBucket(rate, burst, time.monotonic()) if rate > 0 else None
+        self._clients = OrderedDict()
+        self.limit = max_concurrency
+        self._successes = 0
+        self._in_flight = 0
+        self._waiting = 0
+        self._backoff_until = 0.0
+        self._backoff = 0.0
+        # Moving average of how long a generation holds its slot, for Retry-After
+        self._hold_seconds = 0.0
+        self._counters = {'admitted': 0, 'rejected_client': 0, 'rejected_global': 0, 'rejected_busy': 0,
+                          'rejected_backoff': 0, 'generations': 0, 'waited': 0, 'throttled': 0}
+
+    def _client_bucket(self, client, now):
+        bucket = self._clients.get(client)
+        if bucket is None:
+            bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst, now)
+            # Forget the least recently seen clients; a new bucket starts full
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+        return bucket
+
+    def admit(self, client):
+        """Take a token for client from its bucket and the global one, or raise RateLimited"""
+        now = time.monotonic()
+        with self._lock:
+            client_bucket = None
+            if self.client_rate > 0:
+                client_bucket = self._client_bucket(client, now)
+                wait = client_bucket.take(now)
+                if wait:
+                    self._counters['rejected_client'] += 1
+                    raise RateLimited('client', wait)
+            if self._bucket is not None:
+                wait = self._bucket.take(now)
+                if wait:
+                    # Not this client's fault; give its token back
+                    if client_bucket is not None:
+                        client_bucket.refund()
+                    self._counters['rejected_global'] += 1
+                    raise RateLimited('global', wait)
+            self._counters['admitted'] += 1
+
+    def _busy_retry_after(self):
+        # Roughly when the requests already waiting will have had their turn
+        if not self._hold_seconds:
+            return self.max_wait
+        return self._hold_seconds * (self._waiting + 1) / self.limit
+
+    @contextlib.contextmanager
+    def slot(self, max_wait=None):
+        """Hold one of the concurrent generation slots for the duration of the block
+
+        Waits up to max_wait seconds (the controller's default if None) for
+        a free slot and for any upstream backoff to end, then raises
+        RateLimited.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            now = time.monotonic()
+            deadline = now + max_wait
+            waiting = False
+            try:
+                while now < self._backoff_until or self._in_flight >= self.limit:
+                    if self._backoff_until > deadline:
+                        self._counters['rejected_backoff'] += 1
+                        raise RateLimited('backoff', self._backoff_until - now)
+                    if now >= deadline:
+                        self._counters['rejected_busy'] += 1
+                        raise RateLimited('busy', self._busy_retry_after())
+                    if not waiting:
+                        waiting = True
+                        self._waiting += 1
+                        self._counters['waited'] += 1
+                    # Slots are signalled on release; the end of a backoff is not
+                    wake = self._backoff_until if now < self._backoff_until else deadline
+                    self._slots_changed.wait(wake - now)
+                    now = time.monotonic()
+            finally:
+                if waiting:
+                    self._waiting -= 1
+            self._in_flight += 1
+            self._counters['generations'] += 1
+
+        started = time.monotonic()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            held = time.monotonic() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._hold_seconds = held if not self._hold_seconds else 0.8 * self._hold_seconds + 0.2 * held
+                if succeeded and time.monotonic() >= self._backoff_until:
+                    # Additive increase, one slot per limit successes, once upstream stops throttling
+                    self._backoff = 0.0
+                    self._successes += 1
+                    if self._successes >= self.limit:
+                        self._successes = 0
+                        self.limit = min(self.max_concurrency, self.limit + 1)
+                self._slots_changed.notify_all()
+
+    def throttled(self, retry_after=None):
+        """Record that the upstream model rejected a call for exceeding its rate limit
+
+        Halves the concurrency limit and holds off new generations for
+        retry_after seconds if upstream sent one, else for an exponential
+        backoff starting at backoff_base.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._backoff_until:
+                # One cut per backoff window, however many calls were throttled in it
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            self._backoff = min(self.backoff_max, self._backoff * 2 if self._backoff else self.backoff_base)
+            delay = min(self.backoff_max, retry_after) if retry_after else self._backoff
+            self._backoff_until = max(self._backoff_until, now + delay)
+            self._counters['throttled'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'rate_per_second': self.rate,
+                'client_rate_per_second': self.client_rate,
+                'max_concurrency': self.max_concurrency,
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'clients': len(self._clients),
+                'backoff_seconds': round(max(0.0, self._backoff_until - time.monotonic()), 2),
+                'avg_generation_seconds': round(self._hold_seconds, 3)
+            })
+        stats['rejected'] = sum(stats[name] for name in stats if name.startswith('rejected_'))
+        return stats
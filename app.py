@@ -1,24 +1,51 @@
+import contextlib
 import os
-from flask import Flask, render_template, request, jsonify, url_for
+from flask import Flask, render_template, request, jsonify, url_for, Response, stream_with_context, g
 from flask_cors import CORS
 import openai
 from dotenv import load_dotenv
 import requests
-from bs4 import BeautifulSoup
-from youtube_transcript_api import YouTubeTranscriptApi
-import re
 from urllib.parse import urlparse, parse_qs
 import json
-import traceback
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
+import hashlib
 import time
+import threading
+from quiz_cache import LRUCache, canonicalize_url, make_cache_key
+import content_store
+from jobs import JobQueue, QueueFullError
+import storage
+from singleflight import SingleFlight
+from quiz_parser import QuizParser, parse_quiz_output, validate_question, record_response, record_repair
+import quiz_parser
+from llm_backends import get_backend, choose_model, add_rate_limit_listener
+from long_content import estimate_tokens, generate_long_quiz
+import long_content
+import http_clients
+from http_clients import fetch_url
+from http_clients import stream_url, iter_body
+import extraction
+from transcript_resolver import TranscriptResolver, TranscriptUnavailable
+import transcript_index
+import question_bank
+from transcript_index import TranscriptIndex, add_source_times, format_time, parse_time
+import prompt_budget
+import batch
+import metrics
+from admission import AdmissionController, RateLimited
+import logging
+from log_config import setup_logging, log_payload
+import log_config
 
 # Load environment variables
-print("Loading environment variables...")
 load_dotenv(override=True)  # Force reload environment variables
 
+# Levels, sampling and the background log writer are configured from the environment
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # Initialize Flask app
 app = Flask(__name__)
 # Configure CORS for all origins in development and ngrok
@@ -30,56 +57,175 @@ MIN_QUESTIONS = 1
 MAX_QUESTIONS = 20
 SUPPORTED_LANGUAGES = ['en', 'hi']
 
-# Database initialization
-def init_db():
-    conn = sqlite3.connect('quizzes.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS quizzes (
-            id TEXT PRIMARY KEY,
-            youtube_url TEXT,
-            questions TEXT,
-            language TEXT,
-            created_at TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Initialize database on startup
-with app.app_context():
-    init_db()
-
-# Database connection management
-def get_db_connection():
-    """Get a database connection with retry mechanism"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            conn = sqlite3.connect('quizzes.db', timeout=20)
-            conn.row_factory = sqlite3.Row
-            return conn
-        except sqlite3.Error as e:
-            if attempt == max_retries - 1:
-                raise e
-            time.sleep(1)
+# Quiz cache configuration
+QUIZ_CACHE_TTL = int(os.getenv('QUIZ_CACHE_TTL', 24 * 60 * 60))
+QUIZ_CACHE_SIZE = int(os.getenv('QUIZ_CACHE_SIZE', 512))
 
-def close_db_connection(conn):
-    """Safely close database connection"""
-    if conn:
-        try:
-            conn.close()
-        except Exception as e:
-            app.logger.error(f"Error closing database connection: {str(e)}")
+# Rendered quiz page cache and HTTP caching configuration
+QUIZ_PAGE_CACHE_SIZE = int(os.getenv('QUIZ_PAGE_CACHE_SIZE', 2048))
+QUIZ_PAGE_CACHE_BYTES = int(os.getenv('QUIZ_PAGE_CACHE_BYTES', 32 * 1024 * 1024))
+QUIZ_PAGE_CACHE_TTL = int(os.getenv('QUIZ_PAGE_CACHE_TTL', 24 * 60 * 60))
+QUIZ_PAGE_MAX_AGE = int(os.getenv('QUIZ_PAGE_MAX_AGE', 60 * 60))
+
+# Extracted transcript/page text store configuration
+CONTENT_STORE_MAX_BYTES = int(os.getenv('CONTENT_STORE_MAX_BYTES', 256 * 1024 * 1024))
+TRANSCRIPT_STORE_TTL = int(os.getenv('TRANSCRIPT_STORE_TTL', 30 * 24 * 60 * 60))
+WEB_CONTENT_TTL = int(os.getenv('WEB_CONTENT_TTL', 60 * 60))
+
+# Cached YouTube caption listings, and how long videos without usable
+# captions (disabled, none, private or removed) are rejected without a lookup
+TRANSCRIPT_LISTING_TTL = int(os.getenv('TRANSCRIPT_LISTING_TTL', 6 * 60 * 60))
+TRANSCRIPT_NEGATIVE_TTL = int(os.getenv('TRANSCRIPT_NEGATIVE_TTL', 24 * 60 * 60))
+
+# Background generation job configuration
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 100))
+JOB_MAX_WAIT = int(os.getenv('JOB_MAX_WAIT', 30))
+
+# Long content (chunked map-reduce) generation configuration, in estimated tokens
+LONG_CONTENT_TOKENS = int(os.getenv('LONG_CONTENT_TOKENS', 6000))
+LONG_CONTENT_CHUNK_TOKENS = int(os.getenv('LONG_CONTENT_CHUNK_TOKENS', 3000))
+LONG_CONTENT_CONCURRENCY = int(os.getenv('LONG_CONTENT_CONCURRENCY', 4))
+
+# Prompt token budget: content is deduplicated and trimmed to its densest
+# sentences, PROMPT_TOKENS_PER_QUESTION per question (0 disables trimming)
+PROMPT_TOKENS_PER_QUESTION = int(os.getenv('PROMPT_TOKENS_PER_QUESTION', 500))
+PROMPT_MIN_TOKENS = int(os.getenv('PROMPT_MIN_TOKENS', 2000))
+
+# Completion tokens allowed per question when asking for missing questions
+REPAIR_TOKENS_PER_QUESTION = int(os.getenv('REPAIR_TOKENS_PER_QUESTION', 200))
+
+# Completion tokens for a quiz request: QUESTION_COMPLETION_TOKENS per
+# question, at least QUIZ_MIN_COMPLETION_TOKENS and at most
+# QUIZ_MAX_COMPLETION_TOKENS (the model's output limit). Larger question
+# counts, such as a question pool, are requested in batches that fit
+QUESTION_COMPLETION_TOKENS = int(os.getenv('QUESTION_COMPLETION_TOKENS', 250))
+QUIZ_MIN_COMPLETION_TOKENS = int(os.getenv('QUIZ_MIN_COMPLETION_TOKENS', 2000))
+QUIZ_MAX_COMPLETION_TOKENS = int(os.getenv('QUIZ_MAX_COMPLETION_TOKENS', 4096))
+
+# Question bank: a source's first generation asks for QUESTION_POOL_SIZE
+# questions, and later quizzes for it are drawn from that pool until it
+# runs out (0 generates every quiz from scratch)
+QUESTION_POOL_SIZE = int(os.getenv('QUESTION_POOL_SIZE', 15))
+QUESTION_BANK_TTL = int(os.getenv('QUESTION_BANK_TTL', 30 * 24 * 60 * 60))
+MAX_TAKER_LENGTH = 128
+
+# Batch generation configuration; the worker pools are shared by all batches
+BATCH_MAX_URLS = int(os.getenv('BATCH_MAX_URLS', 50))
+BATCH_EXTRACT_WORKERS = int(os.getenv('BATCH_EXTRACT_WORKERS', 4))
+BATCH_GENERATE_WORKERS = int(os.getenv('BATCH_GENERATE_WORKERS', 2))
+
+# Admission control in front of generation: token buckets overall and per
+# client IP (requests per minute, 0 disables), concurrent generations sized
+# to the OpenAI rate tier, and how long a request waits for a free slot
+# before getting a 429. Jobs and batches are already queued, so they wait longer.
+RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', 120))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 30))
+CLIENT_RATE_LIMIT_PER_MINUTE = float(os.getenv('CLIENT_RATE_LIMIT_PER_MINUTE', 10))
+CLIENT_RATE_LIMIT_BURST = int(os.getenv('CLIENT_RATE_LIMIT_BURST', 5))
+GENERATION_MAX_CONCURRENCY = int(os.getenv('GENERATION_MAX_CONCURRENCY', 8))
+GENERATION_MAX_WAIT = float(os.getenv('GENERATION_MAX_WAIT', 5))
+GENERATION_BACKGROUND_WAIT = float(os.getenv('GENERATION_BACKGROUND_WAIT', 300))
+# Longest pause after the model API reports throttling (seconds)
+UPSTREAM_BACKOFF_MAX = float(os.getenv('UPSTREAM_BACKOFF_MAX', 60))
+# Take the client IP from X-Forwarded-For; only behind a proxy that sets it (ngrok, a load balancer)
+TRUST_FORWARDED_FOR = os.getenv('TRUST_FORWARDED_FOR', '0').lower() in ('1', 'true', 'yes')
+
+# Development server settings for `python app.py`; production runs under
+# gunicorn (see gunicorn.conf.py). Never enable the debugger on a public host.
+PORT = int(os.getenv('PORT', 5004))
+FLASK_DEBUG = os.getenv('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes')
+
+# Per-request profiling: a request whose X-Profile header equals PROFILE_TOKEN
+# gets a Server-Timing header and a cProfile dump in PROFILE_DIR (unset disables it)
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+def _template_fingerprint(name):
+    with open(os.path.join(app.root_path, app.template_folder, name), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+# Rendered quiz pages, bounded by total size; quizzes never change once stored
+quiz_page_cache = LRUCache(max_entries=QUIZ_PAGE_CACHE_SIZE, ttl=QUIZ_PAGE_CACHE_TTL,
+                           max_bytes=QUIZ_PAGE_CACHE_BYTES)
+QUIZ_PAGE_VERSION = _template_fingerprint('quiz.html')
+
+# In-process cache of recently generated quizzes, backed by the quizzes table
+quiz_cache = LRUCache(max_entries=QUIZ_CACHE_SIZE, ttl=QUIZ_CACHE_TTL)
+quiz_cache_counters = {'db_hits': 0, 'misses': 0}
+quiz_cache_lock = threading.Lock()
+
+def _count_cache_event(name):
+    with quiz_cache_lock:
+        quiz_cache_counters[name] += 1
+
+def get_source_key(url, window=None):
+    """Identify what a quiz is drawn from: the video ID (or canonical URL) and time window"""
+    video_id = extract_youtube_id(url)
+    source_key = f"youtube:{video_id}" if video_id else canonicalize_url(url)
+    if window:
+        source_key = f"{source_key}@{window_key(window)}"
+    return source_key
+
+def get_quiz_cache_key(url, language, num_questions, window=None):
+    """Build a cache key from the source, language and question count"""
+    return make_cache_key(get_source_key(url, window), language, num_questions)
+
+def find_cached_quiz(cache_key):
+    """Look up a previously generated quiz, first in memory and then in SQLite"""
+    cached = quiz_cache.get(cache_key)
+    if cached:
+        return cached
+
+    cutoff = datetime.now() - timedelta(seconds=QUIZ_CACHE_TTL)
+    try:
+        with metrics.span('db_cache_lookup'):
+            cached = storage.find_quiz_by_cache_key(cache_key, cutoff)
+    except (json.JSONDecodeError, TypeError):
+        cached = None
+    if not cached:
+        _count_cache_event('misses')
+        return None
+
+    _count_cache_event('db_hits')
+    quiz_cache.set(cache_key, cached)
+    return cached
+
+def load_extracted_content(store_key):
+    """Fetch previously extracted text for store_key from the content store"""
+    with metrics.span('content_store_load'):
+        return content_store.get_content(store_key)
+
+def save_extracted_content(store_key, url, text, etag=None, last_modified=None):
+    """Persist extracted text so later generations skip fetching and parsing"""
+    try:
+        with metrics.span('content_store_save'):
+            content_store.put_content(store_key, url, text, etag=etag,
+                                      last_modified=last_modified,
+                                      max_bytes=CONTENT_STORE_MAX_BYTES)
+    except sqlite3.Error as e:
+        logger.error("Error storing extracted content: %s", e)
 
-# Configure OpenAI
+def get_quiz_cache_stats():
+    """Combine in-memory LRU counters with SQLite fallback counters"""
+    stats = quiz_cache.stats()
+    with quiz_cache_lock:
+        stats.update(quiz_cache_counters)
+    lookups = stats['hits'] + stats['db_hits'] + stats['misses']
+    stats['overall_hit_ratio'] = round((stats['hits'] + stats['db_hits']) / lookups, 4) if lookups else 0.0
+    return stats
+
+# Configure OpenAI; the local fake backend (LLM_BACKEND=fake) needs no key
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')
 api_key = os.getenv('OPENAI_API_KEY')
-if not api_key:
+if not api_key and LLM_BACKEND == 'openai':
     raise ValueError("OpenAI API key not found in environment variables")
 
-print(f"API Key found: {'Yes' if api_key else 'No'}")
-print(f"API Key length: {len(api_key) if api_key else 0}")
-print(f"Loaded API key: {api_key[:10]}...{api_key[-4:]}")
+logger.info("LLM backend: %s", LLM_BACKEND)
+logger.info("API Key found: %s", 'Yes' if api_key else 'No')
+logger.info("Prompt tokenizer: %s", prompt_budget.load_tokenizer())
+if api_key:
+    logger.debug("Loaded API key: %s...%s", api_key[:10], api_key[-4:])
 openai.api_key = api_key
 
 def get_base_url():
@@ -93,7 +239,7 @@ def get_base_url():
 def extract_youtube_id(url):
     """Extract YouTube video ID from URL"""
     try:
-        print(f"Attempting to extract YouTube ID from: {url}")
+        logger.debug("Attempting to extract YouTube ID from: %s", url)
         parsed_url = urlparse(url)
         
         if 'youtube.com' in parsed_url.netloc:
@@ -102,326 +248,702 @@ def extract_youtube_id(url):
         elif 'youtu.be' in parsed_url.netloc:
             video_id = parsed_url.path.lstrip('/')
         else:
-            print("Not a YouTube URL")
+            logger.debug("Not a YouTube URL")
             return None
             
         if video_id:
-            print(f"Successfully extracted YouTube ID: {video_id}")
+            logger.debug("Successfully extracted YouTube ID: %s", video_id)
         else:
-            print("Could not find video ID in URL")
+            logger.debug("Could not find video ID in URL")
         return video_id
         
     except Exception as e:
-        print(f"Error extracting YouTube ID: {str(e)}")
+        logger.warning("Error extracting YouTube ID: %s", e)
         return None
 
 def get_youtube_transcript(video_id, preferred_lang='en'):
-    """Get transcript of YouTube video"""
+    """Get transcript of YouTube video as a TranscriptIndex of timed sentences"""
     try:
         if not video_id:
-            print("No video ID provided")
+            logger.warning("No video ID provided")
             return None
             
-        print(f"Fetching transcript for video ID: {video_id}")
+        logger.info("Fetching transcript for video ID: %s", video_id)
         try:
-            # List available transcripts
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-            
-            print(f"Preferred language: {preferred_lang}")
-            
-            # Try to get transcripts in order of preference
-            transcript = None
-            try:
-                if preferred_lang == 'hi':
-                    # Try Hindi transcripts first
-                    try:
-                        transcript = transcript_list.find_transcript(['hi'])
-                        print("Found manual Hindi transcript")
-                    except:
-                        try:
-                            transcript = transcript_list.find_generated_transcript(['hi'])
-                            print("Found auto-generated Hindi transcript")
-                        except:
-                            # If no Hindi transcript, try to translate to Hindi
-                            try:
-                                transcript = transcript_list.find_manually_created_transcript()
-                                transcript = transcript.translate('hi')
-                                print("Translated transcript to Hindi")
-                            except:
-                                print("Could not find or translate to Hindi")
-                else:
-                    # Try English transcripts
-                    for lang_code in ['en-US', 'en-GB', 'en']:
-                        try:
-                            transcript = transcript_list.find_transcript([lang_code])
-                            print(f"Found manual transcript in {lang_code}")
-                            break
-                        except:
-                            continue
-                    
-                    # If no manual English transcript found, try auto-generated
-                    if not transcript:
-                        transcript = transcript_list.find_generated_transcript(['en'])
-                        print("Found auto-generated English transcript")
-                
-            except Exception as e:
-                print(f"Error finding transcript: {str(e)}")
-                # Try to get any manual transcript and translate it to preferred language
-                try:
-                    transcript = transcript_list.find_manually_created_transcript()
-                    transcript = transcript.translate(preferred_lang)
-                    print(f"Found and translated manual transcript to {preferred_lang}")
-                except:
-                    print("Could not find or translate any transcript")
-                    return None
-            
-            # Fetch the transcript
-            transcript_list = transcript.fetch()
-            print(f"Successfully fetched transcript with {len(transcript_list)} segments")
-            
+            # Cached listing (or known absence of captions) and one-pass track choice
+            transcript_list = transcript_resolver.fetch(video_id, preferred_lang)
+            logger.debug("Successfully fetched transcript with %d segments", len(transcript_list))
+        except TranscriptUnavailable as e:
+            logger.warning("%s", e)
+            return None
         except Exception as e:
-            print(f"Error getting transcripts: {str(e)}")
-            traceback.print_exc()  # Print full traceback
+            logger.exception("Error getting transcripts: %s", e)
             return None
             
         if not transcript_list:
-            print("No transcript found")
+            logger.warning("No transcript found for %s", video_id)
             return None
-            
-        print(f"Found {len(transcript_list)} transcript segments")
-        
-        # Process transcript segments
-        processed_segments = []
-        current_sentence = []
-        
-        for segment in transcript_list:
-            text = segment['text'].strip()
-            if not text:
-                continue
-                
-            # Clean up text
-            text = re.sub(r'\[.*?\]', '', text)  # Remove [Music] etc.
-            text = re.sub(r'\(.*?\)', '', text)  # Remove (applause) etc.
-            text = text.replace('\n', ' ')  # Replace newlines with spaces
-            text = ' '.join(text.split())  # Normalize whitespace
-            
-            if not text:
-                continue
-                
-            # Add to current sentence
-            current_sentence.append(text)
-            
-            # If segment ends with sentence-ending punctuation, join and add to processed segments
-            if text[-1] in '.!?':
-                processed_segments.append(' '.join(current_sentence))
-                current_sentence = []
-        
-        # Add any remaining text
-        if current_sentence:
-            processed_segments.append(' '.join(current_sentence))
         
-        # Join all segments with proper spacing
-        full_text = ' '.join(processed_segments)
+        # Strip annotations like [Music] and group the segments into timed sentences
+        with metrics.span('transcript_clean'):
+            index = TranscriptIndex.from_segments(transcript_list)
         
-        print(f"Successfully processed transcript of length: {len(full_text)}")
-        print(f"Sample of processed text: {full_text[:200]}...")
-        return full_text
+        logger.info("Processed transcript of %d segments into %d sentences (%s)",
+                    len(transcript_list), len(index), format_time(index.duration))
+        log_payload(logger, "Processed transcript text", index.text())
+        return index
         
     except Exception as e:
-        print(f"Error getting YouTube transcript: {str(e)}")
-        traceback.print_exc()  # Print full traceback
+        logger.exception("Error getting YouTube transcript: %s", e)
         return None
 
-def extract_content(url):
+def load_transcript_index(video_id, language):
+    """Return the stored transcript index for a video, fetching and storing it when missing or stale"""
+    with metrics.span('transcript_index_load'):
+        index = transcript_index.get_index(video_id, language, max_age=TRANSCRIPT_STORE_TTL)
+    if index is not None:
+        logger.info("Using stored YouTube transcript")
+        return index
+
+    index = get_youtube_transcript(video_id, preferred_lang=language)
+    if index:
+        try:
+            with metrics.span('transcript_index_save'):
+                transcript_index.put_index(video_id, language, index, max_age=TRANSCRIPT_STORE_TTL)
+        except sqlite3.Error as e:
+            logger.error("Error storing transcript index: %s", e)
+    return index
+
+def attach_source_times(video_url, questions, language, window=None):
+    """Add source_start (seconds into the video) to questions generated from a YouTube transcript"""
+    video_id = extract_youtube_id(video_url)
+    if not video_id:
+        return questions
+    try:
+        index = transcript_index.get_index(video_id, language)
+    except sqlite3.Error as e:
+        logger.error("Error loading transcript index: %s", e)
+        return questions
+    if index:
+        start, end = window or (None, None)
+        add_source_times(index, questions, start, end)
+    return questions
+
+class ExtractionError(Exception):
+    """Raised when no usable content could be extracted from a URL"""
+
+class GenerationError(Exception):
+    """Raised when the model did not produce a usable quiz"""
+
+transcript_resolver = TranscriptResolver(TRANSCRIPT_LISTING_TTL, TRANSCRIPT_NEGATIVE_TTL)
+
+generation_admission = AdmissionController(
+    rate=RATE_LIMIT_PER_MINUTE / 60, burst=RATE_LIMIT_BURST,
+    client_rate=CLIENT_RATE_LIMIT_PER_MINUTE / 60, client_burst=CLIENT_RATE_LIMIT_BURST,
+    max_concurrency=GENERATION_MAX_CONCURRENCY, max_wait=GENERATION_MAX_WAIT,
+    backoff_max=UPSTREAM_BACKOFF_MAX
+)
+# 429s from the model API shrink the generation limit and pause new generations
+add_rate_limit_listener(generation_admission.throttled)
+
+def client_address():
+    """The requesting client's IP, for per-client rate limits"""
+    if TRUST_FORWARDED_FOR and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'unknown'
+
+def rate_limited_response(error):
+    """429 with Retry-After for a request turned away by admission control"""
+    logger.info("Turned away generation request from %s: %s", client_address(), error)
+    response = jsonify({
+        'success': False,
+        'error': 'Too many quiz requests right now. Please try again shortly.',
+        'retry_after': error.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+# Identical in-flight extractions and generations share one upstream call
+extraction_flight = SingleFlight()
+generation_flight = SingleFlight()
+
+def extract_content(url, language='en', window=None):
+    """Extract content from URL, sharing the work with identical in-flight extractions
+
+    window is an optional (start, end) in seconds selecting part of a
+    YouTube transcript; end may be None.
+    """
+    if not url:
+        raise Exception("Content extraction failed: No URL provided")
+    video_id = extract_youtube_id(url)
+    flight_key = f"youtube:{video_id}:{language}:{window_key(window)}" if video_id else f"url:{canonicalize_url(url)}"
+    return extraction_flight.do(flight_key, _extract_content, url, language, window)
+
+def _extract_content(url, language='en', window=None):
     """Extract content from URL based on type"""
     try:
-        print(f"\n=== Content Extraction ===")
-        print(f"URL: {url}")
+        logger.info("Extracting content from %s", url)
         
         if not url:
             raise ValueError("No URL provided")
         
         # Check if it's a YouTube video
-        video_id = extract_youtube_id(url)
+        with metrics.span('youtube_id'):
+            video_id = extract_youtube_id(url)
         if video_id:
-            print("YouTube video detected")
-            transcript = get_youtube_transcript(video_id, preferred_lang=request.json.get('language', 'en'))
-            if transcript:
-                print("Successfully extracted YouTube transcript")
-                return transcript
-            else:
+            logger.debug("YouTube video detected")
+            index = load_transcript_index(video_id, language)
+            if not index:
                 raise Exception("Could not extract YouTube transcript")
 
-        # For other URLs, try to extract text content
-        print("Attempting to fetch webpage content...")
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an error for bad status codes
-        
-        print("Parsing webpage content...")
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Get text content
-        text = soup.get_text()
-        
-        # Clean up text
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
+            # Only the requested part of the video goes to the model
+            start, end = window or (None, None)
+            transcript = index.text(start, end)
+            if not transcript:
+                raise Exception(f"No transcript between {format_time(start)} and "
+                                f"{format_time(end) if end is not None else 'the end'}")
+            if window:
+                first, stop = index.span(start, end)
+                logger.info("Using transcript window %s: %d of %d sentences",
+                            window_key(window), stop - first, len(index))
+            return transcript
+
+        # For other URLs, reuse stored text if the page has not changed
+        store_key = f"url:{canonicalize_url(url)}"
+        stored = load_extracted_content(store_key)
+        headers = {}
+        if stored:
+            if stored['etag']:
+                headers['If-None-Match'] = stored['etag']
+            if stored['last_modified']:
+                headers['If-Modified-Since'] = stored['last_modified']
+            if not headers and stored['age'] < WEB_CONTENT_TTL:
+                logger.info("Using stored webpage content")
+                return stored['text']
+
+        logger.debug("Attempting to fetch webpage content...")
+        # Download and parsing overlap, so they are timed as one stage
+        with metrics.span('web_extract'), stream_url(url, headers=headers) as response:
+            if stored and response.status_code == 304:
+                logger.info("Webpage not modified, using stored content")
+                content_store.mark_revalidated(store_key)
+                return stored['text']
+            response.raise_for_status()  # Raise an error for bad status codes
+
+            # Parse while the body downloads instead of buffering the whole page
+            logger.debug("Parsing webpage content with %s...", extraction.get_parser_name())
+            content_type = response.headers.get('Content-Type', '').lower()
+            encoding = response.encoding if 'charset=' in content_type else None
+            text = extraction.extract_text(iter_body(response), encoding=encoding)
         
         if not text:
             raise Exception("No content could be extracted from the URL")
             
-        print(f"Successfully extracted webpage content (length: {len(text)})")
+        logger.info("Extracted webpage content (length: %d)", len(text))
+        log_payload(logger, "Extracted webpage text", text)
+        save_extracted_content(store_key, url, text,
+                               etag=response.headers.get('ETag'),
+                               last_modified=response.headers.get('Last-Modified'))
         return text
 
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching URL: {str(e)}")
+        logger.warning("Error fetching URL: %s", e)
         raise Exception(f"Could not fetch URL: {str(e)}")
     except Exception as e:
-        print(f"Error in extract_content: {str(e)}")
+        logger.warning("Error in extract_content: %s", e)
         raise Exception(f"Content extraction failed: {str(e)}")
 
-def generate_quiz_questions(content, num_questions=5):
-    """Generate quiz questions using OpenAI GPT"""
-    try:
-        print(f"Generating quiz with {num_questions} questions...")
-        
-        # Initialize the OpenAI client
-        client = openai.OpenAI()
-        
-        # Updated prompt to request correct answers and explanations
-        messages = [
-            {"role": "system", "content": "You are a helpful quiz generator. Generate quiz questions with correct answers and explanations."},
-            {"role": "user", "content": f"""Generate {num_questions} multiple choice questions based on this content: {content}
+def window_key(window):
+    """Text form of a transcript window for cache and flight keys, '' for the whole video"""
+    if not window:
+        return ''
+    start, end = window
+    return f"{start:g}-{'' if end is None else f'{end:g}'}"
+
+def build_quiz_messages(content, num_questions):
+    """Build the chat messages asking the model for a quiz in the parser's format"""
+    return [
+        {"role": "system", "content": "You are a helpful quiz generator. Generate quiz questions with correct answers and explanations."},
+        {"role": "user", "content": f"""Generate {num_questions} multiple choice questions based on this content: {content}
             For each question:
             1. Start with the question number (e.g., '1.')
             2. List 4 options labeled A) through D)
             3. After the options, add 'Correct: X)' where X is the correct option letter
             4. Add 'Explanation: ' followed by a brief explanation of why that answer is correct"""}
-        ]
+    ]
+
+def build_quiz_json_messages(content, num_questions, existing=None):
+    """Build the chat messages asking the model for a quiz as a JSON object
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
+    existing lists question stems already generated, which the model is
+    told not to repeat (used when repairing a partial quiz or growing a
+    question pool).
+    """
+    avoid = ''
+    if existing:
+        stems = '\n'.join(f"- {stem}" for stem in existing)
+        avoid = f"\nDo not repeat any of these questions:\n{stems}"
+    return [
+        {"role": "system", "content": "You are a helpful quiz generator. Generate quiz questions with correct answers and explanations. Respond only with JSON."},
+        {"role": "user", "content": f"""Generate {num_questions} multiple choice questions based on this content: {content}
+            Respond with a JSON object of the form
+            {{"questions": [{{"question": "...", "options": ["...", "...", "...", "..."], "correct_answer": "A", "explanation": "..."}}]}}
+            Each question has exactly 4 options (without letter labels), correct_answer is the letter A, B, C or D
+            of the correct option, and explanation briefly says why that answer is correct.{avoid}"""}
+    ]
+
+def _add_usage(total, usage):
+    if not usage:
+        return total
+    if not total:
+        return dict(usage)
+    return {name: total[name] + usage[name] for name in total}
+
+def completion_tokens_for(num_questions):
+    """max_tokens for a completion asked for num_questions questions"""
+    tokens = max(QUIZ_MIN_COMPLETION_TOKENS, QUESTION_COMPLETION_TOKENS * num_questions + 100)
+    return min(tokens, QUIZ_MAX_COMPLETION_TOKENS)
+
+def questions_per_completion():
+    """How many questions fit in one completion's output limit"""
+    return max(1, (QUIZ_MAX_COMPLETION_TOKENS - 100) // QUESTION_COMPLETION_TOKENS)
+
+def request_quiz_questions(content, num_questions, backend, repair=True, existing=None, max_wait=None):
+    """Run one completion for content and return (questions, token usage)
+
+    The model is asked for JSON; invalid or missing questions are replaced
+    with a small follow-up call rather than by regenerating the quiz.
+    existing lists stems the model should not repeat. More questions than
+    fit in one completion are asked for in batches. Every model call holds
+    a generation slot, waiting up to max_wait seconds for one.
+    """
+    per_completion = questions_per_completion()
+    if num_questions > per_completion:
+        questions = []
+        usage = None
+        while len(questions) < num_questions:
+            batch, batch_usage = request_quiz_questions(
+                content, min(per_completion, num_questions - len(questions)), backend, repair,
+                (existing or []) + [q['question'] for q in questions], max_wait)
+            usage = _add_usage(usage, batch_usage)
+            if not batch:
+                break
+            questions += batch
+        return questions, usage
+
+    with generation_admission.slot(max_wait), metrics.span('llm_complete'):
+        quiz_text, usage = backend.complete(
+            build_quiz_json_messages(content, num_questions, existing),
+            model=choose_model(num_questions),
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=completion_tokens_for(num_questions),
+            json_mode=True
         )
+    log_payload(logger, "Generated quiz text", quiz_text)
 
-        quiz_text = response.choices[0].message.content
-        print(f"Generated quiz text: {quiz_text}")
+    # Validate the response, falling back to the numbered text format
+    with metrics.span('parse'):
+        questions, report = parse_quiz_output(quiz_text, num_questions)
+    if report['missing'] and repair:
+        repaired, repair_usage = repair_quiz_questions(content, questions, report['missing'], backend, existing,
+                                                       max_wait)
+        questions = questions + repaired
+        usage = _add_usage(usage, repair_usage)
+    return questions, usage
 
-        # Parse the quiz text into a structured format
-        questions = []
-        current_question = None
+def repair_quiz_questions(content, questions, missing, backend, existing=None, max_wait=None):
+    """Ask for just the missing questions, returning (new questions, token usage)"""
+    logger.info("Requesting %d replacement question(s)", missing)
+    try:
+        with generation_admission.slot(max_wait), metrics.span('llm_repair'):
+            quiz_text, usage = backend.complete(
+                build_quiz_json_messages(content, missing,
+                                         existing=(existing or []) + [q['question'] for q in questions]),
+                model=choose_model(missing),
+                temperature=0.7,
+                max_tokens=REPAIR_TOKENS_PER_QUESTION * missing + 100,
+                json_mode=True
+            )
+    except Exception as e:
+        logger.warning("Repair request failed: %s", e)
+        record_repair(missing, 0)
+        return [], None
+
+    repaired, report = parse_quiz_output(quiz_text, missing)
+    record_repair(missing, len(repaired))
+    return repaired, usage
+
+def fit_prompt_content(content, num_questions):
+    """Deduplicate content and trim it to the prompt token budget for num_questions"""
+    budget = prompt_budget.budget_for(num_questions, PROMPT_TOKENS_PER_QUESTION, PROMPT_MIN_TOKENS)
+    with metrics.span('prompt_fit'):
+        content, report = prompt_budget.fit_to_budget(content, budget)
+    logger.info("Prompt content: %d -> %d tokens (budget %s, %d duplicate lines removed, %.1f ms)",
+                report['input_tokens'], report['prompt_tokens'], budget or 'unlimited',
+                report['duplicates_removed'], report['seconds'] * 1000)
+    return content, report
+
+def generate_quiz_questions(content, num_questions=5, backend=None, max_wait=None, existing=None):
+    """Generate quiz questions with the configured LLM backend
+
+    Each model call holds a generation slot, so the chunk calls of long
+    content count against GENERATION_MAX_CONCURRENCY one by one; raises
+    RateLimited if none is free within max_wait seconds
+    (GENERATION_MAX_WAIT if None). existing lists question stems not to
+    repeat.
+    """
+    # Long content goes to map-reduce whole, and each chunk is trimmed to
+    # its own budget there; trimming it first would make it short
+    if is_long_content(content):
+        return generate_fitted_questions(content, num_questions, backend, existing, max_wait)
+
+    content, budget_report = fit_prompt_content(content, num_questions)
+    started = time.perf_counter()
+    try:
+        return generate_fitted_questions(content, num_questions, backend, existing, max_wait)
+    finally:
+        elapsed = time.perf_counter() - started
+        prompt_budget.record(budget_report, elapsed)
+        logger.info("Generation took %.2fs for %d prompt tokens", elapsed, budget_report['prompt_tokens'])
+
+def request_chunk_questions(chunk, num_questions, backend, existing=None, max_wait=None):
+    """Trim one chunk of long content to the budget for its questions and generate them"""
+    chunk, budget_report = fit_prompt_content(chunk, num_questions)
+    started = time.perf_counter()
+    try:
+        return request_quiz_questions(chunk, num_questions, backend, repair=False, existing=existing,
+                                      max_wait=max_wait)
+    finally:
+        prompt_budget.record(budget_report, time.perf_counter() - started)
+
+def generate_fitted_questions(content, num_questions=5, backend=None, existing=None, max_wait=None):
+    """Generate quiz questions for content that is already within the prompt budget
+
+    Long content is generated chunk by chunk instead, each chunk trimmed
+    to the budget for the questions asked of it.
+    """
+    try:
+        logger.debug("Generating quiz with %d questions...", num_questions)
         
-        for line in quiz_text.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check for question number at start of line (1., 2., etc.)
-            if re.match(r'^\d+\.', line):
-                if current_question:
-                    questions.append(current_question)
-                current_question = {
-                    'question': line.split('.', 1)[1].strip(),
-                    'options': [],
-                    'correct_answer': None,
-                    'explanation': None
-                }
-            # Check for options (A), B), etc.)
-            elif current_question and re.match(r'^[A-D]\)', line):
-                current_question['options'].append(line)
-            # Check for correct answer
-            elif current_question and line.lower().startswith('correct:'):
-                current_question['correct_answer'] = line.split(':', 1)[1].strip()
-            # Check for explanation
-            elif current_question and line.lower().startswith('explanation:'):
-                current_question['explanation'] = line.split(':', 1)[1].strip()
-                
-        if current_question:
-            questions.append(current_question)
+        # Use the process-wide backend unless one was supplied
+        backend = backend or get_backend()
+
+        if is_long_content(content):
+            # Too long for one prompt: generate per chunk in parallel and merge
+            questions, report = generate_long_quiz(
+                content, num_questions,
+                lambda chunk, count: request_chunk_questions(chunk, count, backend, existing, max_wait),
+                chunk_tokens=LONG_CONTENT_CHUNK_TOKENS,
+                max_workers=LONG_CONTENT_CONCURRENCY
+            )
+        else:
+            questions, usage = request_quiz_questions(content, num_questions, backend, existing=existing,
+                                                      max_wait=max_wait)
             
         if not questions:
-            print(f"Raw quiz text: {quiz_text}")
             raise Exception("Failed to generate valid quiz format")
             
         return questions
             
     except Exception as e:
-        print(f"Error in generate_quiz: {str(e)}")
+        logger.warning("Error in generate_quiz: %s", e)
         raise e
 
+def is_long_content(content):
+    """Whether content needs the chunked map-reduce generation mode"""
+    return estimate_tokens(content) > LONG_CONTENT_TOKENS
+
+def parse_streamed_questions(deltas):
+    """Yield questions from streamed completion text as soon as each one is complete"""
+    parser = QuizParser()
+    for delta in deltas:
+        yield from parser.feed(delta)
+    yield from parser.finish()
+
+def stream_quiz_questions(content, num_questions=5, backend=None):
+    """Generate quiz questions with a streaming completion, yielding each one as soon as it is complete"""
+    logger.debug("Streaming quiz with %d questions...", num_questions)
+    backend = backend or get_backend()
+
+    deltas = backend.stream(
+        build_quiz_messages(content, num_questions),
+        model=choose_model(num_questions),
+        temperature=0.7,
+        max_tokens=completion_tokens_for(num_questions)
+    )
+    valid = []
+    invalid = 0
+    for question in parse_streamed_questions(deltas):
+        question = validate_question(question)
+        if not question:
+            invalid += 1
+        elif len(valid) < num_questions:
+            valid.append(question)
+            yield question
+
+    missing = num_questions - len(valid)
+    record_response('stream', invalid, missing)
+    if missing > 0:
+        # Streamed text cannot use JSON mode; fill the gaps with one JSON call
+        repaired, usage = repair_quiz_questions(content, valid, missing, backend)
+        yield from repaired
+
+def question_pool_count(num_questions):
+    """How many questions to generate when the pool cannot fill a quiz of num_questions"""
+    if not QUESTION_POOL_SIZE:
+        return num_questions
+    return min(MAX_QUESTIONS, max(num_questions, QUESTION_POOL_SIZE))
+
+def draw_banked_questions(source_key, language, num_questions, taker=None, exclude=()):
+    """Draw random questions from the pool for a source, returning (question ids, questions)"""
+    if not QUESTION_POOL_SIZE:
+        return [], []
+    try:
+        with metrics.span('question_bank_draw'):
+            drawn = question_bank.draw(source_key, language, num_questions, taker, exclude,
+                                       max_age=QUESTION_BANK_TTL)
+    except sqlite3.Error as e:
+        logger.error("Error drawing from question bank: %s", e)
+        return [], []
+    return [question_id for question_id, question in drawn], [question for question_id, question in drawn]
+
+def bank_can_fill(video_url, language, num_questions, window=None, taker=None):
+    """Whether the question bank alone can serve a quiz; such quizzes are not rate limited"""
+    if not QUESTION_POOL_SIZE:
+        return False
+    try:
+        return question_bank.available(get_source_key(video_url, window), language, taker,
+                                       max_age=QUESTION_BANK_TTL) >= num_questions
+    except sqlite3.Error as e:
+        logger.error("Error reading question bank: %s", e)
+        return False
+
+def bank_questions(video_url, source_key, language, questions, window=None):
+    """Add generated questions to the pool for their source, returning their pool ids"""
+    if not QUESTION_POOL_SIZE:
+        return [None] * len(questions)
+    attach_source_times(video_url, questions, language, window)
+    try:
+        with metrics.span('question_bank_add'):
+            return question_bank.add_questions(source_key, language, questions, max_age=QUESTION_BANK_TTL)
+    except sqlite3.Error as e:
+        logger.error("Error adding to question bank: %s", e)
+        return [None] * len(questions)
+
 @app.route('/')
 def home():
     return render_template('index.html')
 
+def create_quiz(video_url, num_questions, language, cache_key, progress=None, window=None, max_wait=None,
+                taker=None):
+    """Extract, generate and store a quiz, sharing the work with identical in-flight requests
+
+    Questions come from the source's question bank when it has enough
+    that taker (if given) has not been given yet. Returns (quiz_id,
+    questions). Raises ExtractionError, GenerationError or RateLimited.
+    """
+    # Each taker needs a quiz of their own
+    flight_key = f"{cache_key}#{taker}" if taker else cache_key
+    return generation_flight.do(flight_key, _create_quiz, video_url, num_questions,
+                                language, cache_key, progress, window, max_wait, taker)
+
+def _create_quiz(video_url, num_questions, language, cache_key, progress=None, window=None, max_wait=None,
+                 taker=None):
+    progress = progress or (lambda stage: None)
+
+    # A full quiz from the bank needs neither the source nor the model
+    question_ids, questions = draw_banked_questions(get_source_key(video_url, window), language,
+                                                    num_questions, taker)
+    if questions and len(questions) == num_questions:
+        progress('saving')
+        quiz_id = store_quiz(video_url, questions, language, cache_key, window, question_ids, taker)
+        return quiz_id, questions
+
+    progress('extracting')
+    try:
+        content = extract_content(video_url, language, window)
+    except Exception as e:
+        raise ExtractionError(str(e)) from e
+    if not content:
+        raise ExtractionError("Failed to extract content from URL")
+
+    return generate_and_store_quiz(video_url, content, num_questions, language,
+                                   cache_key, progress, window, max_wait, taker)
+
+def generate_and_store_quiz(video_url, content, num_questions, language, cache_key, progress=None,
+                            window=None, max_wait=None, taker=None, pinned=False):
+    """Build a quiz for already extracted content from the question bank and the model, and store it
+
+    Questions are drawn from the bank first. If it cannot fill the quiz,
+    a new pool of question_pool_count() questions is generated and banked
+    and the rest are drawn from it. Returns (quiz_id, questions). Raises
+    GenerationError or RateLimited. A pinned quiz does not expire after
+    QUIZ_CACHE_TTL.
+    """
+    progress = progress or (lambda stage: None)
+    source_key = get_source_key(video_url, window)
+    question_ids, questions = draw_banked_questions(source_key, language, num_questions, taker)
+
+    if len(questions) < num_questions:
+        progress('generating')
+        existing = None
+        if QUESTION_POOL_SIZE:
+            try:
+                existing = question_bank.recent_stems(source_key, language)
+            except sqlite3.Error as e:
+                logger.error("Error reading question bank: %s", e)
+        try:
+            generated = generate_quiz_questions(content, question_pool_count(num_questions),
+                                                max_wait=max_wait, existing=existing)
+        except RateLimited:
+            raise
+        except Exception as e:
+            raise GenerationError(str(e)) from e
+        if not generated:
+            raise GenerationError("Failed to generate questions")
+
+        new_ids = bank_questions(video_url, source_key, language, generated, window)
+        if None not in new_ids:
+            more_ids, more = draw_banked_questions(source_key, language, num_questions - len(questions),
+                                                   taker, exclude=question_ids)
+            question_ids += more_ids
+            questions += more
+        if None in new_ids or not questions:
+            # Bank disabled or unavailable, or everything new repeats what taker has seen
+            question_ids, questions = [], generated[:num_questions]
+
+    progress('saving')
+    quiz_id = store_quiz(video_url, questions, language, cache_key, window, question_ids, taker, pinned)
+    return quiz_id, questions
+
+def validate_generation_request(data):
+    """Validate generation parameters, returning (params, error message)"""
+    if not data:
+        return None, 'No data provided'
+
+    video_url = data.get('video_url')
+    if not video_url:
+        return None, 'Video URL is required'
+    if not isinstance(video_url, str):
+        return None, 'Video URL must be a string'
+    if len(video_url) > MAX_URL_LENGTH:
+        return None, 'URL is too long'
+
+    try:
+        num_questions = int(data.get('num_questions', 5))
+    except (TypeError, ValueError):
+        num_questions = None
+    if num_questions is None or not MIN_QUESTIONS <= num_questions <= MAX_QUESTIONS:
+        return None, f'Number of questions must be between {MIN_QUESTIONS} and {MAX_QUESTIONS}'
+
+    language = data.get('language', 'en')
+    if language not in SUPPORTED_LANGUAGES:
+        return None, f'Unsupported language. Supported languages are: {", ".join(SUPPORTED_LANGUAGES)}'
+
+    # Query-string requests (the streaming endpoint) send flags as text
+    refresh = data.get('refresh', False)
+    if isinstance(refresh, str):
+        refresh = refresh.lower() in ('1', 'true', 'yes')
+
+    # Optional identifier of whoever takes the quiz, so repeat quizzes avoid questions they have seen
+    taker = data.get('taker') or None
+    if taker is not None and (not isinstance(taker, str) or len(taker) > MAX_TAKER_LENGTH):
+        return None, f'taker must be a string of at most {MAX_TAKER_LENGTH} characters'
+
+    # Optional part of a YouTube video, in seconds or as m:ss / h:mm:ss
+    start, end = data.get('start'), data.get('end')
+    window = None
+    if start not in (None, '') or end not in (None, ''):
+        if not extract_youtube_id(video_url):
+            return None, 'start and end are only supported for YouTube videos'
+        window = [parse_time(start) if start not in (None, '') else 0.0,
+                  parse_time(end) if end not in (None, '') else None]
+        if window[0] is None or (window[1] is None and end not in (None, '')):
+            return None, 'start and end must be seconds or m:ss / h:mm:ss times'
+        if window[1] is not None and window[1] <= window[0]:
+            return None, 'end must be after start'
+
+    return {
+        'video_url': video_url,
+        'num_questions': num_questions,
+        'language': language,
+        'refresh': bool(refresh),
+        'window': window,
+        'taker': taker
+    }, None
+
+def store_quiz(video_url, questions, language, cache_key, window=None, question_ids=None, taker=None,
+               pinned=False):
+    """Insert a quiz and return its new ID
+
+    question_ids are the bank ids of questions drawn from the question bank,
+    which already carry their source times; they are recorded as seen by
+    taker.
+    """
+    if not question_ids:
+        attach_source_times(video_url, questions, language, window)
+    quiz_id = str(uuid.uuid4())
+    with metrics.span('db_insert'):
+        storage.insert_quiz(quiz_id, video_url, questions, language, cache_key, pinned)
+    quiz_cache.set(cache_key, (quiz_id, questions))
+    if taker and question_ids:
+        try:
+            question_bank.mark_seen(taker, question_ids, max_age=QUESTION_BANK_TTL)
+        except sqlite3.Error as e:
+            logger.error("Error recording questions seen: %s", e)
+    return quiz_id
+
 @app.route('/generate_quiz', methods=['POST'])
 def handle_generate_quiz():
-    conn = None
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'No data provided'}), 400
-            
-        # Input validation
-        video_url = data.get('video_url')
-        if not video_url:
-            return jsonify({'success': False, 'error': 'Video URL is required'}), 400
-        if len(video_url) > MAX_URL_LENGTH:
-            return jsonify({'success': False, 'error': 'URL is too long'}), 400
-            
-        num_questions = int(data.get('num_questions', 5))
-        if not MIN_QUESTIONS <= num_questions <= MAX_QUESTIONS:
-            return jsonify({'success': False, 
-                          'error': f'Number of questions must be between {MIN_QUESTIONS} and {MAX_QUESTIONS}'}), 400
-            
-        language = data.get('language', 'en')
-        if language not in SUPPORTED_LANGUAGES:
-            return jsonify({'success': False, 
-                          'error': f'Unsupported language. Supported languages are: {", ".join(SUPPORTED_LANGUAGES)}'}), 400
+        params, error = validate_generation_request(request.get_json())
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        video_url = params['video_url']
+        num_questions = params['num_questions']
+        language = params['language']
+        window = params['window']
+        taker = params['taker']
+
+        # Serve a previously generated quiz for the same source when possible;
+        # a taker gets a new one drawn from the questions they have not seen
+        cache_key = get_quiz_cache_key(video_url, language, num_questions, window)
+        if not params['refresh'] and not taker:
+            cached = find_cached_quiz(cache_key)
+            if cached:
+                quiz_id, questions = cached
+                return jsonify({
+                    'success': True,
+                    'quiz_id': quiz_id,
+                    'share_url': f"{get_base_url()}/quiz/{quiz_id}",
+                    'questions': questions,
+                    'cached': True
+                })
         
-        # Extract content from the video
+        # Extract content, generate questions and store the quiz; only
+        # quizzes that need the model are rate limited
         try:
-            content = extract_content(video_url)
-            if not content:
-                return jsonify({'success': False, 'error': 'Failed to extract content from URL'}), 400
-        except Exception as e:
-            app.logger.error(f"Content extraction error: {str(e)}")
+            if not bank_can_fill(video_url, language, num_questions, window, taker):
+                generation_admission.admit(client_address())
+            quiz_id, questions = create_quiz(video_url, num_questions, language, cache_key, window=window,
+                                             taker=taker)
+        except RateLimited as e:
+            return rate_limited_response(e)
+        except ExtractionError as e:
+            logger.error("Content extraction error: %s", e)
             return jsonify({
                 'success': False,
                 'error': 'Failed to extract content. Please check the URL and try again.'
             }), 400
-        
-        # Generate quiz questions
-        try:
-            questions = generate_quiz_questions(content, num_questions)
-            if not questions:
-                return jsonify({'success': False, 'error': 'Failed to generate questions'}), 400
-        except Exception as e:
-            app.logger.error(f"Quiz generation error: {str(e)}")
+        except GenerationError as e:
+            logger.error("Quiz generation error: %s", e)
             return jsonify({
                 'success': False,
                 'error': 'Failed to generate quiz. Please try again.'
             }), 400
             
-        # Generate a unique ID for the quiz
-        quiz_id = str(uuid.uuid4())
-        
-        # Store in database with proper connection management
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO quizzes (id, youtube_url, questions, language, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (quiz_id, video_url, json.dumps(questions), language, datetime.now()))
-        conn.commit()
-        
-        # Get the base URL and create share URL
+        # Create share URL
         base_url = get_base_url()
         share_url = f"{base_url}/quiz/{quiz_id}"
         
@@ -429,79 +951,540 @@ def handle_generate_quiz():
             'success': True,
             'quiz_id': quiz_id,
             'share_url': share_url,
-            'questions': questions
+            'questions': questions,
+            'cached': False
         })
         
     except Exception as e:
-        app.logger.error(f"Error in generate_quiz route: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.exception("Error in generate_quiz route: %s", e)
         return jsonify({
             'success': False,
             'error': 'An unexpected error occurred. Please try again.'
         }), 500
-    finally:
-        close_db_connection(conn)
+
+def sse_event(event, data):
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_failed_response(error, retry_after=None):
+    """A stream that only reports failure
+
+    EventSource cannot read the status or body of a non-200 response, so
+    errors found before streaming starts are sent as a failed event too.
+    """
+    data = {'error': error}
+    headers = {'Cache-Control': 'no-cache'}
+    if retry_after is not None:
+        data['retry_after'] = retry_after
+        headers['Retry-After'] = str(retry_after)
+    return Response(sse_event('failed', data), mimetype='text/event-stream', headers=headers)
+
+@app.route('/generate_quiz/stream', methods=['GET'])
+def stream_generate_quiz():
+    """Generate a quiz over Server-Sent Events, emitting each question as it completes"""
+    params, error = validate_generation_request(request.args.to_dict())
+    if error:
+        return sse_failed_response(error)
+    video_url = params['video_url']
+    num_questions = params['num_questions']
+    language = params['language']
+    window = params['window']
+    taker = params['taker']
+    cache_key = get_quiz_cache_key(video_url, language, num_questions, window)
+    source_key = get_source_key(video_url, window)
+    base_url = get_base_url()
+
+    # Cached quizzes and quizzes drawn from the question bank are cheap;
+    # anything else is rate limited before the stream starts
+    cached = None if params['refresh'] or taker else find_cached_quiz(cache_key)
+    banked = None
+    if not cached:
+        question_ids, questions = draw_banked_questions(source_key, language, num_questions, taker)
+        if questions and len(questions) == num_questions:
+            banked = question_ids, questions
+        else:
+            try:
+                generation_admission.admit(client_address())
+            except RateLimited as e:
+                logger.info("Turned away streamed generation from %s: %s", client_address(), e)
+                return sse_failed_response('Too many quiz requests right now. Please try again shortly.',
+                                           e.retry_after)
+
+    def store_streamed(questions):
+        question_ids = bank_questions(video_url, source_key, language, questions, window)
+        return store_quiz(video_url, questions, language, cache_key, window,
+                          None if None in question_ids else question_ids, taker)
+
+    def generate():
+        started = time.monotonic()
+        if cached or banked:
+            if banked:
+                quiz_id = store_quiz(video_url, banked[1], language, cache_key, window, banked[0], taker)
+                questions = banked[1]
+            else:
+                quiz_id, questions = cached
+            for index, question in enumerate(questions):
+                yield sse_event('question', {'index': index, **question})
+            yield sse_event('done', {'quiz_id': quiz_id,
+                                     'share_url': f"{base_url}/quiz/{quiz_id}",
+                                     'cached': bool(cached)})
+            return
+
+        yield sse_event('status', {'stage': 'extracting'})
+        try:
+            content = extract_content(video_url, language, window)
+            if not content:
+                raise Exception("Failed to extract content from URL")
+        except Exception as e:
+            logger.error("Content extraction error: %s", e)
+            yield sse_event('failed', {'error': 'Failed to extract content. Please check the URL and try again.'})
+            return
+
+        yield sse_event('status', {'stage': 'generating'})
+        # The whole pool is generated, but the quiz is done once it has num_questions
+        pool_count = question_pool_count(num_questions)
+        # Long content is generated chunk by chunk, so it cannot be streamed
+        # token by token; its chunks are trimmed one by one
+        long_content_mode = is_long_content(content)
+        budget_report = None
+        if not long_content_mode:
+            content, budget_report = fit_prompt_content(content, pool_count)
+        generation_started = time.perf_counter()
+        questions = []
+        extra = []
+        quiz_id = None
+        try:
+            # Chunk calls take a slot each; a stream holds one while it runs
+            with contextlib.nullcontext() if long_content_mode else generation_admission.slot():
+                if long_content_mode:
+                    produced = generate_fitted_questions(content, pool_count)
+                else:
+                    produced = stream_quiz_questions(content, pool_count)
+                for question in produced:
+                    if quiz_id:
+                        extra.append(question)
+                        continue
+                    if not questions:
+                        logger.info("Time to first question: %.2fs", time.monotonic() - started)
+                    questions.append(question)
+                    yield sse_event('question', {
+                        'index': len(questions) - 1,
+                        'elapsed_ms': round((time.monotonic() - started) * 1000),
+                        **question
+                    })
+                    if len(questions) == num_questions:
+                        quiz_id = store_streamed(questions)
+                        yield sse_event('done', {'quiz_id': quiz_id,
+                                                 'share_url': f"{base_url}/quiz/{quiz_id}",
+                                                 'cached': False})
+            if not questions:
+                raise Exception("Failed to generate valid quiz format")
+        except RateLimited as e:
+            logger.info("Turned away streamed generation: %s", e)
+            yield sse_event('failed', {'error': 'Too many quiz requests right now. Please try again shortly.',
+                                       'retry_after': e.retry_after})
+            return
+        except Exception as e:
+            logger.error("Quiz generation error: %s", e)
+            if not quiz_id:
+                yield sse_event('failed', {'error': 'Failed to generate quiz. Please try again.'})
+            return
+        finally:
+            if budget_report:
+                prompt_budget.record(budget_report, time.perf_counter() - generation_started)
+
+        if quiz_id:
+            # The client has its quiz; keep the rest of the pool for later quizzes
+            bank_questions(video_url, source_key, language, extra, window)
+            return
+        quiz_id = store_streamed(questions)
+        yield sse_event('done', {'quiz_id': quiz_id,
+                                 'share_url': f"{base_url}/quiz/{quiz_id}",
+                                 'cached': False})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def validate_batch_request(data):
+    """Validate a batch request, returning (video URLs, params, error message)"""
+    if not data:
+        return None, None, 'No data provided'
+
+    urls = data.get('urls') or []
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return None, None, 'urls must be a list of URLs'
+
+    playlist_url = data.get('playlist_url')
+    if playlist_url:
+        if len(playlist_url) > MAX_URL_LENGTH:
+            return None, None, 'Playlist URL is too long'
+        try:
+            response = fetch_url(playlist_url)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error("Error fetching playlist: %s", e)
+            return None, None, 'Could not fetch playlist'
+        urls = urls + batch.expand_playlist(response.text, limit=BATCH_MAX_URLS)
+
+    # Drop duplicates but keep the submitted order
+    urls = list(dict.fromkeys(url.strip() for url in urls if url.strip()))
+    if not urls:
+        return None, None, 'At least one URL is required'
+    if len(urls) > BATCH_MAX_URLS:
+        return None, None, f'A batch can contain at most {BATCH_MAX_URLS} URLs'
+
+    params, error = validate_generation_request({**data, 'video_url': urls[0]})
+    if error:
+        return None, None, error
+    if params['window']:
+        return None, None, 'start and end are not supported for batches'
+    if params['taker']:
+        return None, None, 'taker is not supported for batches'
+    for url in urls:
+        if len(url) > MAX_URL_LENGTH:
+            return None, None, 'URL is too long'
+    return urls, params, None
+
+@app.route('/generate_quiz/batch', methods=['POST'])
+def handle_generate_quiz_batch():
+    """Generate quizzes for many URLs, pipelining extraction ahead of generation"""
+    try:
+        urls, params, error = validate_batch_request(request.get_json())
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        num_questions = params['num_questions']
+        language = params['language']
+        base_url = get_base_url()
+        client = client_address()
+
+        def extract(video_url):
+            cache_key = get_quiz_cache_key(video_url, language, num_questions)
+            if not params['refresh']:
+                cached = find_cached_quiz(cache_key)
+                if cached:
+                    return {'status': 'cached', 'quiz_id': cached[0]}
+            # One token per URL that needs the model, as if it were requested
+            # on its own; its generation then queues for a slot like jobs do
+            if not bank_can_fill(video_url, language, num_questions):
+                try:
+                    generation_admission.admit(client)
+                except RateLimited as e:
+                    return {'status': 'rate_limited', 'reason': e.reason, 'retry_after': e.retry_after}
+            content = extract_content(video_url, language)
+            if not content:
+                raise ExtractionError("Failed to extract content from URL")
+            return content
+
+        def generate(video_url, content):
+            cache_key = get_quiz_cache_key(video_url, language, num_questions)
+            quiz_id, questions = generation_flight.do(
+                cache_key, generate_and_store_quiz, video_url, content,
+                num_questions, language, cache_key, max_wait=GENERATION_BACKGROUND_WAIT)
+            return {'status': 'created', 'quiz_id': quiz_id}
+
+        started = time.monotonic()
+        results = batch.run_batch(urls, extract, generate,
+                                  extract_workers=BATCH_EXTRACT_WORKERS,
+                                  generate_workers=BATCH_GENERATE_WORKERS)
+        elapsed = time.monotonic() - started
+
+        items = []
+        for video_url, result in zip(urls, results):
+            if result['status'] == 'rate_limited':
+                result['error'] = 'Too many quiz requests right now. Please try again shortly.'
+            elif result['status'] == 'failed':
+                logger.error("Batch item %s failed while %s: %s", video_url, result['stage'], result['error'])
+                result['error'] = ('Failed to extract content. Please check the URL and try again.'
+                                   if result['stage'] == 'extracting'
+                                   else 'Failed to generate quiz. Please try again.')
+            else:
+                result['share_url'] = f"{base_url}/quiz/{result['quiz_id']}"
+            items.append({'video_url': video_url, **result})
+
+        summary = {status: sum(1 for item in items if item['status'] == status)
+                   for status in ('created', 'cached', 'rate_limited', 'failed')}
+        limited = [item for item in items if item['status'] == 'rate_limited']
+        if limited and not summary['created'] and not summary['cached']:
+            # Nothing was served; turn the whole batch away like a single request
+            return rate_limited_response(RateLimited(limited[0]['reason'],
+                                                     max(item['retry_after'] for item in limited)))
+        summary.update({
+            'total': len(items),
+            'seconds': round(elapsed, 3),
+            'quizzes_per_minute': round((summary['created'] + summary['cached']) / elapsed * 60, 2) if elapsed else 0.0
+        })
+        return jsonify({
+            'success': summary['created'] + summary['cached'] > 0,
+            'items': items,
+            'summary': summary
+        })
+
+    except Exception as e:
+        logger.exception("Error in batch generate route: %s", e)
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred. Please try again.'
+        }), 500
+
+def run_generation_job(params, progress):
+    """Job runner: extract, generate and store a quiz outside of a request"""
+    video_url = params['video_url']
+    num_questions = params['num_questions']
+    language = params['language']
+    window = params.get('window')
+    taker = params.get('taker')
+
+    cache_key = get_quiz_cache_key(video_url, language, num_questions, window)
+    if not params.get('refresh') and not taker:
+        cached = find_cached_quiz(cache_key)
+        if cached:
+            return cached[0]
+
+    quiz_id, questions = create_quiz(video_url, num_questions, language, cache_key, progress, window,
+                                     max_wait=GENERATION_BACKGROUND_WAIT, taker=taker)
+    return quiz_id
+
+job_queue = JobQueue(run_generation_job, max_workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    try:
+        params, error = validate_generation_request(request.get_json())
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+
+        # Jobs that will be served from the quiz cache or the question bank
+        # are not rate limited, as for /generate_quiz
+        cache_key = get_quiz_cache_key(params['video_url'], params['language'], params['num_questions'],
+                                       params['window'])
+        cached = not params['refresh'] and not params['taker'] and find_cached_quiz(cache_key)
+        if not cached and not bank_can_fill(params['video_url'], params['language'], params['num_questions'],
+                                            params['window'], params['taker']):
+            try:
+                generation_admission.admit(client_address())
+            except RateLimited as e:
+                return rate_limited_response(e)
+
+        try:
+            job_id = job_queue.submit(params)
+        except QueueFullError as e:
+            return jsonify({'success': False, 'error': str(e)}), 503
+
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f"{get_base_url()}/jobs/{job_id}"
+        }), 202
+
+    except Exception as e:
+        logger.exception("Error submitting job: %s", e)
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred. Please try again.'
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    # ?wait=N long-polls for up to N seconds until the job finishes
+    wait = min(request.args.get('wait', 0, type=float), JOB_MAX_WAIT)
+    job = job_queue.wait(job_id, wait) if wait > 0 else job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    job['success'] = True
+    job['share_url'] = f"{get_base_url()}/quiz/{job['quiz_id']}" if job['quiz_id'] else None
+    return jsonify(job)
+
+@app.template_filter('timestamp')
+def timestamp_filter(seconds):
+    return format_time(seconds)
+
+def quiz_page_etag(quiz_id):
+    """Strong ETag for a quiz page: quizzes are immutable, so only the template can change it"""
+    return f"{quiz_id}-{QUIZ_PAGE_VERSION}"
+
+def quiz_page_response(body, etag, status=200):
+    response = app.make_response((body, status))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={QUIZ_PAGE_MAX_AGE}'
+    return response
 
 @app.route('/quiz/<quiz_id>', methods=['GET'])
 def get_quiz(quiz_id):
     try:
-        conn = sqlite3.connect('quizzes.db')
-        c = conn.cursor()
-        c.execute('SELECT youtube_url, questions, language FROM quizzes WHERE id = ?', (quiz_id,))
-        result = c.fetchone()
-        conn.close()
-        
-        if not result:
-            return jsonify({"error": "Quiz not found"}), 404
-            
-        youtube_url, questions_json, language = result
-        
-        # Parse questions JSON
+        # Browsers and proxies revalidating a page they already have
+        etag = quiz_page_etag(quiz_id)
+        if request.if_none_match.contains(etag):
+            return quiz_page_response('', etag, 304)
+
+        html = quiz_page_cache.get(quiz_id)
+        if html is not None:
+            return quiz_page_response(html, etag)
+
+        # Load and parse the stored quiz
         try:
-            questions = json.loads(questions_json) if isinstance(questions_json, str) else questions_json
+            with metrics.span('db_load_quiz'):
+                quiz = storage.get_quiz(quiz_id)
+            if not quiz:
+                return jsonify({"error": "Quiz not found"}), 404
+
+            youtube_url = quiz['youtube_url']
+            questions = quiz['questions']
+            language = quiz['language']
             
-            # Ensure questions is a list
+            # Ensure questions is a list (index0 is set by the storage layer)
             if not isinstance(questions, list):
                 return jsonify({"error": "Invalid quiz format"}), 500
                 
-            # Add index0 for each question (used in template)
-            for i, q in enumerate(questions):
-                q['index0'] = i
-                
         except (json.JSONDecodeError, TypeError) as e:
-            print(f"Error parsing quiz data: {str(e)}")
+            logger.error("Error parsing quiz data: %s", e)
             return jsonify({"error": "Invalid quiz data"}), 500
         
-        return render_template(
-            'quiz.html',
-            youtube_url=youtube_url,
-            questions=questions,
-            quiz_id=quiz_id,
-            language=language
-        )
+        with metrics.span('render_quiz_page'):
+            html = render_template(
+                'quiz.html',
+                youtube_url=youtube_url,
+                video_id=extract_youtube_id(youtube_url),
+                questions=questions,
+                quiz_id=quiz_id,
+                language=language
+            )
+        quiz_page_cache.set(quiz_id, html, size=len(html))
+        return quiz_page_response(html, etag)
         
     except Exception as e:
-        print(f"Error retrieving quiz: {str(e)}")
+        logger.exception("Error retrieving quiz: %s", e)
         return jsonify({"error": str(e)}), 500
 
+@app.before_request
+def start_request_metrics():
+    if not metrics.ENABLED:
+        return
+    g.request_started = time.perf_counter()
+    if PROFILE_TOKEN and request.headers.get('X-Profile') == PROFILE_TOKEN:
+        g.profiling = True
+        metrics.start_trace(profile=True)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    # The route pattern rather than the path, so quiz IDs do not each get a series
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('http_request_duration_seconds', elapsed, endpoint=endpoint, method=request.method)
+    metrics.inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+
+    if g.pop('profiling', False):
+        spans, profiler = metrics.finish_trace()
+        response.headers['Server-Timing'] = metrics.server_timing(spans, elapsed)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unmatched'}-{uuid.uuid4().hex[:6]}"
+        try:
+            path, summary = metrics.save_profile(profiler, PROFILE_DIR, name)
+            response.headers['X-Profile-File'] = path
+            logger.info("Profile of %s %s saved to %s\n%s", request.method, request.path, path, summary)
+        except OSError as e:
+            logger.warning("Could not save profile: %s", e)
+    return response
+
+@app.teardown_request
+def stop_request_profiling(error=None):
+    # after_request is skipped when a request fails; never leave a profiler running
+    if g.pop('profiling', False):
+        metrics.finish_trace()
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, stage and model metrics plus cache and database gauges for Prometheus"""
+    quiz_stats = get_quiz_cache_stats()
+    page_stats = quiz_page_cache.stats()
+    store_stats = content_store.get_stats()
+    store_lookups = store_stats['hits'] + store_stats['misses']
+    storage_stats = storage.get_stats()
+    llm_stats = get_backend().stats()
+    budget_stats = prompt_budget.get_stats()
+    admission_stats = generation_admission.stats()
+    bank_stats = question_bank.get_stats()
+
+    hit_ratio_help = 'Hit ratio of each cache since the process started'
+    samples = [
+        ('cache_hit_ratio', 'gauge', hit_ratio_help, {'cache': 'quiz'}, quiz_stats['overall_hit_ratio']),
+        ('cache_hit_ratio', 'gauge', hit_ratio_help, {'cache': 'quiz_page'}, page_stats['hit_ratio']),
+        ('cache_hit_ratio', 'gauge', hit_ratio_help, {'cache': 'content_store'},
+         round(store_stats['hits'] / store_lookups, 4) if store_lookups else 0.0)
+    ]
+    if llm_stats['cache']:
+        samples.append(('cache_hit_ratio', 'gauge', hit_ratio_help, {'cache': 'llm_response'},
+                        llm_stats['cache']['hit_ratio']))
+    samples += [
+        ('db_transactions_total', 'counter', 'SQLite write transactions', {}, storage_stats['transactions']),
+        ('db_lock_waits_total', 'counter', 'Write transactions that waited over 1 ms for the lock', {},
+         storage_stats['lock_waits']),
+        ('llm_in_flight', 'gauge', 'Model calls currently running', {'backend': llm_stats['backend']},
+         llm_stats['in_flight']),
+        ('prompt_tokens_saved_total', 'counter', 'Prompt tokens removed by deduplication and trimming', {},
+         budget_stats['saved_tokens']),
+        ('quiz_parse_failure_ratio', 'gauge', 'Share of model responses that needed a fallback or repair', {},
+         quiz_parser.get_stats()['parse_failure_rate']),
+        ('admission_admitted_total', 'counter', 'Generation requests let through the rate limits', {},
+         admission_stats['admitted']),
+        ('question_bank_drawn_total', 'counter', 'Questions reused from the question bank', {},
+         bank_stats['drawn']),
+        ('question_bank_added_total', 'counter', 'New questions added to the question bank', {},
+         bank_stats['added'])
+    ]
+    for reason in ('client', 'global', 'busy', 'backoff'):
+        samples.append(('admission_rejected_total', 'counter', 'Generation requests answered with 429, by reason',
+                        {'reason': reason}, admission_stats[f'rejected_{reason}']))
+    samples += [
+        ('admission_waiting', 'gauge', 'Generations waiting for a slot', {}, admission_stats['waiting']),
+        ('admission_in_flight', 'gauge', 'Generations holding a slot', {}, admission_stats['in_flight']),
+        ('admission_limit', 'gauge', 'Current concurrent generation limit, lowered while upstream throttles', {},
+         admission_stats['limit']),
+        ('llm_rate_limited_total', 'counter', 'Model calls rejected by the API with HTTP 429',
+         {'backend': llm_stats['backend']}, llm_stats['rate_limited'])
+    ]
+    return Response(metrics.render_prometheus(samples), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'quiz_cache': get_quiz_cache_stats(),
+        'quiz_page_cache': quiz_page_cache.stats(),
+        'content_store': content_store.get_stats(storage.get_connection()),
+        'transcript_index': transcript_index.get_stats(storage.get_connection()),
+        'question_bank': question_bank.get_stats(storage.get_connection()),
+        'storage': storage.get_stats(),
+        'transcripts': transcript_resolver.stats(),
+        'jobs': job_queue.stats(),
+        'admission': generation_admission.stats(),
+        'long_content': long_content.get_stats(),
+        'extraction': extraction.get_stats(),
+        'prompt_budget': prompt_budget.get_stats(),
+        'parsing': quiz_parser.get_stats(),
+        'llm': get_backend().stats(),
+        'http': http_clients.get_stats(),
+        'metrics': metrics.get_stats(),
+        'logging': log_config.get_stats(),
+        'coalescing': {
+            'extraction': extraction_flight.stats(),
+            'generation': generation_flight.stats()
+        }
+    })
+
 @app.route('/test_api')
 def test_api():
     try:
-        print("\nTesting API key...")
-        print(f"Current OpenAI API Key: {openai.api_key[:10]}...{openai.api_key[-4:]}")
-        
-        # Initialize the OpenAI client
-        client = openai.OpenAI()
+        logger.info("Testing %s backend...", LLM_BACKEND)
+        if openai.api_key:
+            logger.debug("Current OpenAI API Key: %s...%s", openai.api_key[:10], openai.api_key[-4:])
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "user", "content": "Say 'API test successful' if you can read this."}
-            ]
+        test_response, usage = get_backend().complete(
+            [{"role": "user", "content": "Say 'API test successful' if you can read this."}]
         )
-        
-        test_response = response.choices[0].message.content
-        print(f"OpenAI API Response: {test_response}")
+        logger.info("LLM API Response: %s", test_response)
         
         return jsonify({
             'success': True,
@@ -509,13 +1492,15 @@ def test_api():
         })
         
     except Exception as e:
-        print(f"API Test Error: {str(e)}")
+        logger.error("API Test Error: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 400
 
 if __name__ == '__main__':
-    print("Starting Flask application...")
-    print(f"OpenAI API Key configured: {'Yes' if openai.api_key else 'No'}")
-    app.run(debug=True, port=5004)
+    logger.info("Starting Flask application...")
+    storage.init_db()
+    storage.fail_interrupted_jobs()
+    logger.info("OpenAI API Key configured: %s", 'Yes' if openai.api_key else 'No')
+    app.run(debug=FLASK_DEBUG, port=PORT)
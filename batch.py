@@ -0,0 +1,79 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+PLAYLIST_VIDEO_RE = re.compile(r'"videoId":"([\w-]{11})"')
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_executor(name, max_workers):
+    """Return a shared pool so the concurrency cap holds across concurrent batches"""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'batch-{name}')
+            _executors[name] = executor
+        return executor
+
+def expand_playlist(html, limit=None):
+    """Return watch URLs for the videos listed in a YouTube playlist page, in order"""
+    video_ids = []
+    for video_id in PLAYLIST_VIDEO_RE.findall(html):
+        if video_id not in video_ids:
+            video_ids.append(video_id)
+            if limit and len(video_ids) >= limit:
+                break
+    return [f"https://www.youtube.com/watch?v={video_id}" for video_id in video_ids]
+
+def run_batch(items, extract, generate, extract_workers=4, generate_workers=2):
+    """Run extraction and generation for many items as a two-stage pipeline
+
+    extract(item) returns the content for an item, or a finished result
+    dict (e.g. a cache hit) to skip generation. generate(item, content)
+    returns a result dict. Extraction runs ahead on its own pool, and each
+    item moves to the (smaller) generation pool as soon as its content is
+    ready, so transcript fetches overlap with model calls.
+
+    Returns one result dict per item, in input order.
+    """
+    started = time.perf_counter()
+    results = [None] * len(items)
+    item_started = [started] * len(items)
+
+    def failed(index, stage, error):
+        return {'status': 'failed', 'stage': stage, 'error': str(error)}
+
+    extract_pool = get_executor('extract', extract_workers)
+    generate_pool = get_executor('generate', generate_workers)
+
+    def timed_extract(index):
+        item_started[index] = time.perf_counter()
+        return extract(items[index])
+
+    extract_futures = {extract_pool.submit(timed_extract, index): index
+                       for index in range(len(items))}
+    generate_futures = {}
+    for future in as_completed(extract_futures):
+        index = extract_futures[future]
+        try:
+            content = future.result()
+        except Exception as e:
+            results[index] = failed(index, 'extracting', e)
+            continue
+        if isinstance(content, dict):
+            results[index] = content
+            continue
+        generate_futures[generate_pool.submit(generate, items[index], content)] = index
+
+    for future in as_completed(generate_futures):
+        index = generate_futures[future]
+        try:
+            results[index] = future.result()
+        except Exception as e:
+            results[index] = failed(index, 'generating', e)
+
+    for index, result in enumerate(results):
+        result['seconds'] = round(time.perf_counter() - item_started[index], 3)
+    return results
@@ -0,0 +1,105 @@
+"""Bursts of /generate_quiz against a rate-limited model, with and without admission control
+
+--clients clients each need one quiz and send their requests at the same
+moment. The fake backend accepts --capacity concurrent calls and answers
+the rest with HTTP 429 style errors, like an API tier's rate limit.
+Without admission control every request goes straight to the model;
+clients retry failures after --retry-delay. With it, generations are
+limited to --capacity slots, requests wait up to --max-wait for one and
+clients wait for the Retry-After of their 429s. Reports how long until
+every client has its quiz, failed generations, 429 responses and model
+calls rejected upstream. YouTube is stubbed as in bench_endpoints.py.
+Usage: python benchmarks/bench_admission.py [--clients 48] [--capacity 4] [--llm-latency 1.0] [--max-wait 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+def run_burst(quiz_app, label, clients, retry_delay, max_attempts=50):
+    barrier = threading.Barrier(clients)
+    statuses = {'failed': 0, '429': 0}
+    lock = threading.Lock()
+
+    def client(index):
+        http = quiz_app.app.test_client()
+        # An 11-character video ID, or the URL is fetched as a web page
+        url = f'https://www.youtube.com/watch?v={label[:5]:x<5}{index:06d}'
+        barrier.wait()
+        started = time.perf_counter()
+        for _ in range(max_attempts):
+            response = http.post('/generate_quiz', json={'video_url': url, 'num_questions': 5},
+                                 environ_base={'REMOTE_ADDR': f'10.0.{index // 256}.{index % 256}'})
+            if response.status_code == 200:
+                return time.perf_counter() - started
+            with lock:
+                statuses['429' if response.status_code == 429 else 'failed'] += 1
+            if response.status_code == 429:
+                time.sleep(float(response.headers['Retry-After']))
+            else:
+                time.sleep(retry_delay)
+        return None
+
+    backend = quiz_app.get_backend()
+    rate_limited = backend.stats()['rate_limited']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(client, range(clients)))
+    return {
+        'seconds': time.perf_counter() - started,
+        'served': sum(1 for latency in latencies if latency is not None),
+        'failed': statuses['failed'],
+        'rejected': statuses['429'],
+        'upstream_429s': backend.stats()['rate_limited'] - rate_limited,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=48)
+    parser.add_argument('--capacity', type=int, default=4, help='concurrent calls the fake model accepts')
+    parser.add_argument('--llm-latency', type=float, default=1.0)
+    parser.add_argument('--max-wait', type=float, default=5.0, help='seconds a request waits for a slot')
+    parser.add_argument('--retry-delay', type=float, default=0.25, help='client retry delay after a failure')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'QUIZ_DB_PATH': os.path.join(tmp, 'bench.db'),
+            'LLM_BACKEND': 'fake',
+            'FAKE_LLM_LATENCY': str(args.llm_latency),
+            'FAKE_LLM_CAPACITY': str(args.capacity),
+            'LLM_MAX_CONCURRENCY': str(args.clients * 2),
+            'LOG_LEVEL': 'WARNING',
+        })
+        import admission
+        import llm_backends
+        import app as quiz_app
+        from bench_endpoints import install_stubs
+        install_stubs(quiz_app, 0.0)
+
+        results = {}
+        for label, controller in [
+                ('none', admission.AdmissionController(max_concurrency=args.clients * 2)),
+                ('admission', admission.AdmissionController(max_concurrency=args.capacity,
+                                                            max_wait=args.max_wait, backoff_max=5.0))]:
+            quiz_app.generation_admission = controller
+            if label == 'admission':
+                llm_backends.add_rate_limit_listener(controller.throttled)
+            results[label] = run_burst(quiz_app, label, args.clients, args.retry_delay)
+
+    print(f"{args.clients} clients at once, model capacity {args.capacity} calls, {args.llm_latency}s per call")
+    for label, title in [('none', 'No admission control'), ('admission', 'Admission control')]:
+        result = results[label]
+        print(f"{title + ':':22s} all served in {result['seconds']:6.2f}s ({result['served']}/{args.clients}), "
+              f"{result['failed']:4d} failed generations, {result['rejected']:4d} 429 responses, "
+              f"{result['upstream_429s']:4d} upstream 429s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""Latency percentiles, throughput and error rates for the main Flask endpoints
+
+Drives /, /quiz/<id> and /generate_quiz (YouTube and web sources, cold and
+cached) in-process with concurrent clients against a temporary database.
+YouTube transcripts and web pages are stubbed with synthetic captions and
+the saved pages in benchmarks/corpus, each fetch taking --upstream-latency;
+the model is the fake LLM backend, or an OpenAI-compatible server such as
+benchmarks/fake_openai_server.py with --openai-base-url.
+
+--output writes the results as JSON. --baseline compares them with an
+earlier run and exits with status 1 if any scenario's p95 latency,
+throughput or error rate regressed by more than --max-regression.
+Usage: python benchmarks/bench_endpoints.py [--concurrency 8] [--requests 500] [--generate-requests 100]
+       [--llm-latency 0.2] [--output results.json] [--baseline baseline.json]
+"""
+import argparse
+import contextlib
+import glob
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CORPUS = os.path.join(ROOT, 'benchmarks', 'corpus')
+
+# Differences below this are timer noise, not regressions
+MIN_LATENCY_DELTA_MS = 2.0
+MAX_ERROR_RATE_DELTA = 0.01
+
+TOPICS = ['photosynthesis', 'chlorophyll', 'glucose', 'respiration', 'mitochondria',
+          'enzymes', 'carbon dioxide', 'oxygen', 'sunlight', 'water']
+
+def make_segments(video_id, count=300):
+    """Synthetic caption segments, distinct per video"""
+    offset = sum(map(ord, video_id))
+    return [{
+        'text': f'[Music] Point {i} explains how {TOPICS[(i + offset) % len(TOPICS)]} '
+                f'relates to {TOPICS[(i * 3 + offset) % len(TOPICS)]} in video {video_id}.',
+        'start': i * 4.0,
+        'duration': 4.0
+    } for i in range(count)]
+
+class FakePageResponse:
+    """Just enough of requests.Response for app._extract_content"""
+
+    def __init__(self, url, body):
+        self.url = url
+        self.status_code = 200
+        self.encoding = 'utf-8'
+        self.headers = {'Content-Type': 'text/html; charset=utf-8'}
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+def install_stubs(quiz_app, upstream_latency):
+    """Replace YouTube and web fetches in the app with local stand-ins"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(CORPUS, '*.html'))):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+
+    def list_tracks(video_id):
+        time.sleep(upstream_latency)
+        track = {'language_code': 'en', 'language': 'English', 'is_generated': False,
+                 'is_translatable': True, 'url': f'https://captions.example.com/{video_id}?lang=en'}
+        return [track], ['hi']
+
+    def fetch_track(video_id, url):
+        time.sleep(upstream_latency)
+        return make_segments(video_id)
+
+    @contextlib.contextmanager
+    def stream_url(url, headers=None):
+        time.sleep(upstream_latency)
+        yield FakePageResponse(url, pages[sum(map(ord, url)) % len(pages)])
+
+    quiz_app.transcript_resolver.list_tracks = list_tracks
+    quiz_app.transcript_resolver.fetch_track = fetch_track
+    quiz_app.stream_url = stream_url
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies, errors, seconds, statuses):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'statuses': statuses,
+        'seconds': round(seconds, 3),
+        'throughput': round(count / seconds, 2) if seconds else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 2) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if count else 0.0
+    }
+
+def run_scenario(app, make_request, total, concurrency):
+    """Send total requests from concurrency threads and summarize them
+
+    make_request(client, index) sends request number index and returns the
+    response; statuses >= 400, unsuccessful JSON bodies and exceptions count
+    as errors.
+    """
+    latencies = []
+    statuses = {}
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            started = time.perf_counter()
+            try:
+                response = make_request(client, index)
+                status = response.status_code
+                failed = status >= 400 or (response.is_json and response.get_json().get('success') is False)
+            except Exception:
+                status = 'exception'
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                errors[0] += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return summarize(latencies, errors[0], time.perf_counter() - started, statuses)
+
+def generate_payload(url, num_questions):
+    return {'video_url': url, 'num_questions': num_questions, 'language': 'en'}
+
+def run_benchmark(args):
+    import app as quiz_app
+    import storage
+
+    install_stubs(quiz_app, args.upstream_latency)
+    app = quiz_app.app
+    run_id = uuid.uuid4().hex[:6]
+    video_urls = [f'https://www.youtube.com/watch?v=b{run_id}{i:04d}' for i in range(args.generate_requests)]
+    web_urls = [f'https://pages.example.com/{run_id}/article-{i}' for i in range(args.generate_requests)]
+
+    # Quizzes for /quiz/<id>, stored directly so that scenario does not depend on generation
+    quiz_ids = []
+    for i in range(args.quizzes):
+        quiz_id = str(uuid.uuid4())
+        questions = [{
+            'question': f'Which statement about {topic} is correct?',
+            'options': [f'{letter}) Statement {letter} about {topic}' for letter in 'ABCD'],
+            'correct_answer': 'C) Statement C about ' + topic,
+            'explanation': f'The video explains {topic} in detail.'
+        } for topic in TOPICS[:args.num_questions]]
+        storage.insert_quiz(quiz_id, f'https://www.youtube.com/watch?v=seed{i:07d}', questions, 'en')
+        quiz_ids.append(quiz_id)
+
+    scenarios = [
+        ('home', args.requests, lambda client, i: client.get('/')),
+        ('quiz_page', args.requests,
+         lambda client, i: client.get(f'/quiz/{quiz_ids[i % len(quiz_ids)]}')),
+        ('generate_youtube', args.generate_requests,
+         lambda client, i: client.post('/generate_quiz', json=generate_payload(video_urls[i], args.num_questions))),
+        ('generate_web', args.generate_requests,
+         lambda client, i: client.post('/generate_quiz', json=generate_payload(web_urls[i], args.num_questions))),
+        # The same sources again, now served from the quiz cache
+        ('generate_cached', args.generate_requests,
+         lambda client, i: client.post('/generate_quiz', json=generate_payload(video_urls[i], args.num_questions)))
+    ]
+    results = {}
+    for name, total, make_request in scenarios:
+        if args.scenarios and name not in args.scenarios:
+            continue
+        if total <= 0:
+            continue
+        results[name] = run_scenario(app, make_request, total, args.concurrency)
+        print_result(name, results[name])
+    return results
+
+def print_result(name, result):
+    print(f"{name:<18} {result['requests']:>6} req  {result['throughput']:>9.1f} req/s  "
+          f"p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms  "
+          f"p99 {result['p99_ms']:>8.1f} ms  errors {result['error_rate'] * 100:5.1f}%")
+
+def compare(results, baseline, max_regression):
+    """Return a list of regression messages against a baseline run's scenarios"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        p95_limit = previous['p95_ms'] * (1 + max_regression)
+        if current['p95_ms'] > p95_limit and current['p95_ms'] - previous['p95_ms'] > MIN_LATENCY_DELTA_MS:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.1f} ms vs {previous['p95_ms']:.1f} ms")
+        if current['throughput'] < previous['throughput'] * (1 - max_regression):
+            regressions.append(f"{name}: throughput {current['throughput']:.1f} req/s vs "
+                               f"{previous['throughput']:.1f} req/s")
+        if current['error_rate'] > previous['error_rate'] + MAX_ERROR_RATE_DELTA:
+            regressions.append(f"{name}: error rate {current['error_rate']:.2%} vs {previous['error_rate']:.2%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='requests for / and /quiz/<id>')
+    parser.add_argument('--generate-requests', type=int, default=100, help='requests per /generate_quiz scenario')
+    parser.add_argument('--num-questions', type=int, default=5)
+    parser.add_argument('--quizzes', type=int, default=100, help='stored quizzes for /quiz/<id>')
+    parser.add_argument('--scenarios', nargs='*', help='only run these scenarios')
+    parser.add_argument('--upstream-latency', type=float, default=0.05,
+                        help='seconds per stubbed YouTube or web fetch')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='seconds per fake model call')
+    parser.add_argument('--llm-tokens-per-second', type=float, default=0.0)
+    parser.add_argument('--openai-base-url', help='use an OpenAI-compatible server instead of the fake backend')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed relative increase in p95 / drop in throughput')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['QUIZ_DB_PATH'] = os.path.join(tmp, 'bench.db')
+        if args.openai_base_url:
+            os.environ['LLM_BACKEND'] = 'openai'
+            os.environ['OPENAI_BASE_URL'] = args.openai_base_url
+            os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark-placeholder')
+        else:
+            os.environ['LLM_BACKEND'] = 'fake'
+            os.environ['FAKE_LLM_LATENCY'] = str(args.llm_latency)
+            os.environ['FAKE_LLM_TOKENS_PER_SECOND'] = str(args.llm_tokens_per_second)
+        # Every generation should reach the backend, not the response cache
+        os.environ['LLM_CACHE_TTL'] = '0'
+        # All requests come from one address; measure the app, not the rate limits
+        os.environ['RATE_LIMIT_PER_MINUTE'] = '0'
+        os.environ['CLIENT_RATE_LIMIT_PER_MINUTE'] = '0'
+        # The app logs every request step; keep the report readable (LOG_LEVEL=INFO to see them)
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        results = run_benchmark(args)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'scenarios': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get('scenarios', {}), args.max_regression)
+        if regressions:
+            print(f"Regressions beyond {args.max_regression:.0%} against {args.baseline}:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+if __name__ == '__main__':
+    main()
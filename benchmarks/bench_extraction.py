@@ -0,0 +1,124 @@
+"""Web page text extraction: the original BeautifulSoup pipeline vs the streaming extractor
+
+Runs over the saved pages in benchmarks/corpus. Each page has an
+.expected.txt file of main-content sentences and a .boilerplate.txt file
+of navigation/footer/comment phrases; quality is the share of expected
+sentences found and the share of boilerplate phrases left in the output.
+Exits with status 1 if the streaming extractor misses an expected sentence
+on any page (body_class, wrapper_class and hinted_wrapper_main cover page
+wrappers whose class looks like boilerplate).
+Usage: python benchmarks/bench_extraction.py [--iterations 200] [--large-mb 4]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import extraction
+from bs4 import BeautifulSoup
+
+CORPUS = os.path.join(ROOT, 'benchmarks', 'corpus')
+
+def legacy_extract(body):
+    """The extraction previously inlined in app._extract_content"""
+    soup = BeautifulSoup(body.decode('utf-8', errors='replace'), 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+def streaming_extract(body, parser=None):
+    return extraction.extract_text(extraction.iter_chunks(body), encoding='utf-8', parser=parser)
+
+def read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [' '.join(line.split()) for line in f if line.strip()]
+
+def quality(text, expected, boilerplate):
+    recall = sum(line in text for line in expected) / len(expected) if expected else 1.0
+    noise = sum(line in text for line in boilerplate) / len(boilerplate) if boilerplate else 0.0
+    return recall, noise
+
+def time_per_call(fn, body, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(body)
+    return (time.perf_counter() - started) / iterations * 1000
+
+def peak_memory(fn, body):
+    tracemalloc.start()
+    try:
+        fn(body)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def large_page(pages, target_bytes):
+    """Build one big page by repeating the corpus bodies, like a long forum thread"""
+    bodies = []
+    for body in pages:
+        start = body.find(b'<body')
+        end = body.rfind(b'</body>')
+        bodies.append(body[body.find(b'>', start) + 1:end])
+    parts = [b'<html><head><title>Large page</title></head><body>']
+    size = 0
+    while size < target_bytes:
+        for part in bodies:
+            parts.append(b'<div class="post">' + part + b'</div>')
+            size += len(part)
+    parts.append(b'</body></html>')
+    return b''.join(parts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--large-mb', type=float, default=4)
+    args = parser.parse_args()
+
+    extractors = [('legacy bs4', legacy_extract), ('html.parser', lambda body: streaming_extract(body, 'html.parser'))]
+    if extraction.etree is not None:
+        extractors.append(('lxml', lambda body: streaming_extract(body, 'lxml')))
+    else:
+        print("lxml not installed; benchmarking the html.parser fallback only\n")
+
+    pages = []
+    missed = []
+    print(f"{'page':<20} {'extractor':<12} {'ms/page':>8} {'peak KiB':>9} {'chars':>7} {'recall':>7} {'noise':>6}")
+    for path in sorted(glob.glob(os.path.join(CORPUS, '*.html'))):
+        name = os.path.basename(path)[:-len('.html')]
+        with open(path, 'rb') as f:
+            body = f.read()
+        pages.append(body)
+        expected = read_lines(os.path.join(CORPUS, f'{name}.expected.txt'))
+        boilerplate = read_lines(os.path.join(CORPUS, f'{name}.boilerplate.txt'))
+        for label, fn in extractors:
+            text = fn(body)
+            recall, noise = quality(text, expected, boilerplate)
+            if recall < 1.0 and fn is not legacy_extract:
+                missed.append(f"{name} ({label})")
+            print(f"{name:<20} {label:<12} {time_per_call(fn, body, args.iterations):>8.2f} "
+                  f"{peak_memory(fn, body) / 1024:>9.0f} {len(text):>7} {recall:>7.0%} {noise:>6.0%}")
+
+    body = large_page(pages, int(args.large_mb * 1024 * 1024))
+    print(f"\nLarge page ({len(body) / 1024 / 1024:.1f} MiB)")
+    for label, fn in extractors:
+        started = time.perf_counter()
+        text = fn(body)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{label:<12} {elapsed:>8.0f} ms  peak {peak_memory(fn, body) / 1024 / 1024:>6.1f} MiB  "
+              f"{len(text) / 1024:.0f} KiB of text")
+
+    if missed:
+        print(f"\nMissing main-content sentences: {', '.join(missed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
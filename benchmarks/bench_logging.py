@@ -0,0 +1,100 @@
+"""/generate_quiz throughput: synchronous full-payload logging vs the queued, sampled logger
+
+Before: every record written synchronously at DEBUG, with each transcript
+and model response logged in full (what the print statements did). After:
+the defaults, INFO through the background queue with 1% payload sampling.
+Log output goes to a file in a temporary directory, once as is and once
+behind --write-delay per write, standing in for a terminal or a log pipe
+whose reader falls behind. Transcripts, pages and the model are stubbed as
+in bench_endpoints.py, with no simulated latency so logging cost is not
+hidden behind waiting.
+Usage: python benchmarks/bench_logging.py [--requests 400] [--threads 8] [--write-delay 0.0005]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+class SlowStream:
+    """A file whose writes each take delay seconds"""
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def run(app, urls, threads):
+    def worker(chunk):
+        client = app.test_client()
+        for url in chunk:
+            response = client.post('/generate_quiz', json={'video_url': url, 'num_questions': 5})
+            assert response.status_code == 200, response.get_json()
+
+    chunks = [urls[i::threads] for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, chunks))
+    return len(urls) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--write-delay', type=float, default=0.0005, help='seconds per write to the slow sink')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['QUIZ_DB_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['LLM_BACKEND'] = 'fake'
+        os.environ['METRICS_ENABLED'] = '0'
+        os.environ['RATE_LIMIT_PER_MINUTE'] = '0'
+        os.environ['CLIENT_RATE_LIMIT_PER_MINUTE'] = '0'
+        log_path = os.path.join(tmp, 'app.log')
+        log_file = open(log_path, 'a')
+
+        import log_config
+        log_config.setup_logging('INFO', use_queue=False, stream=log_file)
+        import app as quiz_app
+        from bench_endpoints import install_stubs
+        install_stubs(quiz_app, 0.0)
+
+        results = {}
+        for sink, stream in [('file', log_file), ('slow sink', SlowStream(log_file, args.write_delay))]:
+            for label, level, use_queue, sample_rate, max_chars in [
+                    ('before', 'DEBUG', False, '1', str(10 ** 9)),
+                    ('after', 'INFO', True, '0.01', '500')]:
+                os.environ['LOG_PAYLOAD_SAMPLE_RATE'] = sample_rate
+                os.environ['LOG_PAYLOAD_MAX_CHARS'] = max_chars
+                log_config.shutdown()
+                log_config.setup_logging(level, use_queue=use_queue, stream=stream)
+                size = os.path.getsize(log_path)
+                # Fresh video IDs so every request extracts and generates
+                prefix = f"{sink[0]}{label[0]}"
+                urls = [f'https://www.youtube.com/watch?v={prefix}{i:09d}' for i in range(args.requests)]
+                throughput = run(quiz_app.app, urls, args.threads)
+                log_config.shutdown()
+                log_file.flush()
+                results[sink, label] = (throughput, (os.path.getsize(log_path) - size) / args.requests / 1024)
+        log_file.close()
+
+    for sink in ('file', 'slow sink'):
+        before, before_kib = results[sink, 'before']
+        after, after_kib = results[sink, 'after']
+        print(f"{sink}: synchronous, DEBUG, full payloads (before): {before:7.1f} req/s, {before_kib:6.1f} KiB/request")
+        print(f"{sink}: queued, INFO, sampled payloads:             {after:7.1f} req/s, {after_kib:6.1f} KiB/request "
+              f"({after / before:.2f}x)")
+
+if __name__ == '__main__':
+    main()
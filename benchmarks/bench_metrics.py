@@ -0,0 +1,69 @@
+"""Cost of metrics.span() and request metrics, enabled vs METRICS_ENABLED=0
+
+Times an empty instrumented block against an uninstrumented one, then
+requests/second for / through the Flask app with metrics on and off.
+Usage: python benchmarks/bench_metrics.py [--spans 200000] [--requests 3000]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import metrics
+
+def time_spans(count):
+    started = time.perf_counter()
+    for _ in range(count):
+        with metrics.span('bench'):
+            pass
+    return (time.perf_counter() - started) / count
+
+def time_bare(count):
+    started = time.perf_counter()
+    for _ in range(count):
+        pass
+    return (time.perf_counter() - started) / count
+
+def requests_per_second(app, count):
+    client = app.test_client()
+    started = time.perf_counter()
+    for _ in range(count):
+        assert client.get('/').status_code == 200
+    return count / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spans', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=3000)
+    args = parser.parse_args()
+
+    bare = time_bare(args.spans)
+    metrics.ENABLED = True
+    enabled = time_spans(args.spans)
+    metrics.ENABLED = False
+    disabled = time_spans(args.spans)
+    print(f"Empty block:               {bare * 1e9:7.0f} ns")
+    print(f"span(), metrics enabled:   {enabled * 1e9:7.0f} ns")
+    print(f"span(), METRICS_ENABLED=0: {disabled * 1e9:7.0f} ns")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['QUIZ_DB_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['LLM_BACKEND'] = 'fake'
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            import app as quiz_app
+        app = quiz_app.app
+        requests_per_second(app, 200)
+
+        metrics.ENABLED = True
+        on = requests_per_second(app, args.requests)
+        metrics.ENABLED = False
+        off = requests_per_second(app, args.requests)
+    print(f"GET /, metrics enabled:    {on:7.0f} req/s")
+    print(f"GET /, METRICS_ENABLED=0:  {off:7.0f} req/s (metrics cost {(off - on) / off:.1%})")
+
+if __name__ == '__main__':
+    main()
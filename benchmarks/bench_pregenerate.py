@@ -0,0 +1,81 @@
+"""First-request latency for /generate_quiz, generated on demand vs pre-generated
+
+Each of --videos lecture videos is requested once, as the first student
+to open it would. Cold: the quiz is generated inside the request. Warm:
+pregenerate.py has already stored every quiz, so the request is a cache
+lookup. Also reports how long pre-generation took with its parallel
+workers and the tokens it used. YouTube is stubbed as in
+bench_endpoints.py and the model is the fake backend.
+Usage: python benchmarks/bench_pregenerate.py [--videos 40] [--llm-latency 0.5] [--workers 4]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+def first_requests(quiz_app, urls):
+    http = quiz_app.app.test_client()
+    latencies = []
+    for url in urls:
+        started = time.perf_counter()
+        response = http.post('/generate_quiz', json={'video_url': url, 'num_questions': 5})
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_json()
+    return latencies
+
+def describe(latencies):
+    latencies = sorted(latencies)
+    return (f"p50 {statistics.median(latencies) * 1000:8.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--videos', type=int, default=40)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--workers', type=int, default=4, help='parallel pre-generations')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'QUIZ_DB_PATH': os.path.join(tmp, 'bench.db'),
+            'LLM_BACKEND': 'fake',
+            'FAKE_LLM_LATENCY': str(args.llm_latency),
+            'RATE_LIMIT_PER_MINUTE': '0',
+            'CLIENT_RATE_LIMIT_PER_MINUTE': '0',
+            'LOG_LEVEL': 'WARNING',
+        })
+        import app as quiz_app
+        import pregenerate
+        import storage
+        from bench_endpoints import install_stubs
+        storage.init_db()
+        install_stubs(quiz_app, 0.0)
+
+        cold = first_requests(quiz_app, [f'https://www.youtube.com/watch?v=cold{i:07d}' for i in range(args.videos)])
+
+        urls = [f'https://www.youtube.com/watch?v=warm{i:07d}' for i in range(args.videos)]
+        items, _ = pregenerate.build_items(quiz_app, pregenerate.read_url_list(urls), ['en'], [5])
+        budget = pregenerate.Budget(quiz_app.get_backend())
+        started = time.perf_counter()
+        results = pregenerate.pregenerate(quiz_app, items, budget, extract_workers=args.workers,
+                                          generate_workers=args.workers)
+        pregenerate_seconds = time.perf_counter() - started
+        assert all(result['status'] == 'created' for result in results)
+        prompt_tokens, completion_tokens = budget.spent()
+        warm = first_requests(quiz_app, urls)
+
+    print(f"{args.videos} videos, {args.llm_latency}s per model call")
+    print(f"Generated on first request: {describe(cold)}")
+    print(f"Pre-generated:              {describe(warm)}")
+    print(f"Pre-generation: {pregenerate_seconds:.2f}s with {args.workers} workers "
+          f"(sequential first requests took {sum(cold):.2f}s), "
+          f"{prompt_tokens + completion_tokens} tokens (~${budget.cost(prompt_tokens, completion_tokens):.4f})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Repeat quizzes for one video: a model call per quiz vs drawing from the question bank
+
+--takers students each ask /generate_quiz for --quizzes new quizzes of
+--questions questions about the same video, passing their own taker ID
+so later quizzes avoid questions they have seen. Before: every quiz is
+generated by the model (QUESTION_POOL_SIZE=0). After: the first
+generation fills a pool of --pool questions and later quizzes are drawn
+from it, going back to the model only when a taker has seen it all.
+Reports model calls, latency of the repeat quizzes and questions a
+taker saw twice. YouTube is stubbed as in bench_endpoints.py and the
+model is the fake backend with --llm-latency seconds per call.
+Usage: python benchmarks/bench_question_bank.py [--takers 20] [--quizzes 3] [--pool 15] [--llm-latency 0.5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+def run(args):
+    """Run the workload in this process with the environment already set up; print one result line"""
+    import app as quiz_app
+    import storage
+    from bench_endpoints import install_stubs
+    storage.init_db()
+    install_stubs(quiz_app, 0.0)
+
+    http = quiz_app.app.test_client()
+    url = 'https://www.youtube.com/watch?v=benchvideo1'
+    repeat_latencies = []
+    repeats = 0
+    for taker in range(args.takers):
+        seen = set()
+        for quiz in range(args.quizzes):
+            started = time.perf_counter()
+            response = http.post('/generate_quiz', json={'video_url': url, 'num_questions': args.questions,
+                                                         'taker': f'student{taker}'})
+            elapsed = time.perf_counter() - started
+            data = response.get_json()
+            assert data['success'], data
+            stems = {question['question'] for question in data['questions']}
+            repeats += len(stems & seen)
+            seen |= stems
+            if taker or quiz:
+                repeat_latencies.append(elapsed)
+    stats = quiz_app.get_backend().stats()
+    print(stats['calls'], statistics.median(repeat_latencies), repeats)
+
+def measure(args, pool_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, QUIZ_DB_PATH=os.path.join(tmp, 'bench.db'), LLM_BACKEND='fake',
+                   FAKE_LLM_LATENCY=str(args.llm_latency), QUESTION_POOL_SIZE=str(pool_size),
+                   RATE_LIMIT_PER_MINUTE='0', CLIENT_RATE_LIMIT_PER_MINUTE='0', LOG_LEVEL='WARNING')
+        # A fresh process per setting, since the app reads its configuration at import
+        output = subprocess.run([sys.executable, __file__, '--run'] + sys.argv[1:], env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+    calls, median, repeats = output[-3:]
+    return int(calls), float(median), int(repeats)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--takers', type=int, default=20)
+    parser.add_argument('--quizzes', type=int, default=3, help='quizzes per taker')
+    parser.add_argument('--questions', type=int, default=5)
+    parser.add_argument('--pool', type=int, default=15, help='QUESTION_POOL_SIZE')
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run(args)
+        return
+
+    quizzes = args.takers * args.quizzes
+    print(f"{args.takers} takers x {args.quizzes} quizzes of {args.questions} questions on one video, "
+          f"{args.llm_latency}s per model call")
+    for label, pool_size in [('Model call per quiz', 0), (f'Question bank ({args.pool})', args.pool)]:
+        calls, median, repeats = measure(args, pool_size)
+        print(f"{label + ':':24s} {calls:4d} model calls for {quizzes} quizzes, "
+              f"repeat quiz p50 {median * 1000:8.1f} ms, {repeats:4d} questions seen twice")
+
+if __name__ == '__main__':
+    main()
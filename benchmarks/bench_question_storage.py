@@ -0,0 +1,109 @@
+"""Database size and per-view decode cost: JSON blob per quiz vs the normalized questions table
+
+Usage: python benchmarks/bench_question_storage.py [--quizzes 3000] [--questions 7]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage
+
+WORDS = ('video lecture energy cell protein market history theory river engine language '
+         'number planet signal memory network climate contract design evidence method').split()
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def make_quiz(rng, count):
+    return [{
+        'question': sentence(rng, 12) + '?',
+        'options': [f'{letter}) {sentence(rng, 5)}' for letter in 'ABCD'],
+        'correct_answer': 'B)',
+        'explanation': sentence(rng, 20)
+    } for _ in range(count)]
+
+def build_blob_db(path, quizzes):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE quizzes (id TEXT PRIMARY KEY, youtube_url TEXT, questions TEXT,
+                              language TEXT, created_at TIMESTAMP)
+    ''')
+    conn.executemany('INSERT INTO quizzes VALUES (?, ?, ?, ?, ?)',
+                     [(quiz_id, 'https://www.youtube.com/watch?v=bench', json.dumps(questions), 'en', '2024-01-01')
+                      for quiz_id, questions in quizzes])
+    conn.commit()
+    conn.execute('VACUUM')
+    return conn
+
+def view_blob(conn, quiz_id):
+    # Load the blob, parse all of it and add index0 for the template
+    row = conn.execute('SELECT youtube_url, questions, language FROM quizzes WHERE id = ?', (quiz_id,)).fetchone()
+    questions = json.loads(row[1])
+    for i, q in enumerate(questions):
+        q['index0'] = i
+    return questions
+
+def view_blob_unpooled(path, quiz_id):
+    # The original get_quiz route also opened a connection per view
+    conn = sqlite3.connect(path)
+    try:
+        return view_blob(conn, quiz_id)
+    finally:
+        conn.close()
+
+def timed(fn, ids):
+    started = time.perf_counter()
+    for quiz_id in ids:
+        fn(quiz_id)
+    return (time.perf_counter() - started) / len(ids) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quizzes', type=int, default=3000)
+    parser.add_argument('--questions', type=int, default=7)
+    parser.add_argument('--views', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    quizzes = [(str(uuid.uuid4()), make_quiz(rng, args.questions)) for _ in range(args.quizzes)]
+    view_ids = [rng.choice(quizzes)[0] for _ in range(args.views)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        blob_path = os.path.join(tmp, 'blob.db')
+        blob_conn = build_blob_db(blob_path, quizzes)
+
+        table_path = os.path.join(tmp, 'table.db')
+        storage.configure(table_path)
+        for quiz_id, questions in quizzes:
+            storage.insert_quiz(quiz_id, 'https://www.youtube.com/watch?v=bench', questions, 'en')
+        storage.get_connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        storage.get_connection().execute('VACUUM')
+
+        blob_size = os.path.getsize(blob_path)
+        table_size = os.path.getsize(table_path)
+        blob_view = timed(lambda quiz_id: view_blob(blob_conn, quiz_id), view_ids)
+        unpooled_view = timed(lambda quiz_id: view_blob_unpooled(blob_path, quiz_id), view_ids)
+        table_view = timed(storage._load_quiz, view_ids)
+        # Views of quizzes that fit in the decoded quiz cache
+        hot = set(list(dict.fromkeys(view_ids))[:storage.DECODED_QUIZ_CACHE_SIZE])
+        hot_views = [quiz_id for quiz_id in view_ids if quiz_id in hot]
+        timed(storage.get_quiz, hot_views)
+        cached_view = timed(storage.get_quiz, hot_views)
+        single = timed(lambda quiz_id: storage.get_question(quiz_id, 0), view_ids)
+
+    print(f"Database size:     JSON blobs {blob_size / 1024:.0f} KiB, questions table {table_size / 1024:.0f} KiB "
+          f"({(1 - table_size / blob_size) * 100:.0f}% smaller)")
+    print(f"Full quiz view:    JSON blobs {blob_view:.1f} us "
+          f"({unpooled_view:.1f} us with a connection per view), questions table {table_view:.1f} us "
+          f"({cached_view:.1f} us from the decoded quiz cache)")
+    print(f"Single question:   {single:.1f} us (JSON blobs must decode the whole quiz)")
+
+if __name__ == '__main__':
+    main()
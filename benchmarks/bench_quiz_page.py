@@ -0,0 +1,76 @@
+"""Requests/second for shared quiz links: uncached render vs page cache vs 304 revalidation
+
+Runs the Flask app in-process against a temporary database.
+Usage: python benchmarks/bench_quiz_page.py [--requests 3000] [--quizzes 200] [--threads 4]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def make_questions(count):
+    return [{
+        'question': f'Which statement about topic {i} is correct?',
+        'options': [f'{letter}) Statement {letter} about topic {i}' for letter in 'ABCD'],
+        'correct_answer': 'C)',
+        'explanation': f'The video explains topic {i} in detail.'
+    } for i in range(count)]
+
+def run(app, paths, requests, threads, before_request=None, headers=None):
+    def worker(count):
+        client = app.test_client()
+        for i in range(count):
+            path = paths[i % len(paths)]
+            if before_request:
+                before_request()
+            response = client.get(path, headers=headers(path) if headers else None)
+            assert response.status_code in (200, 304), response.status_code
+
+    per_thread = requests // threads
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, [per_thread] * threads))
+    return per_thread * threads / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--quizzes', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['QUIZ_DB_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark-placeholder')
+        import app as quiz_app
+        import storage
+
+        ids = [str(uuid.uuid4()) for _ in range(args.quizzes)]
+        for quiz_id in ids:
+            storage.insert_quiz(quiz_id, 'https://www.youtube.com/watch?v=bench', make_questions(7), 'en')
+        paths = [f'/quiz/{quiz_id}' for quiz_id in ids]
+        random.Random(1).shuffle(paths)
+        app = quiz_app.app
+
+        uncached = run(app, paths, args.requests, args.threads,
+                       before_request=quiz_app.quiz_page_cache.clear)
+        quiz_app.quiz_page_cache.clear()
+        cached = run(app, paths, args.requests, args.threads)
+        revalidated = run(app, paths, args.requests, args.threads,
+                          headers=lambda path: {'If-None-Match': f'"{quiz_app.quiz_page_etag(path.rsplit("/", 1)[1])}"'})
+
+    print(f"Query + render every hit (before): {uncached:8.0f} req/s")
+    print(f"Rendered page cache:               {cached:8.0f} req/s ({cached / uncached:.1f}x)")
+    print(f"If-None-Match -> 304:              {revalidated:8.0f} req/s ({revalidated / uncached:.1f}x)")
+    print("Responses carry Cache-Control: public, max-age=QUIZ_PAGE_MAX_AGE, so browsers and "
+          "proxies serve repeat views without reaching the app at all.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Concurrent identical /generate_quiz requests, with and without request coalescing
+
+--clients clients ask for the same new quiz at the same moment. Without
+coalescing every request extracts the transcript and calls the model.
+With the app's SingleFlight groups, the first request (the leader) does
+the work and the rest wait for its result. A second round makes the
+model fail: every client gets the error, from a single model call, and
+callers of create_quiz all receive the leader's exception object.
+Reports model calls, transcript fetches and latency. YouTube is stubbed
+as in bench_endpoints.py and the model is the fake backend.
+Usage: python benchmarks/bench_singleflight.py [--clients 32] [--llm-latency 0.5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+class NoFlight:
+    """Stand-in for SingleFlight that runs every call"""
+
+    def do(self, key, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    def stats(self):
+        return {}
+
+def burst(clients, request):
+    """Run request(index) in clients threads released together; return their results"""
+    barrier = threading.Barrier(clients)
+
+    def client(index):
+        barrier.wait()
+        started = time.perf_counter()
+        result = request(index)
+        return result, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        return list(executor.map(client, range(clients)))
+
+def run_round(quiz_app, counters, clients, url):
+    http = quiz_app.app.test_client()
+    calls = quiz_app.get_backend().stats()['calls']
+    fetches = counters['fetches']
+    results = burst(clients, lambda index: http.post(
+        '/generate_quiz', json={'video_url': url, 'num_questions': 5}).status_code)
+    return {
+        'statuses': sorted({status for status, _ in results}),
+        'model_calls': quiz_app.get_backend().stats()['calls'] - calls,
+        'fetches': counters['fetches'] - fetches,
+        'p50': statistics.median(latency for _, latency in results),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            'QUIZ_DB_PATH': os.path.join(tmp, 'bench.db'),
+            'LLM_BACKEND': 'fake',
+            'FAKE_LLM_LATENCY': str(args.llm_latency),
+            'RATE_LIMIT_PER_MINUTE': '0',
+            'CLIENT_RATE_LIMIT_PER_MINUTE': '0',
+            'GENERATION_MAX_CONCURRENCY': str(args.clients),
+            'LLM_MAX_CONCURRENCY': str(args.clients),
+            'LOG_LEVEL': 'CRITICAL',
+        })
+        import app as quiz_app
+        import storage
+        from bench_endpoints import install_stubs
+        storage.init_db()
+        install_stubs(quiz_app, 0.05)
+
+        counters = {'fetches': 0}
+        fetch_track = quiz_app.transcript_resolver.fetch_track
+        counter_lock = threading.Lock()
+
+        def counting_fetch_track(video_id, url):
+            with counter_lock:
+                counters['fetches'] += 1
+            return fetch_track(video_id, url)
+
+        quiz_app.transcript_resolver.fetch_track = counting_fetch_track
+
+        print(f"{args.clients} identical requests at once, {args.llm_latency}s per model call")
+        flights = quiz_app.extraction_flight, quiz_app.generation_flight
+        quiz_app.extraction_flight = quiz_app.generation_flight = NoFlight()
+        before = run_round(quiz_app, counters, args.clients, 'https://www.youtube.com/watch?v=nocoalesce1')
+        quiz_app.extraction_flight, quiz_app.generation_flight = flights
+        after = run_round(quiz_app, counters, args.clients, 'https://www.youtube.com/watch?v=coalesced01')
+        for label, result in [('No coalescing', before), ('SingleFlight', after)]:
+            print(f"{label + ':':16s} {result['model_calls']:4d} model calls, {result['fetches']:4d} transcript "
+                  f"fetches, p50 {result['p50'] * 1000:8.1f} ms, statuses {result['statuses']}")
+        assert after['model_calls'] == 1, after
+        assert after['statuses'] == [200], after
+
+        # The model fails: the leader's exception is shared, not retried by every follower
+        backend = quiz_app.get_backend()
+
+        def failing_complete(messages, model, max_tokens, temperature, json_mode):
+            time.sleep(args.llm_latency)
+            raise RuntimeError("upstream unavailable")
+
+        backend._complete = failing_complete
+        failed = run_round(quiz_app, counters, args.clients, 'https://www.youtube.com/watch?v=modelfails1')
+        print(f"{'Model failing:':16s} {failed['model_calls']:4d} model calls, statuses {failed['statuses']}")
+        assert failed['model_calls'] == 1 and len(failed['statuses']) == 1 and failed['statuses'] != [200], failed
+
+        url = 'https://www.youtube.com/watch?v=modelfails2'
+        cache_key = quiz_app.get_quiz_cache_key(url, 'en', 5)
+
+        def create(index):
+            try:
+                quiz_app.create_quiz(url, 5, 'en', cache_key)
+            except Exception as e:
+                return e
+            return None
+
+        errors = [error for error, _ in burst(args.clients, create)]
+        assert all(isinstance(error, quiz_app.GenerationError) for error in errors), errors
+        print(f"{'create_quiz:':16s} {args.clients:4d} callers, {len({id(error) for error in errors})} distinct "
+              f"exception object(s): {errors[0]!r}")
+        assert len({id(error) for error in errors}) == 1
+        print(f"Generation flight: {quiz_app.generation_flight.stats()}")
+
+if __name__ == '__main__':
+    main()
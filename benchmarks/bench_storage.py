@@ -0,0 +1,135 @@
+"""Write-throughput and read-latency benchmark: legacy per-request connections vs storage.py
+
+Usage: python benchmarks/bench_storage.py [--writes 2000] [--threads 8] [--reads 2000]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage
+
+QUESTIONS = [{
+    'question': f'Sample question {i} about the video?',
+    'options': [f'{letter}) option {letter}' for letter in 'ABCD'],
+    'correct_answer': 'B)',
+    'explanation': 'Because the video says so.'
+} for i in range(5)]
+
+class LegacyStore:
+    """The access pattern app.py used before storage.py: a fresh connection per operation"""
+
+    def __init__(self, path):
+        self.path = path
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS quizzes (
+                id TEXT PRIMARY KEY, youtube_url TEXT, questions TEXT,
+                language TEXT, created_at TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def insert_quiz(self, quiz_id):
+        conn = sqlite3.connect(self.path, timeout=20)
+        try:
+            conn.execute('INSERT INTO quizzes (id, youtube_url, questions, language, created_at) VALUES (?, ?, ?, ?, ?)',
+                         (quiz_id, 'https://www.youtube.com/watch?v=bench', json.dumps(QUESTIONS), 'en', datetime.now()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_quiz(self, quiz_id):
+        conn = sqlite3.connect(self.path)
+        row = conn.execute('SELECT youtube_url, questions, language FROM quizzes WHERE id = ?', (quiz_id,)).fetchone()
+        conn.close()
+        return json.loads(row[1])
+
+class PooledStore:
+    """storage.py: WAL, tuned pragmas and per-thread connections"""
+
+    def __init__(self, path):
+        storage.configure(path)
+        storage.init_db()
+
+    def insert_quiz(self, quiz_id):
+        storage.insert_quiz(quiz_id, 'https://www.youtube.com/watch?v=bench', QUESTIONS, 'en')
+
+    def get_quiz(self, quiz_id):
+        return storage.get_quiz(quiz_id)['questions']
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run(store, writes, reads, threads):
+    ids = [str(uuid.uuid4()) for _ in range(writes)]
+    errors = []
+
+    def write(quiz_id):
+        try:
+            store.insert_quiz(quiz_id)
+        except sqlite3.Error as e:
+            errors.append(str(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(write, ids))
+    write_seconds = time.perf_counter() - started
+
+    latencies = []
+    lock = threading.Lock()
+
+    def read(quiz_id):
+        t0 = time.perf_counter()
+        store.get_quiz(quiz_id)
+        elapsed = (time.perf_counter() - t0) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    read_ids = [ids[i % len(ids)] for i in range(reads)]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(read, read_ids))
+
+    return {
+        'writes_per_second': round(writes / write_seconds, 1),
+        'write_errors': len(errors),
+        'read_p50_ms': round(statistics.median(latencies), 3),
+        'read_p95_ms': round(percentile(latencies, 95), 3),
+        'read_p99_ms': round(percentile(latencies, 99), 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writes', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, factory in (('legacy', LegacyStore), ('storage', PooledStore)):
+            store = factory(os.path.join(tmp, f'{name}.db'))
+            results[name] = run(store, args.writes, args.reads, args.threads)
+            print(f"{name:8} {results[name]}")
+
+    speedup = results['storage']['writes_per_second'] / results['legacy']['writes_per_second']
+    print(f"Write throughput: {speedup:.1f}x, read p50: "
+          f"{results['legacy']['read_p50_ms']}ms -> {results['storage']['read_p50_ms']}ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Prompt size and lookup cost of timestamped transcript windows
+
+Builds a synthetic --hours long transcript, stores it as a TranscriptIndex
+and compares the whole transcript (what every YouTube quiz used to send
+before prompt trimming) with a --window minute slice: estimated tokens,
+stored size against the JSON caption segments, and the time to load and
+slice the index and to locate the source of a question.
+Usage: python benchmarks/bench_transcript_index.py [--hours 3] [--window 10] [--runs 200]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench_endpoints import make_segments
+
+def timed(fn, runs):
+    started = time.perf_counter()
+    for _ in range(runs):
+        result = fn()
+    return (time.perf_counter() - started) / runs, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=3)
+    parser.add_argument('--window', type=float, default=10, help='minutes')
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['QUIZ_DB_PATH'] = os.path.join(tmp, 'bench.db')
+        import storage
+        import transcript_index
+        from long_content import estimate_tokens
+        from transcript_text import transcript_to_text
+        storage.init_db()
+        conn = storage.get_connection()
+
+        # make_segments writes one 4 second caption per segment
+        segments = make_segments('benchvideo', count=int(args.hours * 3600 / 4))
+        index = transcript_index.TranscriptIndex.from_segments(segments)
+        transcript_index.put_index('benchvideo', 'en', index)
+        start = args.hours * 3600 / 2
+        end = start + args.window * 60
+
+        full_seconds, full_text = timed(lambda: transcript_to_text(segments), max(1, args.runs // 20))
+        load_seconds, loaded = timed(lambda: transcript_index.get_index('benchvideo', 'en'), args.runs)
+        slice_seconds, window_text = timed(lambda: loaded.text(start, end), args.runs)
+        question = {'question': f'What does point {len(segments) // 2 + 10} say about mitochondria?',
+                    'correct_answer': 'It relates mitochondria to glucose', 'explanation': 'See the video.'}
+        locate_seconds, source = timed(lambda: loaded.locate(transcript_index.question_text(question), start, end),
+                                       args.runs)
+        stored = conn.execute('SELECT size FROM transcript_index').fetchone()[0]
+
+    segments_json = len(json.dumps(segments).encode('utf-8'))
+    full_tokens = estimate_tokens(full_text)
+    window_tokens = estimate_tokens(window_text)
+    print(f"{len(segments)} segments, {len(index)} sentences, {transcript_index.format_time(index.duration)} of video")
+    print(f"Stored index: {stored / 1024:8.1f} KiB (JSON segments {segments_json / 1024:.1f} KiB)")
+    print(f"Whole transcript:        {full_tokens:8d} tokens, cleaned in {full_seconds * 1000:7.2f} ms")
+    print(f"{args.window:g} minute window:       {window_tokens:8d} tokens "
+          f"({window_tokens / full_tokens:.1%}), sliced in {slice_seconds * 1e6:7.1f} us")
+    print(f"Index load from SQLite:  {load_seconds * 1000:8.2f} ms")
+    print(f"Source lookup:           {locate_seconds * 1e6:8.1f} us -> {transcript_index.format_time(source)}")
+
+if __name__ == '__main__':
+    main()
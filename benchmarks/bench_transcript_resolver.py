@@ -0,0 +1,118 @@
+"""Transcript discovery: listing on every request vs TranscriptResolver
+
+Replays a request mix over a set of videos where --unavailable of them
+have captions disabled or missing and popular videos are requested again
+(in both languages, as the content store caches transcripts per language).
+Before: every request lists the video's captions, then downloads the
+chosen track, as get_youtube_transcript did. After: TranscriptResolver
+with its SQLite listing and negative cache. YouTube is stubbed, each
+listing or download taking --latency seconds. Reports outbound requests
+and the time to fail for videos without captions.
+Usage: python benchmarks/bench_transcript_resolver.py [--requests 2000] [--videos 400] [--unavailable 0.3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from youtube_transcript_api._errors import NoTranscriptAvailable, TranscriptsDisabled
+
+class FakeYouTube:
+    """Counts listing and track requests; video IDs ending in 'x' or 'z' have no captions"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = 0
+
+    def list_tracks(self, video_id):
+        self.requests += 1
+        time.sleep(self.latency)
+        if video_id.endswith('x'):
+            raise TranscriptsDisabled(video_id)
+        if video_id.endswith('z'):
+            raise NoTranscriptAvailable(video_id, [], [])
+        track = {'language_code': 'en', 'language': 'English', 'is_generated': False,
+                 'is_translatable': True, 'url': f'https://captions.example.com/{video_id}?lang=en'}
+        return [track], ['hi']
+
+    def fetch_track(self, video_id, url):
+        self.requests += 1
+        time.sleep(self.latency)
+        return [{'text': f'Captions for {video_id}', 'start': 0.0, 'duration': 2.0}]
+
+def make_workload(requests, videos, unavailable, seed=7):
+    rng = random.Random(seed)
+    ids = []
+    for i in range(videos):
+        suffix = rng.choice('xz') if rng.random() < unavailable else 'a'
+        ids.append(f'v{i:09d}{suffix}')
+    # Roughly Zipfian popularity: a few videos get most of the requests
+    weights = [1 / (rank + 1) for rank in range(videos)]
+    return [(rng.choices(ids, weights)[0], rng.choice(['en', 'en', 'en', 'hi'])) for _ in range(requests)]
+
+def replay(workload, fetch):
+    failures = 0
+    failure_seconds = 0.0
+    seen = set()
+    for video_id, language in workload:
+        # Successful transcripts are kept in the content store, so only the
+        # first request per video and language reaches discovery
+        if (video_id, language) in seen:
+            continue
+        started = time.perf_counter()
+        try:
+            fetch(video_id, language)
+            seen.add((video_id, language))
+        except Exception:
+            failures += 1
+            failure_seconds += time.perf_counter() - started
+    return failures, failure_seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--videos', type=int, default=400)
+    parser.add_argument('--unavailable', type=float, default=0.3, help='share of videos without captions')
+    parser.add_argument('--latency', type=float, default=0.002, help='seconds per YouTube request')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['QUIZ_DB_PATH'] = os.path.join(tmp, 'bench.db')
+        import storage
+        import transcript_resolver
+        storage.init_db()
+        workload = make_workload(args.requests, args.videos, args.unavailable)
+
+        before = FakeYouTube(args.latency)
+
+        def legacy_fetch(video_id, language):
+            tracks, languages = before.list_tracks(video_id)
+            choice = transcript_resolver.pick_track(tracks, languages, language)
+            if choice is None:
+                raise LookupError(video_id)
+            return before.fetch_track(video_id, choice[0]['url'])
+
+        before_failures, before_seconds = replay(workload, legacy_fetch)
+
+        after = FakeYouTube(args.latency)
+        resolver = transcript_resolver.TranscriptResolver(6 * 60 * 60, 24 * 60 * 60,
+                                                          list_tracks=after.list_tracks, fetch_track=after.fetch_track)
+        after_failures, after_seconds = replay(workload, resolver.fetch)
+
+    assert before_failures == after_failures
+    print(f"{args.requests} requests over {args.videos} videos, {args.unavailable:.0%} without captions, "
+          f"{before_failures} failed requests")
+    print(f"Listing every request (before): {before.requests:6d} YouTube requests, "
+          f"{before_seconds / before_failures * 1000:7.2f} ms per failure")
+    print(f"TranscriptResolver:             {after.requests:6d} YouTube requests, "
+          f"{after_seconds / after_failures * 1000:7.2f} ms per failure "
+          f"({1 - after.requests / before.requests:.0%} fewer requests)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Transcript cleaning: the original per-segment loop vs transcript_text.py
+
+Builds synthetic transcripts with annotations, stray brackets, newlines
+and empty segments, checks that both produce identical sentences and
+text, then times them.
+Usage: python benchmarks/bench_transcript_text.py [--segments 10000] [--runs 20]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import transcript_text
+
+WORDS = ('so today we are going to look at how the cell membrane controls what enters '
+         'and leaves energy protein gradient transport water molecule really important').split()
+NOISE = ('[Music]', '[Applause]', '(laughs)', '(inaudible)', '[', ']', '(', ')', '\n', '  ', '\t', ' ')
+
+def make_segments(count, seed):
+    rng = random.Random(seed)
+    segments = []
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(0, 9))]
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randint(0, len(words)), rng.choice(NOISE))
+        text = ' '.join(words)
+        if words and rng.random() < 0.3:
+            text += rng.choice('.!?,')
+        segments.append({'text': text, 'start': i * 2.5, 'duration': 2.5})
+    return segments
+
+def legacy_sentences(transcript_list):
+    """The segment loop previously inlined in app.get_youtube_transcript"""
+    processed_segments = []
+    current_sentence = []
+    for segment in transcript_list:
+        text = segment['text'].strip()
+        if not text:
+            continue
+        text = re.sub(r'\[.*?\]', '', text)
+        text = re.sub(r'\(.*?\)', '', text)
+        text = text.replace('\n', ' ')
+        text = ' '.join(text.split())
+        if not text:
+            continue
+        current_sentence.append(text)
+        if text[-1] in '.!?':
+            processed_segments.append(' '.join(current_sentence))
+            current_sentence = []
+    if current_sentence:
+        processed_segments.append(' '.join(current_sentence))
+    return processed_segments
+
+def legacy_text(transcript_list):
+    return ' '.join(legacy_sentences(transcript_list))
+
+def timed(fn, segments, runs):
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(segments)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--segments', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seeds', type=int, default=20, help='transcripts checked for equivalence')
+    args = parser.parse_args()
+
+    for seed in range(args.seeds):
+        segments = make_segments(args.segments, seed)
+        expected = legacy_sentences(segments)
+        sentences = transcript_text.build_sentences(segments)
+        assert [s['text'] for s in sentences] == expected, f"sentences differ for seed {seed}"
+        assert transcript_text.transcript_to_text(segments) == legacy_text(segments), f"text differs for seed {seed}"
+        assert all(s['start'] <= s['end'] for s in sentences)
+    print(f"Equivalence: identical sentences and text for {args.seeds} transcripts of {args.segments} segments")
+
+    segments = make_segments(args.segments, 0)
+    legacy = timed(legacy_text, segments, args.runs)
+    text = timed(transcript_text.transcript_to_text, segments, args.runs)
+    sentences = timed(transcript_text.build_sentences, segments, args.runs)
+    print(f"Original loop:          {legacy:7.2f} ms")
+    print(f"transcript_to_text:     {text:7.2f} ms ({legacy / text:.1f}x faster)")
+    print(f"build_sentences:        {sentences:7.2f} ms (with start/end timestamps, {legacy / sentences:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Deterministic OpenAI-compatible chat completions server for offline load tests
+
+Answers /v1/chat/completions (plain, JSON mode and streaming) with the same
+quizzes as llm_backends.FakeBackend, after a simulated model delay. Point
+the app at it with OPENAI_BASE_URL=http://127.0.0.1:8099/v1.
+Usage: python benchmarks/fake_openai_server.py [--port 8099] [--latency 0.5] [--tokens-per-second 80]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+from flask import Flask, Response, jsonify, request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_backends import fake_quiz_response
+
+app = Flask(__name__)
+settings = {'latency': 0.0, 'tokens_per_second': 0.0}
+
+def model_delay(tokens):
+    rate = settings['tokens_per_second']
+    return settings['latency'] + (tokens / rate if rate else 0.0)
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    body = request.get_json()
+    messages = body.get('messages') or []
+    json_mode = (body.get('response_format') or {}).get('type') == 'json_object'
+    text = fake_quiz_response(messages, json_mode)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    model = body.get('model', 'fake')
+    created = int(time.time())
+
+    if body.get('stream'):
+        def generate():
+            pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+            time.sleep(settings['latency'])
+            step = (model_delay(len(text) // 4) - settings['latency']) / max(1, len(pieces))
+            for piece in pieces:
+                if step:
+                    time.sleep(step)
+                chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                         'model': model,
+                         'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                    'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+        return Response(generate(), mimetype='text/event-stream')
+
+    completion_tokens = len(text) // 4
+    time.sleep(model_delay(completion_tokens))
+    prompt_tokens = sum(len(m.get('content') or '') for m in messages) // 4
+    return jsonify({
+        'id': completion_id,
+        'object': 'chat.completion',
+        'created': created,
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens}
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='0 for instant output')
+    args = parser.parse_args()
+    settings['latency'] = args.latency
+    settings['tokens_per_second'] = args.tokens_per_second
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
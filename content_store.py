@@ -0,0 +1,147 @@
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Compression level for stored text; 6 is zlib's default speed/size trade-off
+COMPRESSION_LEVEL = 6
+
+# Reads record last access in memory; the times are written in one
+# transaction at most this often (or when this many are pending), so a
+# cache hit never takes the write lock itself
+ACCESS_FLUSH_SECONDS = 60
+ACCESS_FLUSH_MAX = 500
+
+_stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+_accessed = {}
+_accessed_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def _record_access(cache_key):
+    global _last_flush
+    with _accessed_lock:
+        _accessed[cache_key] = time.time()
+        due = (len(_accessed) >= ACCESS_FLUSH_MAX
+               or time.monotonic() - _last_flush >= ACCESS_FLUSH_SECONDS)
+    if due:
+        flush_access_times()
+
+def flush_access_times():
+    """Write pending last-access times; they only order eviction, so a failed write is dropped"""
+    global _last_flush
+    with _accessed_lock:
+        pending = list(_accessed.items())
+        _accessed.clear()
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+    try:
+        with storage.transaction() as conn:
+            conn.executemany('UPDATE extracted_content SET last_accessed = ? WHERE cache_key = ?',
+                             [(accessed, cache_key) for cache_key, accessed in pending])
+    except sqlite3.Error as e:
+        logger.warning("Could not record content store access times: %s", e)
+
+def get_content(cache_key):
+    """Return stored text and its validators for cache_key, or None"""
+    row = storage.get_connection().execute('''
+        SELECT content, etag, last_modified, fetched_at FROM extracted_content
+        WHERE cache_key = ?
+    ''', (cache_key,)).fetchone()
+    if not row:
+        _count('misses')
+        return None
+
+    content, etag, last_modified, fetched_at = row
+    try:
+        text = zlib.decompress(content).decode('utf-8')
+    except (zlib.error, UnicodeDecodeError):
+        with storage.transaction() as conn:
+            conn.execute('DELETE FROM extracted_content WHERE cache_key = ?', (cache_key,))
+        _count('misses')
+        return None
+
+    _record_access(cache_key)
+    _count('hits')
+    return {
+        'text': text,
+        'etag': etag,
+        'last_modified': last_modified,
+        'age': time.time() - (fetched_at or 0)
+    }
+
+def put_content(cache_key, source_url, text, etag=None, last_modified=None, max_bytes=None):
+    """Compress and store extracted text, then evict old entries over max_bytes"""
+    raw = text.encode('utf-8')
+    compressed = zlib.compress(raw, COMPRESSION_LEVEL)
+    now = time.time()
+    with storage.transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO extracted_content
+                (cache_key, source_url, content, original_size, compressed_size,
+                 etag, last_modified, fetched_at, last_accessed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (cache_key, source_url, compressed, len(raw), len(compressed),
+              etag, last_modified, now, now))
+    _count('stores')
+    if max_bytes:
+        evict_content(max_bytes)
+
+def mark_revalidated(cache_key):
+    """Record that the origin confirmed the stored copy is still current"""
+    now = time.time()
+    with storage.transaction() as conn:
+        conn.execute('UPDATE extracted_content SET fetched_at = ?, last_accessed = ? WHERE cache_key = ?',
+                     (now, now, cache_key))
+    _count('revalidated')
+
+def evict_content(max_bytes):
+    """Delete least recently used entries until the store fits in max_bytes"""
+    total = storage.get_connection().execute(
+        'SELECT COALESCE(SUM(compressed_size), 0) FROM extracted_content').fetchone()[0]
+    if total <= max_bytes:
+        return 0
+
+    # Eviction order needs the access times still held in memory
+    flush_access_times()
+    evicted = 0
+    with storage.transaction() as conn:
+        rows = conn.execute('''
+            SELECT cache_key, compressed_size FROM extracted_content
+            ORDER BY last_accessed ASC
+        ''').fetchall()
+        for cache_key, size in rows:
+            if total <= max_bytes:
+                break
+            conn.execute('DELETE FROM extracted_content WHERE cache_key = ?', (cache_key,))
+            total -= size or 0
+            evicted += 1
+    _count('evictions', evicted)
+    return evicted
+
+def get_stats(conn=None):
+    """Return store counters, plus on-disk sizes when a connection is given"""
+    with _stats_lock:
+        stats = dict(_stats)
+    if conn is not None:
+        entries, original, compressed = conn.execute('''
+            SELECT COUNT(*), COALESCE(SUM(original_size), 0), COALESCE(SUM(compressed_size), 0)
+            FROM extracted_content
+        ''').fetchone()
+        stats.update({
+            'entries': entries,
+            'original_bytes': original,
+            'compressed_bytes': compressed
+        })
+    return stats
@@ -0,0 +1,267 @@
+import codecs
+import threading
+import time
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Elements whose contents are never article text
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head', 'iframe',
+             'canvas', 'object', 'select', 'button'}
+
+# Page furniture: navigation, headers/footers, sidebars and forms
+BOILERPLATE_TAGS = {'nav', 'header', 'footer', 'aside', 'form', 'menu', 'dialog'}
+
+# Elements that mark the main content; once one is seen, text outside it is dropped
+MAIN_TAGS = {'main', 'article'}
+
+# Elements that end a run of text
+BLOCK_TAGS = {'p', 'div', 'section', 'article', 'main', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+              'li', 'ul', 'ol', 'dl', 'dt', 'dd', 'tr', 'td', 'th', 'table', 'blockquote',
+              'pre', 'br', 'hr', 'figcaption', 'caption', 'body'}
+
+# Void elements never get an end tag, so they must not open a skipped region
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+             'meta', 'param', 'source', 'track', 'wbr'}
+
+# Whole class/id tokens that mark boilerplate containers; modifiers such as
+# "has-sidebar" or "header-fixed" on a page wrapper do not count
+BOILERPLATE_HINTS = frozenset('''
+    nav navbar navigation menu main-menu primary-menu footer site-footer header site-header masthead
+    sidebar breadcrumb breadcrumbs cookie cookies cookie-banner banner share sharing social social-links
+    related related-posts comment comments comments-area advert ads advertisement promo newsletter
+    subscribe popup modal top-bar
+'''.split())
+# Hints and roles are never applied to the document itself
+DOCUMENT_TAGS = {'html', 'body'}
+BOILERPLATE_ROLES = {'navigation', 'banner', 'contentinfo', 'complementary', 'search', 'dialog'}
+
+# Blocks shorter than this that are mostly link text are treated as link lists
+LINK_BLOCK_MAX_CHARS = 200
+LINK_DENSITY_LIMIT = 0.5
+
+CHUNK_SIZE = 64 * 1024
+
+_stats = {'pages': 0, 'bytes': 0, 'blocks': 0, 'dropped_blocks': 0, 'seconds': 0.0}
+_stats_lock = threading.Lock()
+
+def get_parser_name():
+    return 'lxml' if etree is not None else 'html.parser'
+
+class TextCollector:
+    """Parser target that turns start/end/data events into cleaned text blocks
+
+    Works with both lxml's target parser interface and the html.parser
+    adapter below. Completed blocks accumulate in .blocks until taken.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.dropped = 0
+        self._stack = []        # [tag, skipped, main, hinted] for open elements
+        self._skip_depth = 0
+        # Blocks inside elements whose class/id looks like boilerplate are held
+        # back until the element closes: kept if a main element opened inside it
+        self._hinted_depth = 0
+        self._pending = []
+        self._main_depth = 0
+        self._seen_main = False
+        self._text = []
+        self._link_chars = 0
+        self._link_depth = 0
+
+    def _is_boilerplate(self, tag, attrs):
+        if tag in BOILERPLATE_TAGS:
+            return True
+        if tag in DOCUMENT_TAGS:
+            return False
+        if attrs.get('role') in BOILERPLATE_ROLES or attrs.get('aria-hidden') == 'true':
+            return True
+        return 'hidden' in attrs
+
+    def _has_hint(self, tag, attrs):
+        if tag in DOCUMENT_TAGS or tag in MAIN_TAGS:
+            return False
+        tokens = f"{attrs.get('class') or ''} {attrs.get('id') or ''}".lower().split()
+        return any(token in BOILERPLATE_HINTS for token in tokens)
+
+    def _release_hinted(self):
+        # A main element inside hinted containers: they were wrappers, not boilerplate
+        for entry in self._stack:
+            entry[3] = False
+        self._hinted_depth = 0
+        self.blocks.extend(self._pending)
+        self._pending = []
+
+    def _flush(self):
+        if not self._text:
+            return
+        text = ' '.join(''.join(self._text).split())
+        link_chars = self._link_chars
+        self._text = []
+        self._link_chars = 0
+        if not text:
+            return
+        if len(text) < LINK_BLOCK_MAX_CHARS and link_chars > len(text) * LINK_DENSITY_LIMIT:
+            self.dropped += 1
+            return
+        (self._pending if self._hinted_depth else self.blocks).append(text)
+
+    def start(self, tag, attrs):
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        skipped = self._skip_depth > 0 or tag in SKIP_TAGS or self._is_boilerplate(tag, attrs)
+        main = tag in MAIN_TAGS and not skipped
+        hinted = not skipped and self._has_hint(tag, attrs)
+        if main and self._hinted_depth:
+            self._release_hinted()
+        self._stack.append([tag, skipped, main, hinted])
+        if skipped:
+            self._skip_depth += 1
+        if hinted:
+            self._hinted_depth += 1
+        if main:
+            self._seen_main = True
+            self._main_depth += 1
+        if tag == 'a':
+            self._link_depth += 1
+
+    def end(self, tag):
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        # Pop up to the matching element, closing any left open by sloppy markup
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > index:
+            open_tag, skipped, main, hinted = self._stack.pop()
+            if skipped:
+                self._skip_depth -= 1
+            if hinted:
+                self._flush()
+                self._hinted_depth -= 1
+                if not self._hinted_depth:
+                    self.dropped += len(self._pending)
+                    self._pending = []
+            if main:
+                self._flush()
+                self._main_depth -= 1
+            if open_tag == 'a':
+                self._link_depth -= 1
+
+    def data(self, text):
+        if self._skip_depth or (self._seen_main and not self._main_depth):
+            return
+        self._text.append(text)
+        if self._link_depth:
+            self._link_chars += len(text.strip())
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        self._flush()
+        # Hinted containers left open by truncated markup are still boilerplate
+        self.dropped += len(self._pending)
+        self._pending = []
+
+    def take_blocks(self):
+        blocks, self.blocks = self.blocks, []
+        return blocks
+
+class _StdlibParser(HTMLParser):
+    """Adapts html.parser callbacks to a TextCollector"""
+
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+        if tag not in VOID_TAGS:
+            self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def close(self):
+        super().close()
+        self.target.close()
+
+def _make_parser(collector, parser=None):
+    parser = parser or get_parser_name()
+    if parser == 'lxml':
+        if etree is None:
+            raise ValueError("lxml is not installed")
+        return etree.HTMLParser(target=collector, recover=True, no_network=True)
+    return _StdlibParser(collector)
+
+def iter_text_blocks(chunks, encoding=None, parser=None):
+    """Parse HTML from an iterable of byte chunks, yielding cleaned text blocks as they complete
+
+    Script/style, navigation, headers, footers, sidebars and link lists are
+    skipped. If the page marks its main content with <main> or <article>,
+    text outside it is dropped from then on.
+    """
+    collector = TextCollector()
+    html_parser = _make_parser(collector, parser)
+    decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    started = time.perf_counter()
+    total_bytes = 0
+    blocks = 0
+    try:
+        for chunk in chunks:
+            total_bytes += len(chunk)
+            text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                html_parser.feed(text)
+            for block in collector.take_blocks():
+                blocks += 1
+                yield block
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            html_parser.feed(tail)
+        html_parser.close()
+        for block in collector.take_blocks():
+            blocks += 1
+            yield block
+    finally:
+        with _stats_lock:
+            _stats['pages'] += 1
+            _stats['bytes'] += total_bytes
+            _stats['blocks'] += blocks
+            _stats['dropped_blocks'] += collector.dropped
+            _stats['seconds'] += time.perf_counter() - started
+
+def extract_text(chunks, encoding=None, parser=None):
+    """Return the cleaned main text of an HTML document given as byte chunks"""
+    return ' '.join(iter_text_blocks(chunks, encoding=encoding, parser=parser))
+
+def iter_chunks(data, size=CHUNK_SIZE):
+    """Split an in-memory document into parser-sized chunks"""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['seconds'] = round(stats['seconds'], 4)
+    stats['parser'] = get_parser_name()
+    return stats
@@ -0,0 +1,54 @@
+"""gunicorn settings for serving the quiz generator
+
+Quiz generation is I/O bound: a request spends most of its time waiting on
+YouTube, web pages and the model, so a few processes with many threads
+each (gthread) serve far more concurrent generations than one thread per
+process. Each worker process has its own in-memory caches and its own
+LLM_MAX_CONCURRENCY limit, so the upstream concurrency is
+workers x LLM_MAX_CONCURRENCY; SQLite data is shared by all of them.
+
+Every setting can be overridden with the GUNICORN_* variables below or on
+the command line.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5004')}")
+
+# Processes mostly buy CPU headroom for parsing and prompt trimming; two per
+# core at most, since each one repeats the in-memory caches
+workers = int(os.getenv('GUNICORN_WORKERS', min(4, multiprocessing.cpu_count() * 2)))
+worker_class = 'gthread'
+# Threads per worker bound concurrent requests; streaming (/generate_quiz/stream)
+# and long-polling (/jobs/<id>?wait=N) clients hold one for their whole duration
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+
+# Long enough for a slow model call plus repair (LLM_TIMEOUT defaults to 60s)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+# On SIGHUP or a max_requests restart, in-flight generations get this long to finish
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 60))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound memory growth; the jitter keeps
+# them from all restarting at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# Import the app (environment, API key check, migrations) once in the master
+preload_app = True
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+def post_fork(server, worker):
+    server.log.info("Worker %s started", worker.pid)
+
+def worker_exit(server, worker):
+    # Jobs live in the worker that accepted them; when it is recycled
+    # (max_requests) or stopped, fail the ones it will not finish instead
+    # of leaving them queued until the next full restart
+    from app import job_queue
+    failed = job_queue.shutdown()
+    if failed:
+        server.log.info("Worker %s exiting: marked %d unfinished job(s) failed", worker.pid, failed)
@@ -0,0 +1,199 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from youtube_transcript_api._transcripts import Transcript, TranscriptListFetcher
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (compatible; QuizGenerator/1.0)'
+
+_lock = threading.Lock()
+_session = None
+_openai_client = None
+
+_upstream = {}
+_upstream_lock = threading.Lock()
+
+def _setting(name, default, cast=int):
+    # Read lazily so values from .env (loaded by app.py) are picked up
+    return cast(os.getenv(name, default))
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout to every request
+
+    Third-party code using our session (youtube_transcript_api) never
+    passes a timeout, so without this a hung server could block forever.
+    """
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+def get_http_session():
+    """Return the shared, pooled requests session for web and YouTube fetches"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                retry = Retry(
+                    total=_setting('HTTP_MAX_RETRIES', 3),
+                    backoff_factor=_setting('HTTP_BACKOFF', 0.5, float),
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=('GET', 'HEAD'),
+                    raise_on_status=False
+                )
+                pool_size = _setting('HTTP_POOL_SIZE', 20)
+                adapter = TimeoutHTTPAdapter(
+                    pool_connections=pool_size,
+                    pool_maxsize=pool_size,
+                    max_retries=retry,
+                    timeout=(_setting('HTTP_CONNECT_TIMEOUT', 5, float),
+                             _setting('HTTP_READ_TIMEOUT', 20, float))
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({'User-Agent': USER_AGENT})
+                _session = session
+    return _session
+
+def get_openai_client():
+    """Return the shared OpenAI client with a pooled, keep-alive HTTP transport"""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                pool_size = _setting('OPENAI_POOL_SIZE', 20)
+                timeout = _setting('OPENAI_TIMEOUT', 60, float)
+                http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=pool_size,
+                                        max_keepalive_connections=pool_size),
+                    timeout=timeout
+                )
+                _openai_client = openai.OpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    # Any OpenAI-compatible server, e.g. benchmarks/fake_openai_server.py
+                    base_url=os.getenv('OPENAI_BASE_URL') or None,
+                    timeout=timeout,
+                    max_retries=_setting('OPENAI_MAX_RETRIES', 2),
+                    http_client=http_client
+                )
+    return _openai_client
+
+@contextmanager
+def track_upstream(name):
+    """Record latency and errors of an outbound call under name"""
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        with _upstream_lock:
+            entry = _upstream.setdefault(name, {'calls': 0, 'errors': 0,
+                                                'total_seconds': 0.0, 'max_seconds': 0.0})
+            entry['calls'] += 1
+            entry['errors'] += failed
+            entry['total_seconds'] += elapsed
+            entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+
+@contextmanager
+def stream_url(url, headers=None):
+    """GET url through the shared session without reading the body
+
+    Yields the response; read it with iter_body() and it is closed on exit.
+    """
+    with track_upstream('web'):
+        response = get_http_session().get(url, headers=headers, stream=True)
+        try:
+            yield response
+        finally:
+            response.close()
+
+def iter_body(response, max_bytes=None, chunk_size=64 * 1024):
+    """Yield the body of a streamed response in blocks, stopping at max_bytes
+
+    Bodies over the cap are truncated rather than rejected; for HTML the
+    first few megabytes are plenty to extract the article text.
+    """
+    if max_bytes is None:
+        max_bytes = _setting('MAX_RESPONSE_BYTES', 5 * 1024 * 1024)
+    received = 0
+    for block in response.iter_content(chunk_size=chunk_size):
+        if received + len(block) >= max_bytes:
+            logger.warning("Response from %s truncated at %d bytes", response.url, max_bytes)
+            yield block[:max_bytes - received]
+            return
+        received += len(block)
+        yield block
+
+def fetch_url(url, headers=None):
+    """GET url through the shared session, reading at most MAX_RESPONSE_BYTES"""
+    with stream_url(url, headers=headers) as response:
+        body = b''.join(iter_body(response))
+    response._content = body
+    return response
+
+def list_youtube_transcripts(video_id):
+    """List a video's transcripts using the shared session instead of a new one per call"""
+    with track_upstream('youtube'):
+        return TranscriptListFetcher(get_http_session()).fetch(video_id)
+
+def fetch_youtube_transcript(video_id, url):
+    """Download and parse one caption track from its (possibly cached) track URL"""
+    with track_upstream('youtube'):
+        return Transcript(get_http_session(), video_id, url, '', '', False, []).fetch()
+
+def _pool_stats():
+    requests_made = 0
+    connections = 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            for pool in list(adapter.poolmanager.pools._container.values()):
+                requests_made += pool.num_requests
+                connections += pool.num_connections
+    return requests_made, connections
+
+def get_stats():
+    """Return per-upstream latency and connection reuse counters"""
+    with _upstream_lock:
+        upstream = {}
+        for name, entry in _upstream.items():
+            upstream[name] = dict(entry)
+            upstream[name]['avg_seconds'] = round(entry['total_seconds'] / entry['calls'], 4) if entry['calls'] else 0.0
+            upstream[name]['total_seconds'] = round(entry['total_seconds'], 4)
+            upstream[name]['max_seconds'] = round(entry['max_seconds'], 4)
+
+    requests_made, connections = _pool_stats()
+    openai_connections = None
+    if _openai_client is not None:
+        transport = getattr(getattr(_openai_client, '_client', None), '_transport', None)
+        pool = getattr(transport, '_pool', None)
+        if pool is not None:
+            openai_connections = len(pool.connections)
+
+    return {
+        'upstream': upstream,
+        'http_pool': {
+            'requests': requests_made,
+            'connections_opened': connections,
+            'reused_requests': max(0, requests_made - connections)
+        },
+        'openai_pool': {'open_connections': openai_connections}
+    }
@@ -0,0 +1,194 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# A job may run in another server process, whose updates never notify this
+# one, so long-polls re-read its row at least this often
+WAIT_POLL_SECONDS = 0.5
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+class JobQueue:
+    """Bounded worker pool that runs generation jobs and records their state in SQLite
+
+    runner(params, progress) does the actual work. It calls progress(stage)
+    as it moves between stages and returns the finished quiz ID.
+    """
+
+    def __init__(self, runner, max_workers=4, max_queue=100):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queued = 0
+        self._running = 0
+        # Jobs submitted in this process that have not finished
+        self._unfinished = set()
+        self._counters = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'rejected': 0}
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def _get_executor(self):
+        # Started lazily so forked server workers each get their own threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='quiz-job')
+        return self._executor
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with storage.transaction() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?',
+                         (*fields.values(), job_id))
+        with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, params):
+        """Queue a job and return its ID, or raise QueueFullError"""
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._counters['rejected'] += 1
+                raise QueueFullError(f"Job queue is full ({self.max_queue} queued)")
+            self._queued += 1
+            self._counters['submitted'] += 1
+
+        job_id = str(uuid.uuid4())
+        try:
+            with storage.transaction() as conn:
+                conn.execute('''
+                    INSERT INTO jobs (id, status, progress, params, timings, created_at)
+                    VALUES (?, 'queued', 'queued', ?, '{}', ?)
+                ''', (job_id, json.dumps(params), time.time()))
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        with self._lock:
+            self._unfinished.add(job_id)
+        self._get_executor().submit(self._run, job_id, params, time.time())
+        return job_id
+
+    def _run(self, job_id, params, submitted_at):
+        started_at = time.time()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_total += started_at - submitted_at
+
+        timings = {}
+        stage = {'name': None, 'started': started_at}
+
+        def progress(name):
+            now = time.time()
+            if stage['name']:
+                timings[stage['name']] = round(now - stage['started'], 4)
+            stage['name'], stage['started'] = name, now
+            self._update(job_id, progress=name, timings=json.dumps(timings))
+
+        self._update(job_id, status='running', started_at=started_at)
+        try:
+            quiz_id = self.runner(params, progress)
+            progress('done')
+            self._finish(job_id, 'succeeded', started_at, quiz_id=quiz_id)
+        except Exception as e:
+            logger.exception("Job %s failed: %s", job_id, e)
+            if stage['name']:
+                timings[stage['name']] = round(time.time() - stage['started'], 4)
+            self._finish(job_id, 'failed', started_at, error=str(e),
+                         timings=json.dumps(timings))
+
+    def _finish(self, job_id, status, started_at, **fields):
+        finished_at = time.time()
+        try:
+            self._update(job_id, status=status, finished_at=finished_at, **fields)
+        finally:
+            with self._changed:
+                self._running -= 1
+                self._run_total += finished_at - started_at
+                self._counters[status] += 1
+                self._unfinished.discard(job_id)
+                self._changed.notify_all()
+
+    def get(self, job_id):
+        """Return the stored state of a job as a dict, or None"""
+        row = storage.get_connection().execute('''
+            SELECT id, status, progress, quiz_id, error, timings,
+                   created_at, started_at, finished_at
+            FROM jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+        if not row:
+            return None
+
+        job_id, status, progress, quiz_id, error, timings, created_at, started_at, finished_at = row
+        job = {
+            'job_id': job_id,
+            'status': status,
+            'progress': progress,
+            'quiz_id': quiz_id,
+            'error': error,
+            'timings': {
+                'stages': json.loads(timings or '{}'),
+                'queued_seconds': round((started_at or time.time()) - created_at, 4),
+                'run_seconds': round((finished_at or time.time()) - started_at, 4) if started_at else None
+            }
+        }
+        return job
+
+    def wait(self, job_id, timeout):
+        """Long-poll: block until the job finishes or timeout elapses"""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job and job['status'] in ('queued', 'running'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._changed:
+                self._changed.wait(min(remaining, WAIT_POLL_SECONDS))
+            job = self.get(job_id)
+        return job
+
+    def shutdown(self, error='Interrupted by worker restart'):
+        """Drop queued jobs and mark every unfinished job of this process failed
+
+        For a server worker that is exiting; its jobs cannot be picked up by
+        another process. A running job that still completes before the
+        process ends records its real outcome. Returns the number marked.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            job_ids = list(self._unfinished)
+        if not job_ids:
+            return 0
+        with storage.transaction() as conn:
+            failed = conn.execute(f'''
+                UPDATE jobs SET status = 'failed', error = ?, finished_at = ?
+                WHERE id IN ({', '.join('?' * len(job_ids))}) AND status IN ('queued', 'running')
+            ''', (error, time.time(), *job_ids)).rowcount
+        return failed
+
+    def stats(self):
+        """Return queue depth, concurrency and timing counters"""
+        with self._lock:
+            started = self._counters['submitted'] - self._queued
+            finished = self._counters['succeeded'] + self._counters['failed']
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queued': self._queued,
+                'running': self._running,
+                **self._counters,
+                'avg_queue_seconds': round(self._wait_total / started, 4) if started else 0.0,
+                'avg_run_seconds': round(self._run_total / finished, 4) if finished else 0.0
+            }
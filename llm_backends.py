@@ -0,0 +1,426 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+
+import metrics
+import storage
+from http_clients import get_openai_client, track_upstream
+
+DEFAULT_MODEL = 'gpt-3.5-turbo'
+
+class BackendBusyError(Exception):
+    """Raised when no concurrency slot for a backend frees up in time"""
+
+class FakeRateLimitError(Exception):
+    """The fake backend's stand-in for an HTTP 429 from the model API"""
+
+    status_code = 429
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _setting(name, default, cast=int):
+    return cast(os.getenv(name, default))
+
+def is_rate_limit_error(error):
+    """Whether a model call failed because the API is throttling us (HTTP 429)"""
+    return getattr(error, 'status_code', None) == 429
+
+def retry_after_seconds(error):
+    """Seconds the API asked us to wait before retrying, or None"""
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:
+        # The HTTP-date form; let the caller pick its own backoff
+        return None
+
+# Called with retry_after_seconds() whenever a model call is throttled
+_rate_limit_listeners = []
+
+def add_rate_limit_listener(callback):
+    """Register callback(retry_after) for model calls rejected with HTTP 429 by any backend"""
+    _rate_limit_listeners.append(callback)
+
+def prompt_hash(model, messages, max_tokens, temperature, json_mode):
+    """Stable hash of everything that determines a completion"""
+    payload = json.dumps([model, messages, max_tokens, temperature, json_mode],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Completed responses keyed by prompt hash, compressed in the llm_cache table"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key):
+        row = storage.get_connection().execute(
+            'SELECT response, usage, created_at FROM llm_cache WHERE key = ?', (key,)).fetchone()
+        if not row or row['created_at'] < time.time() - self.ttl:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return zlib.decompress(row['response']).decode('utf-8'), json.loads(row['usage'] or 'null')
+
+    def set(self, key, model, text, usage):
+        now = time.time()
+        with storage.transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (key, model, response, usage, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, model, zlib.compress(text.encode('utf-8')), json.dumps(usage), now))
+            conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,))
+        self._count('stores')
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class LLMBackend:
+    """Chat completion backend with a timeout, a concurrency limit and an optional response cache
+
+    Subclasses implement _complete() returning (text, usage) and _stream()
+    yielding text deltas. usage is a dict with prompt_tokens and
+    completion_tokens, or None.
+    """
+
+    name = 'base'
+
+    def __init__(self, default_model=DEFAULT_MODEL, timeout=60, max_concurrency=8,
+                 acquire_timeout=30, cache=None):
+        self.default_model = default_model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.cache = cache
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {'calls': 0, 'streams': 0, 'errors': 0, 'busy': 0, 'rate_limited': 0,
+                          'prompt_tokens': 0, 'completion_tokens': 0}
+        self._models = {}
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._counters['busy'] += 1
+            raise BackendBusyError(f"No free {self.name} slot after {self.acquire_timeout}s "
+                                   f"({self.max_concurrency} in flight)")
+        with self._lock:
+            self._in_flight += 1
+
+    def _record_error(self, error):
+        if not is_rate_limit_error(error):
+            return
+        with self._lock:
+            self._counters['rate_limited'] += 1
+        retry_after = retry_after_seconds(error)
+        for callback in list(_rate_limit_listeners):
+            callback(retry_after)
+
+    def _release(self, model, started, failed):
+        elapsed = time.perf_counter() - started
+        metrics.observe('llm_request_duration_seconds', elapsed, backend=self.name, model=model)
+        with self._lock:
+            self._in_flight -= 1
+            self._counters['errors'] += failed
+            entry = self._models.setdefault(model, {'calls': 0, 'total_seconds': 0.0})
+            entry['calls'] += 1
+            entry['total_seconds'] += elapsed
+        self._slots.release()
+
+    def complete(self, messages, model=None, max_tokens=2000, temperature=0.7, json_mode=False):
+        """Run a chat completion and return (text, usage)"""
+        model = model or self.default_model
+        key = None
+        if self.cache:
+            key = prompt_hash(model, messages, max_tokens, temperature, json_mode)
+            cached = self.cache.get(key)
+            if cached:
+                return cached
+
+        self._acquire()
+        started = time.perf_counter()
+        failed = True
+        try:
+            with self._lock:
+                self._counters['calls'] += 1
+            with track_upstream(f'llm_{self.name}'):
+                text, usage = self._complete(messages, model, max_tokens, temperature, json_mode)
+            failed = False
+        except Exception as e:
+            self._record_error(e)
+            raise
+        finally:
+            self._release(model, started, failed)
+
+        if usage:
+            with self._lock:
+                self._counters['prompt_tokens'] += usage['prompt_tokens']
+                self._counters['completion_tokens'] += usage['completion_tokens']
+            metrics.inc('llm_tokens_total', usage['prompt_tokens'], kind='prompt', model=model)
+            metrics.inc('llm_tokens_total', usage['completion_tokens'], kind='completion', model=model)
+        if key:
+            self.cache.set(key, model, text, usage)
+        return text, usage
+
+    def stream(self, messages, model=None, max_tokens=2000, temperature=0.7):
+        """Run a streaming chat completion, yielding text deltas"""
+        model = model or self.default_model
+        key = None
+        if self.cache:
+            key = prompt_hash(model, messages, max_tokens, temperature, False)
+            cached = self.cache.get(key)
+            if cached:
+                yield cached[0]
+                return
+
+        self._acquire()
+        started = time.perf_counter()
+        failed = True
+        parts = []
+        try:
+            with self._lock:
+                self._counters['streams'] += 1
+            with track_upstream(f'llm_{self.name}_stream'):
+                for delta in self._stream(messages, model, max_tokens, temperature):
+                    parts.append(delta)
+                    yield delta
+            failed = False
+        except Exception as e:
+            self._record_error(e)
+            raise
+        finally:
+            self._release(model, started, failed)
+
+        if key:
+            self.cache.set(key, model, ''.join(parts), None)
+
+    def _complete(self, messages, model, max_tokens, temperature, json_mode):
+        raise NotImplementedError
+
+    def _stream(self, messages, model, max_tokens, temperature):
+        raise NotImplementedError
+
+    def stats(self):
+        with self._lock:
+            models = {model: {'calls': entry['calls'],
+                              'avg_seconds': round(entry['total_seconds'] / entry['calls'], 4)}
+                      for model, entry in self._models.items()}
+            stats = {
+                'backend': self.name,
+                'default_model': self.default_model,
+                'timeout': self.timeout,
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                **self._counters,
+                'models': models
+            }
+        stats['cache'] = self.cache.stats() if self.cache else None
+        return stats
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI (or any OpenAI-compatible server via OPENAI_BASE_URL) through the shared pooled client"""
+
+    name = 'openai'
+
+    def _complete(self, messages, model, max_tokens, temperature, json_mode):
+        # The pinned client predates the response_format keyword
+        extra_body = {'response_format': {'type': 'json_object'}} if json_mode else None
+        response = get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            extra_body=extra_body,
+            timeout=self.timeout
+        )
+        usage = None
+        if getattr(response, 'usage', None):
+            usage = {'prompt_tokens': response.usage.prompt_tokens,
+                     'completion_tokens': response.usage.completion_tokens}
+        return response.choices[0].message.content, usage
+
+    def _stream(self, messages, model, max_tokens, temperature):
+        stream = get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            timeout=self.timeout
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+FAKE_WORD_RE = re.compile(r'[A-Za-z][a-z]{4,}')
+FAKE_COUNT_RE = re.compile(r'Generate (\d+) multiple choice')
+
+class FakeBackend(LLMBackend):
+    """Deterministic local stand-in for benchmarks and offline testing
+
+    Builds quiz questions from words in the prompt, seeded by the prompt
+    hash, in JSON or the numbered text format. latency and
+    tokens_per_second simulate a remote model's response time; with
+    capacity set, calls beyond that many running at once fail with a
+    FakeRateLimitError, like an API over its rate limit.
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency=0.0, tokens_per_second=0.0, capacity=0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.capacity = capacity
+        self._running = 0
+        self._running_lock = threading.Lock()
+
+    def _enter(self):
+        with self._running_lock:
+            if self.capacity and self._running >= self.capacity:
+                raise FakeRateLimitError(f"Fake backend over capacity ({self.capacity} running)",
+                                         retry_after=self.latency or 1.0)
+            self._running += 1
+
+    def _exit(self):
+        with self._running_lock:
+            self._running -= 1
+
+    def _delay(self, tokens):
+        return self.latency + (tokens / self.tokens_per_second if self.tokens_per_second else 0.0)
+
+    def _complete(self, messages, model, max_tokens, temperature, json_mode):
+        text = fake_quiz_response(messages, json_mode)
+        completion_tokens = len(text) // 4
+        self._enter()
+        try:
+            time.sleep(self._delay(completion_tokens))
+        finally:
+            self._exit()
+        prompt_tokens = sum(len(m['content']) for m in messages) // 4
+        return text, {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}
+
+    def _stream(self, messages, model, max_tokens, temperature):
+        text = fake_quiz_response(messages, json_mode=False)
+        pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+        self._enter()
+        try:
+            time.sleep(self.latency)
+            step = self._delay(len(text) // 4) - self.latency
+            for piece in pieces:
+                if step:
+                    time.sleep(step / len(pieces))
+                yield piece
+        finally:
+            self._exit()
+
+def fake_quiz_response(messages, json_mode):
+    """The fake model's answer: num_questions questions about words from the prompt"""
+    prompt = messages[-1]['content']
+    match = FAKE_COUNT_RE.search(prompt)
+    if not match:
+        return 'Fake backend response: API test successful'
+    count = int(match.group(1))
+
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+    words = sorted(set(FAKE_WORD_RE.findall(prompt))) or ['content']
+    questions = []
+    for index in range(count):
+        term = rng.choice(words)
+        options = rng.sample(words, min(4, len(words)))
+        if term not in options:
+            options[rng.randrange(len(options))] = term
+        while len(options) < 4:
+            options.append(f'none of the above {len(options)}')
+        questions.append({
+            'question': f"Which term does the content use in point {index + 1} about {term.lower()}?",
+            'options': options,
+            'correct_answer': 'ABCD'[options.index(term)],
+            'explanation': f"The content discusses {term.lower()} directly."
+        })
+
+    if json_mode:
+        return json.dumps({'questions': questions})
+    lines = []
+    for index, question in enumerate(questions, start=1):
+        lines.append(f"{index}. {question['question']}")
+        lines.extend(f"{letter}) {option}" for letter, option in zip('ABCD', question['options']))
+        lines.append(f"Correct: {question['correct_answer']})")
+        lines.append(f"Explanation: {question['explanation']}")
+        lines.append('')
+    return '\n'.join(lines)
+
+BACKENDS = {'openai': OpenAIBackend, 'fake': FakeBackend}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_backend(name=None):
+    """Build the backend named by LLM_BACKEND (default openai) from environment settings"""
+    name = name or os.getenv('LLM_BACKEND', 'openai')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; choose from {', '.join(BACKENDS)}")
+    cache_ttl = _setting('LLM_CACHE_TTL', 0)
+    kwargs = {
+        'default_model': os.getenv('LLM_MODEL', DEFAULT_MODEL),
+        'timeout': _setting('LLM_TIMEOUT', 60, float),
+        'max_concurrency': _setting('LLM_MAX_CONCURRENCY', 8),
+        'acquire_timeout': _setting('LLM_ACQUIRE_TIMEOUT', 30, float),
+        'cache': ResponseCache(cache_ttl) if cache_ttl > 0 else None
+    }
+    if name == 'fake':
+        kwargs['latency'] = _setting('FAKE_LLM_LATENCY', 0.0, float)
+        kwargs['tokens_per_second'] = _setting('FAKE_LLM_TOKENS_PER_SECOND', 0.0, float)
+        kwargs['capacity'] = _setting('FAKE_LLM_CAPACITY', 0)
+    return BACKENDS[name](**kwargs)
+
+def get_backend():
+    """Return the process-wide backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def set_backend(backend):
+    """Replace the process-wide backend (benchmarks and tools)"""
+    global _backend
+    _backend = backend
+
+def choose_model(num_questions):
+    """Route small quizzes to LLM_SMALL_MODEL when one is configured"""
+    small_model = os.getenv('LLM_SMALL_MODEL')
+    if small_model and num_questions <= _setting('LLM_SMALL_QUIZ_MAX', 5):
+        return small_model
+    return None
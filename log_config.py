@@ -0,0 +1,137 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+DEFAULT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s'
+
+_listener = None
+_handler = None
+_setup_lock = threading.Lock()
+_fork_hook_registered = False
+
+_stats = {'queued': 0, 'dropped': 0, 'payloads_logged': 0, 'payloads_skipped': 0}
+_stats_lock = threading.Lock()
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting or blocking
+
+    The stock QueueHandler formats each message in the calling thread so
+    records can be pickled; in-process there is no need, so formatting and
+    the write both happen on the listener thread. When the queue is full
+    the record is dropped and counted rather than stalling the request.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count('dropped')
+            return
+        _count('queued')
+
+def _setting(name, default, cast=str):
+    return cast(os.getenv(name, default))
+
+def setup_logging(level=None, use_queue=None, stream=None):
+    """Configure the root logger once per process
+
+    Records go through a bounded queue (LOG_QUEUE_SIZE) to a background
+    thread that formats and writes them to stream (stdout by default).
+    LOG_QUEUE=0 or use_queue=False writes synchronously instead. Calling it
+    again only changes the level.
+    """
+    global _listener, _handler
+    level = (level or _setting('LOG_LEVEL', 'INFO')).upper()
+    if use_queue is None:
+        use_queue = _setting('LOG_QUEUE', '1').lower() not in ('0', 'false', 'no')
+
+    root = logging.getLogger()
+    with _setup_lock:
+        root.setLevel(level)
+        if _handler is not None:
+            return
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(logging.Formatter(_setting('LOG_FORMAT', DEFAULT_FORMAT)))
+        if use_queue:
+            records = queue.Queue(maxsize=_setting('LOG_QUEUE_SIZE', 10000, int))
+            _handler = NonBlockingQueueHandler(records)
+            _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+            _listener.start()
+            atexit.register(shutdown)
+            _register_fork_hook()
+        else:
+            _handler = output
+        # Replace handlers installed by basicConfig() or earlier imports
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_handler)
+
+def _register_fork_hook():
+    global _fork_hook_registered
+    if not _fork_hook_registered and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        _fork_hook_registered = True
+
+def _restart_after_fork():
+    # The listener thread does not survive fork (e.g. gunicorn preload), so
+    # each child process starts its own, with a fresh queue and locks
+    global _listener, _setup_lock, _stats_lock
+    _setup_lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    if _listener is None:
+        return
+    records = queue.Queue(maxsize=_listener.queue.maxsize)
+    _handler.queue = records
+    _listener = logging.handlers.QueueListener(records, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+def shutdown():
+    """Write out queued records and stop the listener thread"""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        if _handler is not None:
+            logging.getLogger().removeHandler(_handler)
+            _handler = None
+
+def log_payload(logger, label, text, sample_rate=None, max_chars=None):
+    """Log a sample of a large payload (transcript text, model output) at DEBUG
+
+    Only a LOG_PAYLOAD_SAMPLE_RATE share of calls are logged, truncated to
+    LOG_PAYLOAD_MAX_CHARS; nothing is formatted unless DEBUG is enabled.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if sample_rate is None:
+        sample_rate = _setting('LOG_PAYLOAD_SAMPLE_RATE', 0.01, float)
+    if sample_rate < 1 and random.random() >= sample_rate:
+        _count('payloads_skipped')
+        return
+    if max_chars is None:
+        max_chars = _setting('LOG_PAYLOAD_MAX_CHARS', 500, int)
+    _count('payloads_logged')
+    shown = text if len(text) <= max_chars else f"{text[:max_chars]}... ({len(text)} chars)"
+    logger.debug('%s: %s', label, shown)
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['level'] = logging.getLevelName(logging.getLogger().level)
+    stats['queue'] = _listener is not None
+    stats['queue_depth'] = _listener.queue.qsize() if _listener is not None else 0
+    return stats
@@ -0,0 +1,169 @@
+import logging
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English prose; good enough for budgeting chunk sizes
+CHARS_PER_TOKEN = 4
+# Ask each chunk for extra candidates so deduplication still leaves enough
+OVERGENERATE_FACTOR = 1.5
+
+SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?])\s+')
+NON_WORD_RE = re.compile(r'[^a-z0-9\s]')
+
+_stats = {'runs': 0, 'chunks': 0, 'failed_chunks': 0, 'candidates': 0, 'duplicates': 0,
+          'map_input_tokens': 0, 'map_output_tokens': 0}
+_stats_lock = threading.Lock()
+
+def estimate_tokens(text):
+    """Estimate the token count of text without a tokenizer"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def split_sentences(text):
+    """Split text at the sentence boundaries the transcript cleaner produces"""
+    return [s for s in SENTENCE_BOUNDARY_RE.split(text) if s]
+
+def chunk_text(text, max_tokens):
+    """Pack whole sentences into chunks of at most max_tokens (estimated)"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence in split_sentences(text):
+        tokens = estimate_tokens(sentence) + 1
+        if tokens > max_tokens:
+            # A single run-on "sentence" (common in auto-captions): split on words
+            words = sentence.split()
+            step = max(1, max_tokens * CHARS_PER_TOKEN // 6)
+            pieces = [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            pieces = [sentence]
+        for piece in pieces:
+            tokens = estimate_tokens(piece) + 1
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+def normalize_stem(question):
+    """Normalize a question stem for duplicate detection"""
+    return ' '.join(NON_WORD_RE.sub(' ', question.lower()).split())
+
+def _is_duplicate(words, seen):
+    for other in seen:
+        union = words | other
+        if union and len(words & other) / len(union) >= 0.8:
+            return True
+    return False
+
+def merge_questions(results, num_questions):
+    """Deduplicate per-chunk questions and pick num_questions spread across chunks
+
+    results is a list (in chunk order) of question lists. Questions are taken
+    round-robin so every part of the content is covered, then returned in
+    chunk order.
+    """
+    seen_stems = set()
+    seen_words = []
+    unique = []
+    duplicates = 0
+    for chunk_index, questions in enumerate(results):
+        kept = []
+        for question in questions:
+            stem = normalize_stem(question.get('question') or '')
+            words = set(stem.split())
+            if not stem or stem in seen_stems or _is_duplicate(words, seen_words):
+                duplicates += 1
+                continue
+            seen_stems.add(stem)
+            seen_words.append(words)
+            kept.append(question)
+        unique.append(kept)
+
+    selected = []
+    depth = 0
+    while len(selected) < num_questions and any(len(q) > depth for q in unique):
+        for chunk_index, questions in enumerate(unique):
+            if len(questions) > depth and len(selected) < num_questions:
+                selected.append((chunk_index, depth, questions[depth]))
+        depth += 1
+
+    selected.sort(key=lambda item: (item[0], item[1]))
+    return [question for _, _, question in selected], duplicates
+
+def generate_long_quiz(content, num_questions, generate_chunk, chunk_tokens=3000, max_workers=4):
+    """Map-reduce quiz generation for content too long for one prompt
+
+    generate_chunk(chunk, count) must return (questions, usage) where usage is
+    a dict with prompt_tokens/completion_tokens (or None to use estimates).
+    Chunks are processed in parallel with at most max_workers in flight.
+    Returns (questions, report) with per-stage token counts. If every
+    chunk fails, the last chunk's exception is raised.
+    """
+    chunks = chunk_text(content, chunk_tokens)
+    per_chunk = max(1, math.ceil(num_questions * OVERGENERATE_FACTOR / len(chunks)))
+    logger.info("Long content mode: %d chunks, %d questions per chunk", len(chunks), per_chunk)
+
+    results = [[] for _ in chunks]
+    input_tokens = 0
+    output_tokens = 0
+    failed = 0
+    last_error = None
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quiz-chunk') as executor:
+        futures = {executor.submit(generate_chunk, chunk, per_chunk): index
+                   for index, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                questions, usage = future.result()
+            except Exception as e:
+                logger.warning("Chunk %d/%d failed: %s", index + 1, len(chunks), e)
+                failed += 1
+                last_error = e
+                continue
+            results[index] = questions
+            if usage:
+                input_tokens += usage.get('prompt_tokens') or 0
+                output_tokens += usage.get('completion_tokens') or 0
+            else:
+                input_tokens += estimate_tokens(chunks[index])
+                output_tokens += sum(estimate_tokens(str(q)) for q in questions)
+
+    if failed == len(chunks):
+        logger.warning("Quiz generation failed for every content chunk")
+        raise last_error
+
+    candidates = sum(len(q) for q in results)
+    questions, duplicates = merge_questions(results, num_questions)
+    report = {
+        'content_tokens': estimate_tokens(content),
+        'chunks': len(chunks),
+        'failed_chunks': failed,
+        'questions_per_chunk': per_chunk,
+        'map_input_tokens': input_tokens,
+        'map_output_tokens': output_tokens,
+        'candidates': candidates,
+        'duplicates': duplicates,
+        'selected': len(questions)
+    }
+    logger.info("Long content report: %s", report)
+
+    with _stats_lock:
+        _stats['runs'] += 1
+        _stats['chunks'] += len(chunks)
+        _stats['failed_chunks'] += failed
+        _stats['candidates'] += candidates
+        _stats['duplicates'] += duplicates
+        _stats['map_input_tokens'] += input_tokens
+        _stats['map_output_tokens'] += output_tokens
+    return questions, report
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
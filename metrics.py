@@ -0,0 +1,223 @@
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import nullcontext
+
+# METRICS_ENABLED=0 turns span() into a shared no-op context manager and
+# observe()/inc() into an early return
+ENABLED = os.getenv('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+PREFIX = 'quizgen_'
+
+# Upper bounds in seconds, from fast cache hits to slow model calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    'http_requests_total': 'HTTP requests by endpoint, method and status',
+    'http_request_duration_seconds': 'Time to build the HTTP response (streamed bodies excluded)',
+    'stage_duration_seconds': 'Time spent in each quiz generation stage',
+    'stage_errors_total': 'Stages that raised an exception',
+    'llm_request_duration_seconds': 'Model call latency by backend and model',
+    'llm_tokens_total': 'Prompt and completion tokens reported by the model',
+    'db_lock_wait_seconds': 'Time waiting for the SQLite write lock'
+}
+
+_NOOP = nullcontext()
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket containing it
+
+        Returns None when it falls beyond the largest bound.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+
+# Spans recorded during the current request when it is being profiled
+_local = threading.local()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def observe(name, value, **labels):
+    """Add a value (usually seconds) to the histogram name{labels}"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+def inc(name, amount=1, **labels):
+    """Increase the counter name{labels}"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+class _Span:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        observe('stage_duration_seconds', elapsed, stage=self.name)
+        if exc_type is not None:
+            inc('stage_errors_total', stage=self.name)
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace.append((self.name, elapsed))
+        return False
+
+def span(name):
+    """Time a block as stage name: with metrics.span('transcript_fetch'): ..."""
+    return _Span(name) if ENABLED else _NOOP
+
+def start_trace(profile=False):
+    """Collect this thread's spans, and optionally a cProfile, until finish_trace()"""
+    _local.trace = []
+    _local.profiler = None
+    if profile:
+        _local.profiler = cProfile.Profile()
+        _local.profiler.enable()
+
+def finish_trace():
+    """Stop tracing and return (spans, profiler) where spans is [(name, seconds)]"""
+    trace = getattr(_local, 'trace', None)
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    _local.trace = None
+    _local.profiler = None
+    return trace or [], profiler
+
+def server_timing(spans, total=None):
+    """Format spans for the Server-Timing response header"""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(parts)
+
+def save_profile(profiler, directory, name, top=20):
+    """Write profiler stats to directory/name.prof and return the file path and a text summary"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.prof")
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(top)
+    return path, summary.getvalue()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_prometheus(extra=()):
+    """Render all metrics in the Prometheus text exposition format
+
+    extra is an iterable of (name, type, help, labels dict, value) samples
+    read from the app's other stats at scrape time, e.g. cache hit ratios.
+    Samples of one name must be adjacent.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(h.counts), h.sum, h.count, h.bounds))
+                            for key, h in _histograms.items())
+
+    lines = []
+    described = set()
+
+    def describe(name, kind, help_text=None):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {PREFIX}{name} {help_text or HELP.get(name, name)}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), value in counters:
+        describe(name, 'counter')
+        lines.append(f"{PREFIX}{name}{_labels(labels)} {_number(value)}")
+
+    for (name, labels), (counts, total, count, bounds) in histograms:
+        describe(name, 'histogram')
+        cumulative = 0
+        for bound, bucket in zip(bounds + (float('inf'),), counts):
+            cumulative += bucket
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', _number(bound))])} {cumulative}")
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_number(total)}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+
+    for name, kind, help_text, labels, value in extra:
+        describe(name, kind, help_text)
+        lines.append(f"{PREFIX}{name}{_labels(sorted(labels.items()))} {_number(value)}")
+
+    return '\n'.join(lines) + '\n'
+
+def get_stats():
+    """Request and stage latency summaries (count, average, p50/p95/p99 bucket bounds)"""
+    with _lock:
+        items = sorted(_histograms.items())
+        summaries = {}
+        for (name, labels), histogram in items:
+            label = ','.join(f"{key}={value}" for key, value in labels) or 'all'
+            summaries.setdefault(name, {})[label] = {
+                'count': histogram.count,
+                'avg_seconds': round(histogram.sum / histogram.count, 4) if histogram.count else 0.0,
+                'p50_seconds': histogram.quantile(0.5),
+                'p95_seconds': histogram.quantile(0.95),
+                'p99_seconds': histogram.quantile(0.99)
+            }
+    return {'enabled': ENABLED, 'histograms': summaries}
+
+def reset():
+    """Clear all metrics (benchmarks)"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,259 @@
+"""Pre-generate quizzes for a list of URLs so first requests are cache hits
+
+Reads one URL per line (optionally followed by a start and end time for
+part of a YouTube video; blank lines and # comments are skipped) and, for
+every language and question count asked for, extracts the content (which
+also fills the transcript and content stores) and generates and stores the
+quiz, skipping quizzes that are already stored. Runs extraction and
+generation in parallel like /generate_quiz/batch. Stops starting new
+generations once the token or cost budget would be exceeded, or at the
+--until time, so it can be run from cron during off-peak hours.
+
+Usage: python pregenerate.py urls.txt [--num-questions 5 10] [--language en hi]
+       [--max-tokens 500000] [--max-cost 5] [--until 07:00] [--dry-run]
+"""
+import argparse
+import logging
+import math
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('pregenerate')
+
+# Prices in USD per million tokens, for --max-cost (gpt-3.5-turbo by default)
+PROMPT_PRICE = 0.5
+COMPLETION_PRICE = 1.5
+# Instructions and JSON format description sent with every prompt
+PROMPT_OVERHEAD_TOKENS = 200
+
+def read_url_list(lines):
+    """Return (url, start, end) entries from lines of 'URL [start [end]]'"""
+    entries = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.split()
+        url, start, end = (parts + [None, None])[:3]
+        entries.append((url, start, end))
+    return entries
+
+def parse_until(value, now=None):
+    """The next time of day HH:MM after now, as a datetime"""
+    now = now or datetime.now()
+    hours, minutes = (int(part) for part in value.split(':'))
+    until = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+    return until if until > now else until + timedelta(days=1)
+
+class Budget:
+    """Token and cost limits shared by the generation workers
+
+    Spending is read from the backend's token counters, so responses
+    served from the LLM response cache cost nothing. Each generation first
+    reserves an estimate of its tokens; it only starts if what has been
+    spent plus everything reserved still fits. 0 disables a limit.
+    """
+
+    def __init__(self, backend, max_tokens=0, max_cost=0.0, prompt_price=PROMPT_PRICE,
+                 completion_price=COMPLETION_PRICE):
+        self.backend = backend
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        self._start = self._totals()
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    def _totals(self):
+        stats = self.backend.stats()
+        return stats['prompt_tokens'], stats['completion_tokens']
+
+    def cost(self, prompt_tokens, completion_tokens):
+        return (prompt_tokens * self.prompt_price + completion_tokens * self.completion_price) / 1e6
+
+    def spent(self):
+        """(prompt tokens, completion tokens) used since the budget was created"""
+        prompt, completion = self._totals()
+        return prompt - self._start[0], completion - self._start[1]
+
+    def reserve(self, key, prompt_tokens, completion_tokens):
+        """Set aside an estimate for key; False if it does not fit in the budget"""
+        with self._lock:
+            prompt, completion = self.spent()
+            for reserved_prompt, reserved_completion in self._reserved.values():
+                prompt += reserved_prompt
+                completion += reserved_completion
+            prompt += prompt_tokens
+            completion += completion_tokens
+            if self.max_tokens and prompt + completion > self.max_tokens:
+                return False
+            if self.max_cost and self.cost(prompt, completion) > self.max_cost:
+                return False
+            self._reserved[key] = (prompt_tokens, completion_tokens)
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._reserved.pop(key, None)
+
+def estimate_usage(quiz_app, content, num_questions):
+    """Rough (prompt, completion) tokens for generating a quiz (and its question pool) from content"""
+    num_questions = quiz_app.question_pool_count(num_questions)
+    prompt_tokens = quiz_app.estimate_tokens(content)
+    prompts = 1
+    questions_per_prompt = num_questions
+    if quiz_app.is_long_content(content):
+        # Map-reduce: every chunk is its own prompt, trimmed to the budget for its questions
+        prompts = math.ceil(prompt_tokens / quiz_app.LONG_CONTENT_CHUNK_TOKENS)
+        questions_per_prompt = math.ceil(num_questions * quiz_app.long_content.OVERGENERATE_FACTOR / prompts)
+    limit = quiz_app.prompt_budget.budget_for(questions_per_prompt, quiz_app.PROMPT_TOKENS_PER_QUESTION,
+                                              quiz_app.PROMPT_MIN_TOKENS)
+    if limit:
+        prompt_tokens = min(prompt_tokens, prompts * limit)
+    return (prompt_tokens + prompts * PROMPT_OVERHEAD_TOKENS,
+            prompts * questions_per_prompt * quiz_app.QUESTION_COMPLETION_TOKENS)
+
+def build_items(quiz_app, entries, languages, counts):
+    """Validate every (entry, language, count), returning (items, invalid results)"""
+    items = []
+    invalid = []
+    seen = set()
+    for url, start, end in entries:
+        for language in languages:
+            for num_questions in counts:
+                params, error = quiz_app.validate_generation_request({
+                    'video_url': url, 'language': language, 'num_questions': num_questions,
+                    'start': start, 'end': end})
+                if error:
+                    invalid.append({'video_url': url, 'language': language, 'num_questions': num_questions,
+                                    'status': 'failed', 'stage': 'validating', 'error': error})
+                    continue
+                params['cache_key'] = quiz_app.get_quiz_cache_key(url, language, num_questions,
+                                                                  params['window'])
+                if params['cache_key'] not in seen:
+                    seen.add(params['cache_key'])
+                    items.append(params)
+    return items, invalid
+
+def pregenerate(quiz_app, items, budget, deadline=None, refresh=False, transcripts_only=False,
+                extract_workers=4, generate_workers=2):
+    """Extract and generate every item, returning one result dict per item"""
+
+    def past_deadline():
+        return deadline is not None and datetime.now() >= deadline
+
+    def extract(item):
+        if not refresh and not transcripts_only:
+            cached = quiz_app.find_cached_quiz(item['cache_key'])
+            if cached:
+                # It may have been generated on demand; keep it past QUIZ_CACHE_TTL
+                quiz_app.storage.pin_quiz(cached[0])
+                return {'status': 'cached', 'quiz_id': cached[0]}
+        if past_deadline():
+            return {'status': 'deferred'}
+        content = quiz_app.extract_content(item['video_url'], item['language'], item['window'])
+        if not content:
+            raise quiz_app.ExtractionError("Failed to extract content from URL")
+        if transcripts_only:
+            return {'status': 'extracted'}
+        return content
+
+    def generate(item, content):
+        if past_deadline():
+            return {'status': 'deferred'}
+        key = item['cache_key']
+        if not budget.reserve(key, *estimate_usage(quiz_app, content, item['num_questions'])):
+            return {'status': 'over_budget'}
+        try:
+            quiz_id, questions = quiz_app.generate_and_store_quiz(
+                item['video_url'], content, item['num_questions'], item['language'], key,
+                window=item['window'], max_wait=quiz_app.GENERATION_BACKGROUND_WAIT, pinned=True)
+        finally:
+            budget.release(key)
+        return {'status': 'created', 'quiz_id': quiz_id}
+
+    results = quiz_app.batch.run_batch(items, extract, generate, extract_workers=extract_workers,
+                                       generate_workers=generate_workers)
+    for item, result in zip(items, results):
+        result.update({'video_url': item['video_url'], 'language': item['language'],
+                       'num_questions': item['num_questions']})
+        if result['status'] == 'failed':
+            logger.error("%s (%s, %d questions) failed while %s: %s", item['video_url'], item['language'],
+                         item['num_questions'], result['stage'], result['error'])
+        else:
+            logger.info("%s (%s, %d questions): %s in %.2fs", item['video_url'], item['language'],
+                        item['num_questions'], result['status'], result['seconds'])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url_file', help="file with one URL per line ('-' for stdin)")
+    parser.add_argument('--num-questions', type=int, nargs='+', default=[5],
+                        help='question counts to generate for every URL (default 5)')
+    parser.add_argument('--language', nargs='+', default=['en'], help='languages (default en)')
+    parser.add_argument('--max-tokens', type=int, default=0, help='stop generating after this many tokens (0 = no limit)')
+    parser.add_argument('--max-cost', type=float, default=0.0, help='stop generating after this many USD (0 = no limit)')
+    parser.add_argument('--prompt-price', type=float, default=PROMPT_PRICE, help='USD per million prompt tokens')
+    parser.add_argument('--completion-price', type=float, default=COMPLETION_PRICE,
+                        help='USD per million completion tokens')
+    parser.add_argument('--until', help='local time HH:MM after which no new work is started')
+    parser.add_argument('--extract-workers', type=int, help='parallel extractions (default BATCH_EXTRACT_WORKERS)')
+    parser.add_argument('--generate-workers', type=int, help='parallel generations (default BATCH_GENERATE_WORKERS)')
+    parser.add_argument('--refresh', action='store_true', help='regenerate quizzes that are already stored')
+    parser.add_argument('--transcripts-only', action='store_true',
+                        help='only fetch and store transcripts and page text')
+    parser.add_argument('--dry-run', action='store_true', help='list which quizzes are missing and exit')
+    args = parser.parse_args()
+
+    # Imported here so --help works without an API key; this also loads .env
+    import app as quiz_app
+    import storage
+    # Migrations only: jobs in the table may belong to a running server
+    storage.init_db()
+
+    if args.url_file == '-':
+        entries = read_url_list(sys.stdin)
+    else:
+        with open(args.url_file, encoding='utf-8') as f:
+            entries = read_url_list(f)
+    items, invalid = build_items(quiz_app, entries, args.language, args.num_questions)
+    for result in invalid:
+        logger.error("%s (%s, %d questions) skipped: %s", result['video_url'], result['language'],
+                     result['num_questions'], result['error'])
+
+    if args.dry_run:
+        missing = [item for item in items if args.refresh or not quiz_app.find_cached_quiz(item['cache_key'])]
+        for item in missing:
+            print(f"missing  {item['video_url']} ({item['language']}, {item['num_questions']} questions)")
+        print(f"{len(items)} quizzes, {len(items) - len(missing)} stored, {len(missing)} to generate, "
+              f"{len(invalid)} invalid")
+        return 1 if invalid else 0
+
+    budget = Budget(quiz_app.get_backend(), args.max_tokens, args.max_cost,
+                    args.prompt_price, args.completion_price)
+    deadline = parse_until(args.until) if args.until else None
+    started = time.monotonic()
+    results = pregenerate(quiz_app, items, budget, deadline, refresh=args.refresh,
+                          transcripts_only=args.transcripts_only,
+                          extract_workers=args.extract_workers or quiz_app.BATCH_EXTRACT_WORKERS,
+                          generate_workers=args.generate_workers or quiz_app.BATCH_GENERATE_WORKERS)
+    elapsed = time.monotonic() - started
+
+    results += invalid
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    prompt_tokens, completion_tokens = budget.spent()
+    print(f"{len(results)} quizzes in {elapsed:.1f}s: "
+          + ', '.join(f"{count} {status}" for status, count in sorted(summary.items())))
+    print(f"Tokens used: {prompt_tokens} prompt + {completion_tokens} completion "
+          f"(~${budget.cost(prompt_tokens, completion_tokens):.4f})")
+    if summary.get('over_budget') or summary.get('deferred'):
+        print("Run again (after raising the budget or in the next off-peak window) to generate the rest")
+    return 1 if summary.get('failed') else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import logging
+import math
+import re
+import threading
+import time
+
+import numpy as np
+
+from long_content import estimate_tokens, split_sentences
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Encoding used by gpt-3.5-turbo and gpt-4
+TIKTOKEN_ENCODING = 'cl100k_base'
+
+# Run-on caption text without punctuation is ranked in windows of this many words
+MAX_UNIT_WORDS = 40
+
+WORD_RE = re.compile(r"[a-z0-9\u0900-\u097f']+")
+NON_WORD_RE = re.compile(r'[^a-z0-9\u0900-\u097f\s]')
+
+# Common words that carry no information about the content
+STOPWORDS = frozenset('''
+a about after again all also am an and any are as at be because been before being
+between both but by can could did do does doing down during each few for from further
+get go going got had has have having he her here him his how i if in into is it its
+just know like me more most my no not now of off on once only or other our out over
+really right say so some such than that the their them then there these they thing
+things think this those through to too um uh under until up very was way we well were
+what when where which while who why will with would yeah you your
+'''.split())
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = False
+
+_stats = {'requests': 0, 'trimmed': 0, 'input_tokens': 0, 'prompt_tokens': 0,
+          'duplicates_removed': 0, 'seconds': 0.0, 'generation_seconds': 0.0}
+_stats_lock = threading.Lock()
+
+def _get_encoding():
+    # tiktoken fetches its BPE file on first use unless it is already cached
+    # (TIKTOKEN_CACHE_DIR); if that fails we fall back to the estimate for good.
+    # load_tokenizer() does this at startup so no request waits on a download
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and tiktoken is not None:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+                except Exception as e:
+                    logger.warning("tiktoken unavailable, estimating token counts: %s", e)
+                    _encoding_failed = True
+    return _encoding
+
+def load_tokenizer():
+    """Load the tokenizer now rather than on the first request; returns its name"""
+    return get_tokenizer_name()
+
+def get_tokenizer_name():
+    return TIKTOKEN_ENCODING if _get_encoding() is not None else 'estimate'
+
+def count_tokens(text):
+    """Count tokens with tiktoken when available, otherwise estimate them"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=())) if text else 0
+    return estimate_tokens(text)
+
+def _count_many(texts):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return np.array([len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())])
+    return np.array([estimate_tokens(text) for text in texts])
+
+def split_units(text):
+    """Split text into sentences, breaking run-on caption text into word windows"""
+    units = []
+    for sentence in split_sentences(text):
+        words = sentence.split()
+        if len(words) <= MAX_UNIT_WORDS:
+            units.append(sentence)
+        else:
+            units.extend(' '.join(words[i:i + MAX_UNIT_WORDS])
+                         for i in range(0, len(words), MAX_UNIT_WORDS))
+    return units
+
+def _first_occurrences(units):
+    seen = set()
+    indices = []
+    for index, unit in enumerate(units):
+        key = ' '.join(NON_WORD_RE.sub(' ', unit.lower()).split())
+        if key and key not in seen:
+            seen.add(key)
+            indices.append(index)
+    return indices
+
+def deduplicate(units):
+    """Drop units that repeat an earlier one, ignoring case and punctuation"""
+    return [units[index] for index in _first_occurrences(units)]
+
+def score_units(units):
+    """Score units by information density: summed TF-IDF weight of their
+    terms over the square root of the term count
+
+    Returns a NumPy array aligned with units. Units made only of stopwords
+    score 0.
+    """
+    vocabulary = {}
+    rows = []
+    cols = []
+    lengths = np.zeros(len(units))
+    for row, unit in enumerate(units):
+        terms = [term for term in WORD_RE.findall(unit.lower()) if term not in STOPWORDS]
+        lengths[row] = len(terms)
+        for term in terms:
+            rows.append(row)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+    if not vocabulary:
+        return np.zeros(len(units))
+
+    # Sparse term counts as (unit, term) pairs; a dense matrix would be
+    # units x vocabulary, far too large for a long transcript
+    pairs, term_counts = np.unique(np.array(rows) * len(vocabulary) + np.array(cols),
+                                   return_counts=True)
+    pair_rows, pair_cols = np.divmod(pairs, len(vocabulary))
+    document_frequency = np.bincount(pair_cols, minlength=len(vocabulary))
+    idf = np.log((1 + len(units)) / (1 + document_frequency)) + 1
+    weights = np.bincount(pair_rows, weights=term_counts * idf[pair_cols], minlength=len(units))
+    # Dividing by sqrt(length) rewards dense units without favouring fragments
+    return weights / np.sqrt(np.maximum(lengths, 1))
+
+def fit_to_budget(content, max_tokens):
+    """Deduplicate content and trim it to max_tokens, keeping the densest sentences
+
+    Kept sentences stay in their original order. Returns (text, report);
+    content already within budget after deduplication is returned whole.
+    """
+    started = time.perf_counter()
+    input_tokens = count_tokens(content)
+    units = split_units(content)
+    kept = _first_occurrences(units)
+    unique = [units[index] for index in kept]
+    duplicates = len(units) - len(unique)
+    text = ' '.join(unique) if duplicates else content
+    prompt_tokens = count_tokens(text) if duplicates else input_tokens
+    trimmed = False
+
+    if max_tokens and prompt_tokens > max_tokens and len(unique) > 1:
+        costs = _count_many(unique)
+        # Scored before deduplication so phrases repeated throughout (intros,
+        # sign-offs, filler) get a low IDF rather than looking unique
+        scores = score_units(units)[kept]
+        order = np.argsort(-scores, kind='stable')
+        # Take the densest units until the budget is spent; +1 for the joining space
+        within = np.cumsum(costs[order] + 1) <= max_tokens
+        keep = np.sort(order[within]) if within[0] else order[:1]
+        text = ' '.join(unique[i] for i in keep)
+        prompt_tokens = count_tokens(text)
+        trimmed = True
+
+    report = {
+        'input_tokens': input_tokens,
+        'prompt_tokens': prompt_tokens,
+        'saved_tokens': input_tokens - prompt_tokens,
+        'units': len(units),
+        'duplicates_removed': duplicates,
+        'trimmed': trimmed,
+        'tokenizer': get_tokenizer_name(),
+        'seconds': round(time.perf_counter() - started, 4)
+    }
+    return text, report
+
+def budget_for(num_questions, tokens_per_question, min_tokens):
+    """Prompt token budget for a quiz of num_questions, or 0 for no limit"""
+    if not tokens_per_question:
+        return 0
+    return max(min_tokens, math.ceil(num_questions * tokens_per_question))
+
+def record(report, generation_seconds):
+    """Add one request's savings and generation latency to the totals"""
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['trimmed'] += report['trimmed']
+        _stats['input_tokens'] += report['input_tokens']
+        _stats['prompt_tokens'] += report['prompt_tokens']
+        _stats['duplicates_removed'] += report['duplicates_removed']
+        _stats['seconds'] += report['seconds']
+        _stats['generation_seconds'] += generation_seconds
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    requests = stats['requests']
+    saved = stats['input_tokens'] - stats['prompt_tokens']
+    stats.update({
+        'saved_tokens': saved,
+        'saved_ratio': round(saved / stats['input_tokens'], 4) if stats['input_tokens'] else 0.0,
+        'avg_seconds': round(stats['seconds'] / requests, 4) if requests else 0.0,
+        'avg_generation_seconds': round(stats['generation_seconds'] / requests, 4) if requests else 0.0,
+        'tokenizer': TIKTOKEN_ENCODING if _encoding is not None else 'estimate'
+    })
+    stats['seconds'] = round(stats['seconds'], 4)
+    stats['generation_seconds'] = round(stats['generation_seconds'], 4)
+    return stats
@@ -0,0 +1,124 @@
+import re
+import threading
+import time
+
+import storage
+from storage import OPTION_SEPARATOR, _row_to_question
+
+# Numbering, punctuation, case and spacing do not make a question new
+NUMBERING = re.compile(r'^\s*(?:q(?:uestion)?\s*)?\d+\s*[.):-]\s*', re.IGNORECASE)
+NON_WORD = re.compile(r'[^\w\s]')
+SPACES = re.compile(r'\s+')
+
+_stats = {'draws': 0, 'drawn': 0, 'short_draws': 0, 'added': 0, 'duplicates': 0, 'seen_marked': 0}
+_stats_lock = threading.Lock()
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def normalize_stem(stem):
+    """The form of a question stem used to spot duplicates"""
+    text = NUMBERING.sub('', stem or '').lower()
+    return SPACES.sub(' ', NON_WORD.sub(' ', text)).strip()
+
+def add_questions(source_key, language, questions, max_age=None):
+    """Add questions to the pool for a source, skipping stems already in it
+
+    Drops questions older than max_age first. Returns the pool id of each
+    question (of the existing copy for duplicates, None for empty stems).
+    """
+    now = time.time()
+    ids = []
+    added = 0
+    with storage.transaction() as conn:
+        if max_age is not None:
+            conn.execute('DELETE FROM question_bank WHERE created_at < ?', (now - max_age,))
+        for question in questions:
+            stem_key = normalize_stem(question.get('question'))
+            if not stem_key:
+                ids.append(None)
+                continue
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO question_bank
+                    (source_key, language, stem_key, stem, options, correct, explanation, source_start, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (source_key, language, stem_key, question.get('question'),
+                  OPTION_SEPARATOR.join(question.get('options') or []), question.get('correct_answer'),
+                  question.get('explanation'), question.get('source_start'), now))
+            if cursor.rowcount:
+                added += 1
+                ids.append(cursor.lastrowid)
+            else:
+                ids.append(conn.execute(
+                    'SELECT id FROM question_bank WHERE source_key = ? AND language = ? AND stem_key = ?',
+                    (source_key, language, stem_key)).fetchone()[0])
+    _count('added', added)
+    _count('duplicates', len(ids) - ids.count(None) - added)
+    return ids
+
+def _pool_query(columns, source_key, language, taker, exclude, max_age):
+    query = f'''
+        SELECT {columns} FROM question_bank b
+        WHERE source_key = ? AND language = ?
+    '''
+    args = [source_key, language]
+    if max_age is not None:
+        query += ' AND created_at >= ?'
+        args.append(time.time() - max_age)
+    if taker:
+        query += ' AND NOT EXISTS (SELECT 1 FROM question_bank_seen s WHERE s.taker = ? AND s.question_id = b.id)'
+        args.append(taker)
+    if exclude:
+        query += f" AND id NOT IN ({', '.join('?' * len(exclude))})"
+        args.extend(exclude)
+    return query, args
+
+def available(source_key, language, taker=None, max_age=None):
+    """How many questions in the pool for a source taker has not been given yet"""
+    query, args = _pool_query('COUNT(*)', source_key, language, taker, (), max_age)
+    return storage.get_connection().execute(query, args).fetchone()[0]
+
+def draw(source_key, language, count, taker=None, exclude=(), max_age=None):
+    """Return up to count random (question id, question) pairs from the pool for a source
+
+    Skips questions taker has already been given and the ids in exclude.
+    """
+    query, args = _pool_query('id, stem, options, correct, explanation, source_start',
+                              source_key, language, taker, exclude, max_age)
+    query += ' ORDER BY random() LIMIT ?'
+    args.append(count)
+    rows = storage.get_connection().execute(query, args).fetchall()
+    _count('draws')
+    _count('drawn', len(rows))
+    if len(rows) < count:
+        _count('short_draws')
+    return [(row[0], _row_to_question(*row[1:])) for row in rows]
+
+def recent_stems(source_key, language, limit=50):
+    """The newest stems in the pool, for telling the model what not to repeat"""
+    rows = storage.get_connection().execute('''
+        SELECT stem FROM question_bank WHERE source_key = ? AND language = ?
+        ORDER BY id DESC LIMIT ?
+    ''', (source_key, language, limit)).fetchall()
+    return [row[0] for row in rows]
+
+def mark_seen(taker, question_ids, max_age=None):
+    """Record that taker has been given these questions"""
+    now = time.time()
+    with storage.transaction() as conn:
+        if max_age is not None:
+            conn.execute('DELETE FROM question_bank_seen WHERE seen_at < ?', (now - max_age,))
+        conn.executemany('INSERT OR REPLACE INTO question_bank_seen (taker, question_id, seen_at) VALUES (?, ?, ?)',
+                         [(taker, question_id, now) for question_id in question_ids])
+    _count('seen_marked', len(question_ids))
+
+def get_stats(conn=None):
+    with _stats_lock:
+        stats = dict(_stats)
+    if conn is not None:
+        questions, sources = conn.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT source_key) FROM question_bank').fetchone()
+        takers = conn.execute('SELECT COUNT(DISTINCT taker) FROM question_bank_seen').fetchone()[0]
+        stats.update({'questions': questions, 'sources': sources, 'takers': takers})
+    return stats
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+# Query parameters that never change the content behind a URL
+TRACKING_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term',
+                   'utm_content', 'fbclid', 'gclid', 'si', 'feature')
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry TTL and size-bounded eviction
+
+    Entries are bounded by count and, when max_bytes is set, by the total
+    size passed to set().
+    """
+
+    def __init__(self, max_entries=256, ttl=3600, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, size = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.total_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, size=0):
+        """Store value under key, evicting the least recently used entries"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous:
+                self.total_bytes -= previous[2]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (expires_at, value, size)
+            self.total_bytes += size
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self.total_bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry:
+                self.total_bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+def canonicalize_url(url):
+    """Normalize a URL so trivially different links map to the same key"""
+    parsed = urlparse(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parsed.query)
+                   if k.lower() not in TRACKING_PARAMS)
+    path = parsed.path.rstrip('/') or '/'
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), path,
+                       '', urlencode(query), ''))
+
+def make_cache_key(source_key, language, num_questions):
+    """Build the cache key for a generated quiz"""
+    return f"{source_key}|{language}|{num_questions}"
@@ -0,0 +1,256 @@
+import json
+import re
+import threading
+
+# Tolerant patterns for the text format: accept '1.', '1)', 'Q1:', 'Question 1.',
+# 'A)', 'A.', '(A)', '- A)', 'Correct answer:' and 'Answer:' variants
+QUESTION_RE = re.compile(r'^(?:Q(?:uestion)?\s*)?\d+\s*[.):]\s*', re.IGNORECASE)
+OPTION_RE = re.compile(r'^[-*\s]*\(?([A-F])[).:](?:\s+|$)')
+CORRECT_RE = re.compile(r'^(?:correct(?:\s+answer)?|answer)\s*[:\-]\s*', re.IGNORECASE)
+EXPLANATION_RE = re.compile(r'^explanation\s*[:\-]\s*', re.IGNORECASE)
+MARKDOWN_RE = re.compile(r'\*\*|__|^#+\s*')
+
+# Letter of the correct option as the model writes it: 'B', 'B)', '(B)', 'B. text'
+ANSWER_LETTER_RE = re.compile(r'^\(?([A-Fa-f])(?:[).:]|\s|$)')
+OPTION_LABELS = 'ABCDEF'
+MIN_OPTIONS = 2
+
+# What we ask the model for in JSON mode; validate_question() enforces it
+QUIZ_JSON_SCHEMA = {
+    'type': 'object',
+    'required': ['questions'],
+    'properties': {
+        'questions': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['question', 'options', 'correct_answer', 'explanation'],
+                'properties': {
+                    'question': {'type': 'string'},
+                    'options': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 4, 'maxItems': 4},
+                    'correct_answer': {'type': 'string', 'enum': ['A', 'B', 'C', 'D']},
+                    'explanation': {'type': 'string'}
+                }
+            }
+        }
+    }
+}
+
+_stats = {'responses': 0, 'json': 0, 'stream': 0, 'text_fallback': 0, 'parse_failures': 0,
+          'invalid_questions': 0, 'repair_calls': 0, 'repaired_questions': 0,
+          'regenerations_avoided': 0}
+_stats_lock = threading.Lock()
+
+class QuizParser:
+    """Incremental parser for the numbered question / A)-D) / Correct / Explanation format
+
+    Text can be fed in arbitrary chunks (e.g. tokens from a streaming
+    completion). feed() returns questions as soon as their options, correct
+    answer and explanation lines are complete; finish() flushes the rest.
+    The final list in .questions matches what a one-shot parse produces.
+    """
+
+    def __init__(self):
+        self.questions = []
+        self._buffer = ''
+        self._current = None
+        self._current_listed = False
+        self._emitted = 0
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return newly completed questions"""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            self._parse_line(line)
+        return self._take_ready()
+
+    def finish(self):
+        """Parse any trailing text and return all questions not yet returned"""
+        if self._buffer:
+            self._parse_line(self._buffer)
+            self._buffer = ''
+        if self._current and not self._current_listed:
+            self.questions.append(self._current)
+        self._current = None
+        ready = self.questions[self._emitted:]
+        self._emitted = len(self.questions)
+        return ready
+
+    def _parse_line(self, line):
+        line = MARKDOWN_RE.sub('', line).strip()
+        if not line:
+            return
+
+        current = self._current
+        # Check for question number at start of line (1., 2., etc.)
+        question = QUESTION_RE.match(line)
+        if question:
+            if current and not self._current_listed:
+                self.questions.append(current)
+            self._current_listed = False
+            self._current = {
+                'question': line[question.end():].strip(),
+                'options': [],
+                'correct_answer': None,
+                'explanation': None
+            }
+            return
+        if not current:
+            return
+
+        # Check for options (A), B), etc.), normalized to 'A) text'
+        option = OPTION_RE.match(line)
+        correct = CORRECT_RE.match(line)
+        explanation = EXPLANATION_RE.match(line)
+        if option:
+            current['options'].append(f"{option.group(1)}) {line[option.end():].strip()}")
+        # Check for correct answer
+        elif correct:
+            current['correct_answer'] = line[correct.end():].strip()
+        # Check for explanation
+        elif explanation:
+            current['explanation'] = line[explanation.end():].strip()
+
+    def _take_ready(self):
+        current = self._current
+        if (current and not self._current_listed and current['options']
+                and current['correct_answer'] and current['explanation']):
+            # The explanation line has ended, so the question can be shown now.
+            # Later lines still update it, exactly as a one-shot parse would.
+            self.questions.append(current)
+            self._current_listed = True
+        ready = self.questions[self._emitted:]
+        self._emitted = len(self.questions)
+        return ready
+
+def parse_quiz_text(quiz_text):
+    """Parse a complete quiz text into a list of question dicts"""
+    parser = QuizParser()
+    parser.feed(quiz_text)
+    parser.finish()
+    return parser.questions
+
+def _label_option(index, text):
+    text = str(text).strip()
+    labelled = OPTION_RE.match(text)
+    if labelled:
+        text = text[labelled.end():].strip()
+    return f"{OPTION_LABELS[index]}) {text}"
+
+def validate_question(question):
+    """Check a question against QUIZ_JSON_SCHEMA and normalize it, or return None
+
+    Options are labelled 'A)'..., and the correct answer, whether given as a
+    letter or as the option text, becomes the full option string so the quiz
+    pages can compare it with the selected option.
+    """
+    if not isinstance(question, dict):
+        return None
+    stem = question.get('question')
+    options = question.get('options')
+    if not isinstance(stem, str) or not stem.strip():
+        return None
+    if not isinstance(options, list) or not MIN_OPTIONS <= len(options) <= len(OPTION_LABELS):
+        return None
+    options = [_label_option(index, option) for index, option in enumerate(options)]
+    if any(not option[3:].strip() for option in options):
+        return None
+
+    answer = str(question.get('correct_answer') or '').strip()
+    # The option text itself, with or without its label, otherwise its letter
+    texts = [option[3:].strip().lower() for option in options]
+    labelled = OPTION_RE.match(answer)
+    unlabelled = (answer[labelled.end():] if labelled else answer).strip().lower()
+    letter = ANSWER_LETTER_RE.match(answer)
+    if unlabelled in texts:
+        index = texts.index(unlabelled)
+    elif letter:
+        index = OPTION_LABELS.index(letter.group(1).upper())
+    else:
+        index = -1
+    if not 0 <= index < len(options):
+        return None
+
+    explanation = question.get('explanation')
+    return {
+        'question': stem.strip(),
+        'options': options,
+        'correct_answer': options[index],
+        'explanation': explanation.strip() if isinstance(explanation, str) else None
+    }
+
+def validate_questions(questions):
+    """Return the valid, normalized questions and the number rejected"""
+    valid = []
+    for question in questions:
+        normalized = validate_question(question)
+        if normalized:
+            valid.append(normalized)
+    return valid, len(questions) - len(valid)
+
+def parse_quiz_json(text):
+    """Return the question list from a JSON quiz response, or None if it is not one"""
+    text = text.strip()
+    if text.startswith('```'):
+        # Fenced code block despite JSON mode
+        text = text.strip('`')
+        text = text[text.find('\n') + 1:] if text.lower().startswith('json') else text
+    try:
+        data = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if isinstance(data, dict):
+        data = data.get('questions')
+    return data if isinstance(data, list) else None
+
+def parse_quiz_output(text, num_questions=None):
+    """Parse a model response, preferring JSON and falling back to the text format
+
+    Returns (questions, report) where questions are validated and
+    normalized, and report has the format used, invalid count and how many
+    of num_questions are missing.
+    """
+    raw = parse_quiz_json(text)
+    output_format = 'json'
+    if raw is None:
+        raw = parse_quiz_text(text)
+        output_format = 'text'
+    questions, invalid = validate_questions(raw)
+    if num_questions is not None:
+        questions = questions[:num_questions]
+        missing = max(0, num_questions - len(questions))
+    else:
+        missing = 0
+
+    record_response(output_format, invalid, missing)
+    return questions, {'format': output_format, 'invalid': invalid, 'missing': missing}
+
+def record_response(output_format, invalid, missing):
+    """Count one parsed model response
+
+    output_format is 'json', 'text' (a JSON request answered in text) or
+    'stream' (streamed text, which never uses JSON mode). Falling back to
+    text, invalid questions and missing questions all count as failures.
+    """
+    with _stats_lock:
+        _stats['responses'] += 1
+        _stats['text_fallback' if output_format == 'text' else output_format] += 1
+        _stats['invalid_questions'] += invalid
+        if output_format == 'text' or invalid or missing:
+            _stats['parse_failures'] += 1
+
+def record_repair(requested, repaired):
+    """Count a follow-up call that asked for requested missing questions"""
+    with _stats_lock:
+        _stats['repair_calls'] += 1
+        _stats['repaired_questions'] += repaired
+        if repaired >= requested:
+            # Without the repair the whole quiz would have been regenerated
+            _stats['regenerations_avoided'] += 1
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['parse_failure_rate'] = round(stats['parse_failures'] / stats['responses'], 4) if stats['responses'] else 0.0
+    return stats
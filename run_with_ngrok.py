@@ -3,12 +3,16 @@ import sys
 import subprocess
 import time
 import json
+import logging
 import requests
 from dotenv import load_dotenv
 from flask import Flask
+from log_config import setup_logging
 
 # Load environment variables
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Set the path to ngrok
 def get_ngrok_path():
@@ -46,7 +50,7 @@ def configure_ngrok():
                       capture_output=True)
         return True
     except Exception as e:
-        print(f"Error configuring ngrok: {str(e)}")
+        logger.error("Error configuring ngrok: %s", e)
         return False
 
 def get_ngrok_url():
@@ -61,37 +65,37 @@ def get_ngrok_url():
             if 'localhost:5004' in tunnel['config']['addr']:
                 return tunnel['public_url']
                 
-        print("No tunnel found for port 5004")
+        logger.warning("No tunnel found for port 5004")
         return None
         
     except Exception as e:
-        print(f"Error getting ngrok URL: {str(e)}")
+        logger.error("Error getting ngrok URL: %s", e)
         return None
 
 def update_base_url(url):
     """Update the base URL in the Flask app configuration"""
     try:
-        print(f"Updated base URL to: {url}")
+        logger.info("Updated base URL to: %s", url)
         from app import app
         app.config['BASE_URL'] = url
         os.environ['BASE_URL'] = url  # Also set in environment for access in templates
     except Exception as e:
-        print(f"Error updating base URL: {str(e)}")
+        logger.error("Error updating base URL: %s", e)
 
 def main():
     """Main function to run the Flask app with ngrok"""
     try:
         # Configure ngrok
-        print("Configuring ngrok with auth token...")
+        logger.info("Configuring ngrok with auth token...")
         NGROK_PATH = os.path.expanduser('~/Downloads/ngrok')
         if not os.path.exists(NGROK_PATH):
-            print(f"ngrok not found at {NGROK_PATH}")
+            logger.error("ngrok not found at %s", NGROK_PATH)
             sys.exit(1)
             
         # Get ngrok auth token from environment
         NGROK_AUTH_TOKEN = os.getenv('NGROK_AUTH_TOKEN')
         if not NGROK_AUTH_TOKEN:
-            print("NGROK_AUTH_TOKEN not found in environment variables")
+            logger.error("NGROK_AUTH_TOKEN not found in environment variables")
             sys.exit(1)
             
         # Kill any existing ngrok processes
@@ -103,7 +107,7 @@ def main():
             pass  # Ignore if no process exists
             
         # Start ngrok in a separate process with simpler configuration
-        print("Starting ngrok tunnel...")
+        logger.info("Starting ngrok tunnel...")
         ngrok_process = subprocess.Popen(
             [NGROK_PATH, 'http', '5004', '--log=stdout'],
             stdout=subprocess.PIPE,
@@ -125,28 +129,30 @@ def main():
                         public_url = tunnels[0]['public_url']
                         break
             except Exception as e:
-                print(f"Error getting ngrok URL (retries left: {retries}): {str(e)}")
+                logger.warning("Error getting ngrok URL (retries left: %d): %s", retries, e)
             time.sleep(2)
             retries -= 1
         
         if not public_url:
-            print("Failed to get ngrok URL")
+            logger.error("Failed to get ngrok URL")
             ngrok_process.terminate()
             sys.exit(1)
 
         # Update the base URL in the Flask app
         update_base_url(public_url)
         
-        print("\nStarted Flask server...")
-        print("Started ngrok tunnel...")
-        print(f"\nYour quiz generator is now accessible at: {public_url}")
+        logger.info("Started ngrok tunnel")
+        logger.info("Your quiz generator is now accessible at: %s", public_url)
         
-        # Start Flask app
-        from app import app
-        app.run(debug=True, port=5004)
+        # Start Flask app; the tunnel is public, so the debugger stays off unless FLASK_DEBUG is set
+        from app import app, FLASK_DEBUG
+        import storage
+        storage.init_db()
+        storage.fail_interrupted_jobs()
+        app.run(debug=FLASK_DEBUG, port=5004)
         
     except Exception as e:
-        print(f"An error occurred: {str(e)}")
+        logger.exception("An error occurred: %s", e)
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -0,0 +1,441 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import metrics
+from quiz_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'quizzes.db'
+
+# Pragmas applied to every connection. WAL lets readers proceed while a
+# writer commits; synchronous=NORMAL is durable across application crashes
+# in WAL mode and avoids an fsync per commit.
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -20000',       # ~20 MB page cache
+    'PRAGMA mmap_size = 268435456',     # 256 MB memory-mapped I/O
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA foreign_keys = ON',
+)
+
+BUSY_TIMEOUT = 20
+
+# Decoded quizzes for get_quiz. Stored quizzes never change, so an entry is
+# only dropped to bound memory.
+DECODED_QUIZ_CACHE_SIZE = 1024
+DECODED_QUIZ_CACHE_TTL = 24 * 60 * 60
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_path = None
+_db_path = None
+
+_stats = {'connections_opened': 0, 'transactions': 0, 'lock_waits': 0, 'lock_wait_seconds': 0.0}
+_stats_lock = threading.Lock()
+_decoded_quizzes = LRUCache(max_entries=DECODED_QUIZ_CACHE_SIZE, ttl=DECODED_QUIZ_CACHE_TTL)
+
+def get_db_path():
+    return _db_path or os.getenv('QUIZ_DB_PATH', DEFAULT_DB_PATH)
+
+def configure(db_path):
+    """Point the storage layer at a different database file"""
+    global _db_path, _initialized_path
+    _db_path = db_path
+    _initialized_path = None
+    _local.__dict__.clear()
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    with _stats_lock:
+        _stats['connections_opened'] += 1
+    return conn
+
+def get_connection():
+    """Return this thread's connection, opening it on first use
+
+    Connections are cached per thread (and per process, so forked server
+    workers never share a handle) and stay open between requests.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.path == _initialized_path and _local.pid == os.getpid():
+        return conn
+
+    path = get_db_path()
+    if _initialized_path != path:
+        init_db()
+    conn = _connect(path)
+    _local.conn, _local.pid, _local.path = conn, os.getpid(), path
+    return conn
+
+@contextmanager
+def transaction():
+    """Run a write transaction, taking the write lock up front
+
+    BEGIN IMMEDIATE avoids the deadlock-prone upgrade from a read to a write
+    lock; time spent waiting for it is recorded as a lock wait.
+    """
+    conn = get_connection()
+    started = time.perf_counter()
+    conn.execute('BEGIN IMMEDIATE')
+    waited = time.perf_counter() - started
+    metrics.observe('db_lock_wait_seconds', waited)
+    with _stats_lock:
+        _stats['transactions'] += 1
+        if waited > 0.001:
+            _stats['lock_waits'] += 1
+            _stats['lock_wait_seconds'] += waited
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have run, so each one executes exactly once per database.
+def _migrate_quizzes(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quizzes (
+            id TEXT PRIMARY KEY,
+            youtube_url TEXT,
+            questions TEXT,
+            language TEXT,
+            created_at TIMESTAMP
+        )
+    ''')
+    # Databases created before quizzes carried a cache key
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(quizzes)')]
+    if 'cache_key' not in columns:
+        conn.execute('ALTER TABLE quizzes ADD COLUMN cache_key TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quizzes_cache_key ON quizzes (cache_key, created_at)')
+
+def _migrate_content_store(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS extracted_content (
+            cache_key TEXT PRIMARY KEY,
+            source_url TEXT,
+            content BLOB,
+            original_size INTEGER,
+            compressed_size INTEGER,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL,
+            last_accessed REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_extracted_content_accessed ON extracted_content (last_accessed)')
+
+def _migrate_jobs(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT,
+            progress TEXT,
+            params TEXT,
+            quiz_id TEXT,
+            error TEXT,
+            timings TEXT,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL
+        )
+    ''')
+
+def _migrate_questions(conn):
+    # One row per question instead of a JSON blob per quiz; the blobs of
+    # existing quizzes are moved over and cleared
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS questions (
+            quiz_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            stem TEXT,
+            options TEXT,
+            correct TEXT,
+            explanation TEXT,
+            source_start REAL,
+            PRIMARY KEY (quiz_id, position)
+        ) WITHOUT ROWID
+    ''')
+    rows = conn.execute('SELECT id, questions FROM quizzes WHERE questions IS NOT NULL').fetchall()
+    for quiz_id, questions_json in rows:
+        try:
+            questions = json.loads(questions_json)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if isinstance(questions, list):
+            _insert_questions(conn, quiz_id, questions)
+            conn.execute('UPDATE quizzes SET questions = NULL WHERE id = ?', (quiz_id,))
+
+def _migrate_llm_cache(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            response BLOB,
+            usage TEXT,
+            created_at REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)')
+
+def _migrate_transcript_listings(conn):
+    # Caption tracks per video, or why it has none (status other than 'ok')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transcript_listings (
+            video_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            tracks TEXT,
+            translation_languages TEXT,
+            error TEXT,
+            fetched_at REAL,
+            expires_at REAL
+        )
+    ''')
+
+def _migrate_transcript_index(conn):
+    # Timestamped transcripts per video and language, and the moment each
+    # question was drawn from
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transcript_index (
+            video_id TEXT NOT NULL,
+            language TEXT NOT NULL,
+            data BLOB,
+            sentences INTEGER,
+            duration REAL,
+            size INTEGER,
+            created_at REAL,
+            PRIMARY KEY (video_id, language)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transcript_index_created ON transcript_index (created_at)')
+    # Databases whose questions table predates source times
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(questions)')]
+    if 'source_start' not in columns:
+        conn.execute('ALTER TABLE questions ADD COLUMN source_start REAL')
+
+def _migrate_question_bank(conn):
+    # Questions pooled per source and language, deduplicated by normalized
+    # stem, and which of them each quiz taker has already been given
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_bank (
+            id INTEGER PRIMARY KEY,
+            source_key TEXT NOT NULL,
+            language TEXT NOT NULL,
+            stem_key TEXT NOT NULL,
+            stem TEXT,
+            options TEXT,
+            correct TEXT,
+            explanation TEXT,
+            source_start REAL,
+            created_at REAL,
+            UNIQUE (source_key, language, stem_key)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_bank_created ON question_bank (created_at)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_bank_seen (
+            taker TEXT NOT NULL,
+            question_id INTEGER NOT NULL REFERENCES question_bank (id) ON DELETE CASCADE,
+            seen_at REAL,
+            PRIMARY KEY (taker, question_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_bank_seen_question ON question_bank_seen (question_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_bank_seen_at ON question_bank_seen (seen_at)')
+
+def _migrate_pinned_quizzes(conn):
+    # Quizzes stored by pregenerate.py are served past QUIZ_CACHE_TTL
+    conn.execute('ALTER TABLE quizzes ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0')
+
+MIGRATIONS = [
+    _migrate_quizzes,
+    _migrate_content_store,
+    _migrate_jobs,
+    _migrate_questions,
+    _migrate_llm_cache,
+    _migrate_transcript_listings,
+    _migrate_transcript_index,
+    _migrate_question_bank,
+    _migrate_pinned_quizzes,
+]
+
+def init_db():
+    """Enable WAL and bring the schema up to date; runs once per process"""
+    global _initialized_path
+    path = get_db_path()
+    with _init_lock:
+        if _initialized_path == path:
+            return
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for index, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                logger.info("Applying database migration %d: %s", index, migration.__name__)
+                conn.execute('BEGIN IMMEDIATE')
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {index}')
+                conn.commit()
+        finally:
+            conn.close()
+        _initialized_path = path
+
+def fail_interrupted_jobs():
+    """Mark jobs a previous server left queued or running as failed
+
+    Jobs cannot survive a restart. Only the server calls this at startup;
+    other processes sharing the database (pregenerate.py) must not, or
+    they would fail the running server's jobs. Uses its own connection,
+    like init_db, so none is left open across the gunicorn fork.
+    """
+    init_db()
+    conn = sqlite3.connect(get_db_path(), timeout=BUSY_TIMEOUT)
+    try:
+        failed = conn.execute('''
+            UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', finished_at = ?
+            WHERE status IN ('queued', 'running')
+        ''', (time.time(),)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    if failed:
+        logger.info("Marked %d interrupted job(s) as failed", failed)
+    return failed
+
+def get_schema_version():
+    return get_connection().execute('PRAGMA user_version').fetchone()[0]
+
+# Quiz data access
+# Options are stored in a single column separated by the ASCII unit separator
+OPTION_SEPARATOR = '\x1f'
+
+def _insert_questions(conn, quiz_id, questions):
+    conn.executemany('''
+        INSERT INTO questions (quiz_id, position, stem, options, correct, explanation, source_start)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(quiz_id, position, q.get('question'), OPTION_SEPARATOR.join(q.get('options') or []),
+           q.get('correct_answer'), q.get('explanation'), q.get('source_start'))
+          for position, q in enumerate(questions)])
+
+def _row_to_question(stem, options, correct, explanation, source_start=None):
+    question = {
+        'question': stem,
+        'options': options.split(OPTION_SEPARATOR) if options else [],
+        'correct_answer': correct,
+        'explanation': explanation
+    }
+    # Seconds into the source video, for YouTube quizzes
+    if source_start is not None:
+        question['source_start'] = source_start
+    return question
+
+def insert_quiz(quiz_id, youtube_url, questions, language, cache_key=None, pinned=False):
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO quizzes (id, youtube_url, questions, language, created_at, cache_key, pinned)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (quiz_id, youtube_url, None, language, datetime.now(), cache_key, int(pinned)))
+        _insert_questions(conn, quiz_id, questions)
+
+def get_questions(quiz_id):
+    """Return the questions of a quiz in order"""
+    conn = get_connection()
+    rows = conn.execute('''
+        SELECT stem, options, correct, explanation, source_start FROM questions
+        WHERE quiz_id = ? ORDER BY position
+    ''', (quiz_id,)).fetchall()
+    if rows:
+        return [_row_to_question(*row) for row in rows]
+
+    # Quizzes written as a JSON blob by a process that predates migration 4
+    row = conn.execute('SELECT questions FROM quizzes WHERE id = ?', (quiz_id,)).fetchone()
+    if row and row['questions']:
+        return json.loads(row['questions'])
+    return []
+
+def get_question(quiz_id, position):
+    """Return a single question without loading the rest of the quiz, or None"""
+    row = get_connection().execute('''
+        SELECT stem, options, correct, explanation, source_start FROM questions
+        WHERE quiz_id = ? AND position = ?
+    ''', (quiz_id, position)).fetchone()
+    return _row_to_question(*row) if row else None
+
+def get_quiz(quiz_id):
+    """Return the stored quiz as a dict, or None
+
+    Each question carries its position as index0, which the quiz page uses.
+    Decoded quizzes are cached and shared between callers, who must not
+    modify them.
+    """
+    key = (get_db_path(), quiz_id)
+    quiz = _decoded_quizzes.get(key)
+    if quiz is None:
+        quiz = _load_quiz(quiz_id)
+        if quiz is not None:
+            _decoded_quizzes.set(key, quiz)
+    return quiz
+
+def _load_quiz(quiz_id):
+    rows = get_connection().execute('''
+        SELECT q.youtube_url, q.language, q.created_at,
+               s.position, s.stem, s.options, s.correct, s.explanation, s.source_start
+        FROM quizzes q LEFT JOIN questions s ON s.quiz_id = q.id
+        WHERE q.id = ? ORDER BY s.position
+    ''', (quiz_id,)).fetchall()
+    if not rows:
+        return None
+
+    youtube_url, language, created_at = rows[0][0], rows[0][1], rows[0][2]
+    if rows[0][3] is None:
+        # No question rows: a legacy JSON blob (or an empty quiz)
+        questions = get_questions(quiz_id)
+        for position, question in enumerate(questions):
+            question['index0'] = position
+    else:
+        questions = []
+        for row in rows:
+            question = _row_to_question(row[4], row[5], row[6], row[7], row[8])
+            question['index0'] = row[3]
+            questions.append(question)
+    return {
+        'id': quiz_id,
+        'youtube_url': youtube_url,
+        'questions': questions,
+        'language': language,
+        'created_at': created_at
+    }
+
+def find_quiz_by_cache_key(cache_key, since):
+    """Return (quiz_id, questions) for the newest quiz with cache_key created after since or pinned"""
+    row = get_connection().execute('''
+        SELECT id FROM quizzes
+        WHERE cache_key = ? AND (created_at >= ? OR pinned)
+        ORDER BY created_at DESC LIMIT 1
+    ''', (cache_key, since)).fetchone()
+    if not row:
+        return None
+    return row['id'], get_questions(row['id'])
+
+def pin_quiz(quiz_id):
+    """Keep serving a quiz from find_quiz_by_cache_key regardless of its age"""
+    with transaction() as conn:
+        conn.execute('UPDATE quizzes SET pinned = 1 WHERE id = ?', (quiz_id,))
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['lock_wait_seconds'] = round(stats['lock_wait_seconds'], 4)
+    stats['db_path'] = get_db_path()
+    stats['decoded_quiz_cache'] = _decoded_quizzes.stats()
+    return stats
@@ -0,0 +1,225 @@
+import array
+import bisect
+import math
+import re
+import struct
+import threading
+import time
+import zlib
+
+import storage
+from transcript_text import build_sentences
+
+# Stored form: sentence count, then starts and ends as float64 arrays, then
+# the sentence texts joined by NUL (never present in cleaned captions)
+HEADER = struct.Struct('<I')
+TEXT_SEPARATOR = '\x00'
+COMPRESSION_LEVEL = 6
+
+WORD = re.compile(r'\w+')
+# Words that say nothing about where in a video a question comes from
+STOPWORDS = frozenset('''
+    a an and are as at be been but by can did do does for from had has have how if in into is it its
+    of on or so than that the their then there these this those to was were what when where which
+    who why will with would you your not also about after before because between during each more
+    most other same some such only over under very just like while according following correct
+    answer true false statement option video speaker mentioned
+'''.split())
+
+TIME_FORMAT = re.compile(r'^(?:(\d+):)?(\d{1,2}):(\d{1,2}(?:\.\d+)?)$')
+
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'expired': 0, 'slices': 0, 'located': 0, 'unlocated': 0}
+_stats_lock = threading.Lock()
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def parse_time(value):
+    """Parse seconds given as a number, '90', '1:30' or '1:02:30'; None if invalid"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    elif isinstance(value, str):
+        value = value.strip()
+        match = TIME_FORMAT.match(value)
+        if match:
+            hours, minutes, secs = match.groups()
+            seconds = int(hours or 0) * 3600 + int(minutes) * 60 + float(secs)
+        else:
+            try:
+                seconds = float(value)
+            except ValueError:
+                return None
+    else:
+        return None
+    return seconds if math.isfinite(seconds) and seconds >= 0 else None
+
+def format_time(seconds):
+    """Format seconds as m:ss or h:mm:ss"""
+    seconds = int(seconds or 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+def _words(text):
+    return {word for word in WORD.findall(text.lower()) if len(word) > 2 and word not in STOPWORDS}
+
+class TranscriptIndex:
+    """A cleaned transcript as sentences with start and end times
+
+    starts and ends are float64 arrays of seconds in caption order, so a
+    time range maps to a run of sentences with two binary searches.
+    """
+
+    def __init__(self, starts, ends, texts):
+        self.starts = starts
+        self.ends = ends
+        self.texts = texts
+        self._postings = None
+
+    @classmethod
+    def from_segments(cls, segments):
+        sentences = build_sentences(segments)
+        return cls(array.array('d', (s['start'] for s in sentences)),
+                   array.array('d', (s['end'] for s in sentences)),
+                   [s['text'].replace(TEXT_SEPARATOR, '') for s in sentences])
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def duration(self):
+        return max(self.ends) if self.ends else 0.0
+
+    def span(self, start=None, end=None):
+        """Return (first, stop) sentence positions overlapping [start, end)
+
+        A sentence still being spoken at start is included; end=None runs
+        to the end of the video.
+        """
+        first = 0
+        if start:
+            first = max(bisect.bisect_right(self.starts, start) - 1, 0)
+            if first < len(self.ends) and self.ends[first] <= start:
+                first += 1
+        stop = len(self.texts) if end is None else bisect.bisect_left(self.starts, end)
+        return first, max(first, stop)
+
+    def text(self, start=None, end=None):
+        """Return the text of the sentences between start and end seconds"""
+        first, stop = self.span(start, end)
+        if start is not None or end is not None:
+            _count('slices')
+        return ' '.join(self.texts[first:stop])
+
+    def _get_postings(self):
+        # Built on first use; rebuilding concurrently gives the same result
+        if self._postings is None:
+            postings = {}
+            for position, text in enumerate(self.texts):
+                for word in _words(text):
+                    postings.setdefault(word, []).append(position)
+            self._postings = postings
+        return self._postings
+
+    def locate(self, text, start=None, end=None):
+        """Return the start time of the sentence that best matches text, or None
+
+        Sentences between start and end are scored by the words they share
+        with text, rarer words counting more.
+        """
+        first, stop = self.span(start, end)
+        postings = self._get_postings()
+        total = len(self.texts)
+        scores = {}
+        for word in _words(text):
+            positions = postings.get(word)
+            if not positions:
+                continue
+            weight = math.log(1 + total / len(positions))
+            for position in positions[bisect.bisect_left(positions, first):bisect.bisect_left(positions, stop)]:
+                scores[position] = scores.get(position, 0.0) + weight
+        if not scores:
+            _count('unlocated')
+            return None
+        _count('located')
+        best = max(scores, key=lambda position: (scores[position], -position))
+        return round(self.starts[best], 1)
+
+    def to_bytes(self):
+        body = (HEADER.pack(len(self.texts)) + self.starts.tobytes() + self.ends.tobytes()
+                + TEXT_SEPARATOR.join(self.texts).encode('utf-8'))
+        return zlib.compress(body, COMPRESSION_LEVEL)
+
+    @classmethod
+    def from_bytes(cls, data):
+        body = zlib.decompress(data)
+        count, = HEADER.unpack_from(body)
+        offset = HEADER.size
+        width = count * 8
+        starts = array.array('d')
+        starts.frombytes(body[offset:offset + width])
+        ends = array.array('d')
+        ends.frombytes(body[offset + width:offset + 2 * width])
+        text = body[offset + 2 * width:].decode('utf-8')
+        texts = text.split(TEXT_SEPARATOR) if count else []
+        if len(texts) != count:
+            raise ValueError('Corrupt transcript index')
+        return cls(starts, ends, texts)
+
+def question_text(question):
+    """The parts of a question that point at where its answer is in the transcript"""
+    return ' '.join(filter(None, [question.get('question'), question.get('correct_answer'),
+                                  question.get('explanation')]))
+
+def add_source_times(index, questions, start=None, end=None):
+    """Set each question's source_start to the moment it was most likely drawn from"""
+    for question in questions:
+        question['source_start'] = index.locate(question_text(question), start, end)
+    return questions
+
+def get_index(video_id, language, max_age=None):
+    """Return the stored index for a video and language, or None if missing or older than max_age"""
+    row = storage.get_connection().execute('''
+        SELECT data, created_at FROM transcript_index WHERE video_id = ? AND language = ?
+    ''', (video_id, language)).fetchone()
+    if not row:
+        _count('misses')
+        return None
+    data, created_at = row
+    if max_age is not None and time.time() - (created_at or 0) >= max_age:
+        _count('expired')
+        return None
+    try:
+        index = TranscriptIndex.from_bytes(data)
+    except (zlib.error, ValueError, struct.error, UnicodeDecodeError):
+        with storage.transaction() as conn:
+            conn.execute('DELETE FROM transcript_index WHERE video_id = ? AND language = ?', (video_id, language))
+        _count('misses')
+        return None
+    _count('hits')
+    return index
+
+def put_index(video_id, language, index, max_age=None):
+    """Store an index, dropping entries older than max_age"""
+    data = index.to_bytes()
+    now = time.time()
+    with storage.transaction() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO transcript_index
+                (video_id, language, data, sentences, duration, size, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (video_id, language, data, len(index), index.duration, len(data), now))
+        if max_age is not None:
+            conn.execute('DELETE FROM transcript_index WHERE created_at < ?', (now - max_age,))
+    _count('stores')
+
+def get_stats(conn=None):
+    with _stats_lock:
+        stats = dict(_stats)
+    if conn is not None:
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcript_index').fetchone()
+        stats.update({'entries': entries, 'bytes': size})
+    return stats
@@ -0,0 +1,251 @@
+import json
+import logging
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from youtube_transcript_api._errors import (InvalidVideoId, NoTranscriptAvailable, TranscriptsDisabled,
+                                            VideoUnavailable)
+
+import metrics
+import storage
+from http_clients import fetch_youtube_transcript, list_youtube_transcripts
+
+logger = logging.getLogger(__name__)
+
+# Listing failures that will not go away on a retry, cached as negative results
+NEGATIVE_STATUSES = (
+    (TranscriptsDisabled, 'disabled'),
+    (NoTranscriptAvailable, 'no_captions'),
+    (VideoUnavailable, 'unavailable'),
+    (InvalidVideoId, 'unavailable'),
+)
+
+# Regional variants tried in order; other languages match their own code
+LANGUAGE_PREFERENCES = {'en': ['en-US', 'en-GB', 'en']}
+
+# Caption track URLs are signed with an 'expire' timestamp; a cached listing
+# is dropped this many seconds before its first URL expires
+URL_EXPIRY_MARGIN = 300
+
+class TranscriptUnavailable(Exception):
+    """No usable transcript for a video and language
+
+    reason is 'disabled', 'no_captions' or 'unavailable' (cached negative
+    results), 'no_track' (none in the requested language) or 'error'
+    (a failure worth retrying later).
+    """
+
+    def __init__(self, video_id, reason, detail=None):
+        self.video_id = video_id
+        self.reason = reason
+        self.detail = detail
+        message = f"No transcript for {video_id}: {reason}"
+        super().__init__(f"{message} ({detail})" if detail else message)
+
+def list_tracks(video_id):
+    """Fetch a video's caption listing as (tracks, translation language codes)"""
+    transcript_list = list_youtube_transcripts(video_id)
+    tracks = [{
+        'language_code': transcript.language_code,
+        'language': transcript.language,
+        'is_generated': transcript.is_generated,
+        'is_translatable': transcript.is_translatable,
+        # youtube-transcript-api 0.6 has no public accessor for the track URL
+        'url': transcript._url
+    } for transcript in transcript_list]
+    languages = [language['language_code'] for language in transcript_list._translation_languages]
+    return tracks, languages
+
+def pick_track(tracks, translation_languages, language):
+    """Choose the best track for language from a listing in one pass
+
+    Manual tracks beat generated ones at each level: the preferred codes
+    (en-US, en-GB, en for English, in that order), then other regional
+    variants of the language, then any translatable track translated to
+    language. Returns (track, translate_to or None), or None.
+    """
+    codes = LANGUAGE_PREFERENCES.get(language, [language])
+    base = language.split('-')[0]
+    can_translate = language in translation_languages
+    best = None
+    best_rank = None
+    for track in tracks:
+        code = track['language_code']
+        if code in codes:
+            rank = (0, track['is_generated'], codes.index(code))
+        elif code.split('-')[0] == base:
+            rank = (1, track['is_generated'], 0)
+        elif can_translate and track['is_translatable']:
+            rank = (2, track['is_generated'], 0)
+        else:
+            continue
+        if best_rank is None or rank < best_rank:
+            best, best_rank = track, rank
+    if best is None:
+        return None
+    return best, (language if best_rank[0] == 2 else None)
+
+def _describe(error):
+    # youtube-transcript-api messages are multi-paragraph help texts; .cause is the short reason
+    text = str(getattr(error, 'cause', '') or error).strip()
+    return text.splitlines()[0] if text else type(error).__name__
+
+def _url_expiry(tracks):
+    expiries = []
+    for track in tracks:
+        expire = parse_qs(urlparse(track['url']).query).get('expire')
+        if expire and expire[0].isdigit():
+            expiries.append(int(expire[0]))
+    return min(expiries) if expiries else None
+
+class TranscriptResolver:
+    """Finds and downloads a video's transcript using cached caption listings
+
+    Listings are stored in SQLite for listing_ttl seconds (less if the
+    track URLs expire sooner). Videos without usable captions are stored
+    as negative results for negative_ttl seconds and rejected without any
+    network call. list_tracks and fetch_track can be replaced for tests
+    and benchmarks.
+    """
+
+    def __init__(self, listing_ttl, negative_ttl, list_tracks=list_tracks, fetch_track=fetch_youtube_transcript):
+        self.listing_ttl = listing_ttl
+        self.negative_ttl = negative_ttl
+        self.list_tracks = list_tracks
+        self.fetch_track = fetch_track
+        self._lock = threading.Lock()
+        self._counters = {'resolutions': 0, 'listing_hits': 0, 'listing_fetches': 0, 'negative_hits': 0,
+                          'negatives_stored': 0, 'track_fetches': 0, 'stale_retries': 0,
+                          'manual': 0, 'generated': 0, 'translated': 0, 'failures': 0}
+        self._failure_seconds = 0.0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _load(self, video_id):
+        row = storage.get_connection().execute('''
+            SELECT status, tracks, translation_languages, error FROM transcript_listings
+            WHERE video_id = ? AND expires_at > ?
+        ''', (video_id, time.time())).fetchone()
+        if not row:
+            return None
+        return {
+            'status': row['status'],
+            'tracks': json.loads(row['tracks'] or '[]'),
+            'translation_languages': json.loads(row['translation_languages'] or '[]'),
+            'error': row['error']
+        }
+
+    def _store(self, video_id, listing, ttl):
+        now = time.time()
+        with storage.transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO transcript_listings
+                    (video_id, status, tracks, translation_languages, error, fetched_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (video_id, listing['status'], json.dumps(listing['tracks']),
+                  json.dumps(listing['translation_languages']), listing['error'], now, now + ttl))
+
+    def invalidate(self, video_id):
+        """Forget the cached listing (or negative result) for a video"""
+        with storage.transaction() as conn:
+            conn.execute('DELETE FROM transcript_listings WHERE video_id = ?', (video_id,))
+
+    def _fetch_listing(self, video_id):
+        self._count('listing_fetches')
+        try:
+            with metrics.span('transcript_list'):
+                tracks, languages = self.list_tracks(video_id)
+        except Exception as e:
+            for error_type, status in NEGATIVE_STATUSES:
+                if isinstance(e, error_type):
+                    detail = _describe(e)
+                    self._store(video_id, {'status': status, 'tracks': [], 'translation_languages': [],
+                                           'error': detail}, self.negative_ttl)
+                    self._count('negatives_stored')
+                    raise TranscriptUnavailable(video_id, status, detail)
+            # Rate limits, network errors and the like: worth retrying, not caching
+            raise TranscriptUnavailable(video_id, 'error', _describe(e))
+
+        listing = {'status': 'ok', 'tracks': tracks, 'translation_languages': languages, 'error': None}
+        ttl = self.listing_ttl
+        expiry = _url_expiry(tracks)
+        if expiry is not None:
+            ttl = min(ttl, expiry - URL_EXPIRY_MARGIN - time.time())
+        if ttl > 0:
+            self._store(video_id, listing, ttl)
+        return listing
+
+    def _get_listing(self, video_id):
+        """Return (listing, cached)"""
+        listing = self._load(video_id)
+        if listing is None:
+            return self._fetch_listing(video_id), False
+        if listing['status'] != 'ok':
+            self._count('negative_hits')
+            raise TranscriptUnavailable(video_id, listing['status'], listing['error'])
+        self._count('listing_hits')
+        return listing, True
+
+    def _download(self, video_id, listing, language):
+        choice = pick_track(listing['tracks'], listing['translation_languages'], language)
+        if choice is None:
+            codes = ', '.join(track['language_code'] for track in listing['tracks']) or 'none'
+            raise TranscriptUnavailable(video_id, 'no_track', f"no {language} captions (available: {codes})")
+        track, translate_to = choice
+        url = f"{track['url']}&tlang={translate_to}" if translate_to else track['url']
+        self._count('track_fetches')
+        with metrics.span('transcript_fetch'):
+            segments = self.fetch_track(video_id, url)
+        self._count('translated' if translate_to else 'generated' if track['is_generated'] else 'manual')
+        logger.debug("Using %s %s transcript for %s%s", 'generated' if track['is_generated'] else 'manual',
+                     track['language_code'], video_id, f" translated to {translate_to}" if translate_to else '')
+        return segments
+
+    def fetch(self, video_id, language='en'):
+        """Return the caption segments of video_id in language
+
+        Raises TranscriptUnavailable when there is no usable transcript.
+        """
+        started = time.perf_counter()
+        self._count('resolutions')
+        try:
+            listing, cached = self._get_listing(video_id)
+            try:
+                return self._download(video_id, listing, language)
+            except TranscriptUnavailable:
+                raise
+            except Exception as e:
+                if not cached:
+                    raise TranscriptUnavailable(video_id, 'error', _describe(e))
+                # The cached track URL may have expired; list again once
+                logger.info("Cached transcript track for %s failed (%s), listing again", video_id, e)
+                self._count('stale_retries')
+                self.invalidate(video_id)
+                try:
+                    return self._download(video_id, self._fetch_listing(video_id), language)
+                except TranscriptUnavailable:
+                    raise
+                except Exception as e:
+                    raise TranscriptUnavailable(video_id, 'error', _describe(e))
+        except TranscriptUnavailable:
+            with self._lock:
+                self._counters['failures'] += 1
+                self._failure_seconds += time.perf_counter() - started
+            raise
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            failure_seconds = self._failure_seconds
+        stats.update({
+            'listing_ttl_seconds': self.listing_ttl,
+            'negative_ttl_seconds': self.negative_ttl,
+            # Each cached listing or negative result saves one listing request
+            'requests_avoided': stats['listing_hits'] + stats['negative_hits'],
+            'outbound_requests': stats['listing_fetches'] + stats['track_fetches'],
+            'avg_failure_ms': round(failure_seconds / stats['failures'] * 1000, 2) if stats['failures'] else 0.0
+        })
+        return stats
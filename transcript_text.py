@@ -0,0 +1,77 @@
+import re
+
+# Joins caption segments so each pattern runs once over the whole transcript.
+# NUL is not whitespace, never appears in captions and keeps ASCII text in
+# Python's compact one-byte representation; the bracket patterns exclude it
+# so no match spans two segments.
+SEGMENT_SEPARATOR = '\x00'
+
+# Annotations such as [Music] and (applause). Like the original '.*?'
+# patterns they stop at the first closing bracket and never cross a newline.
+BRACKETED = re.compile(r'\[[^\]\n\x00]*\]')
+PARENTHESIZED = re.compile(r'\([^)\n\x00]*\)')
+# The same patterns for cleaning one segment at a time
+SEGMENT_BRACKETED = re.compile(r'\[[^\]\n]*\]')
+SEGMENT_PARENTHESIZED = re.compile(r'\([^)\n]*\)')
+
+SENTENCE_END = ('.', '!', '?')
+
+def _clean_segment(text):
+    text = SEGMENT_BRACKETED.sub('', text)
+    text = SEGMENT_PARENTHESIZED.sub('', text)
+    return ' '.join(text.split())
+
+def clean_segments(segments):
+    """Return the cleaned text of each caption segment, aligned with segments
+
+    Bracketed annotations are removed and whitespace is collapsed; segments
+    that end up empty are returned as ''.
+    """
+    texts = [segment['text'] for segment in segments]
+    joined = SEGMENT_SEPARATOR.join(texts)
+    if joined.count(SEGMENT_SEPARATOR) != len(texts) - 1:
+        # The separator occurs in a caption; clean segment by segment instead
+        return [_clean_segment(text) for text in texts]
+
+    joined = BRACKETED.sub('', joined)
+    joined = PARENTHESIZED.sub('', joined)
+    # str.split() collapses the same whitespace as the per-segment version;
+    # the separator is not whitespace, so only the spaces around it need removing
+    joined = ' '.join(joined.split())
+    joined = joined.replace(' ' + SEGMENT_SEPARATOR, SEGMENT_SEPARATOR)
+    joined = joined.replace(SEGMENT_SEPARATOR + ' ', SEGMENT_SEPARATOR)
+    return joined.split(SEGMENT_SEPARATOR)
+
+def build_sentences(segments):
+    """Group caption segments into sentences with their start and end times
+
+    A sentence ends with the first segment whose cleaned text ends in
+    '.', '!' or '?'. Returns a list of {'text', 'start', 'end'} dicts, with
+    times in seconds.
+    """
+    texts = clean_segments(segments)
+    sentences = []
+    first = None
+    for index, text in enumerate(texts):
+        if not text:
+            continue
+        if first is None:
+            first = index
+        if text.endswith(SENTENCE_END):
+            sentences.append(_sentence(segments, texts, first, index))
+            first = None
+    if first is not None:
+        sentences.append(_sentence(segments, texts, first, len(texts) - 1))
+    return sentences
+
+def _sentence(segments, texts, first, last):
+    end = segments[last]
+    return {
+        'text': ' '.join(text for text in texts[first:last + 1] if text),
+        'start': segments[first].get('start', 0.0),
+        'end': end.get('start', 0.0) + end.get('duration', 0.0)
+    }
+
+def transcript_to_text(segments):
+    """Return the cleaned transcript as one string of space-separated sentences"""
+    return ' '.join(text for text in clean_segments(segments) if text)
@@ -0,0 +1,13 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app the master imports this once, so the environment and API
+key checks, database migrations and the cleanup of jobs interrupted by the
+last shutdown run before workers fork. Per-process resources (SQLite
+connections, HTTP sessions, worker pools, the log writer thread) are
+created lazily or restarted in each worker.
+"""
+import storage
+from app import app
+
+storage.init_db()
+storage.fail_interrupted_jobs()